@@ -1,17 +1,24 @@
 # auth.py - VERSIÓN CORREGIDA COMPLETA
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 from dotenv import load_dotenv
 
+from cache_principales import cache_principales, generaciones, mapa_versiones, hash_token
 from database import get_db
-from models import Usuario, TokenBlacklist
-from schemas import TokenData
+from revocacion import clave_revocacion, registro_revocacion
+from metricas import DURACION_KDF
+from models import Usuario
+from schemas import TokenData, Principal
 
 load_dotenv()
 
@@ -19,34 +26,105 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "123")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 horas
+KDF_WORKERS = int(os.getenv("KDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+KDF_WORKERS_MASIVO = int(os.getenv("KDF_WORKERS_MASIVO", str(max(1, KDF_WORKERS // 2))))
 
-# USAR pbkdf2_sha256 EN LUGAR DE bcrypt TEMPORALMENTE
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256"],  # Cambiado de ["bcrypt"]
-    deprecated="auto",
-    pbkdf2_sha256__default_rounds=30000
-)
+# Parámetros del KDF por despliegue; `python calibrar_kdf.py` sugiere valores para
+# este host. KDF_ROUNDS son iteraciones en pbkdf2_sha256 y el costo (log2) en bcrypt.
+KDF_ESQUEMA = os.getenv("KDF_ESQUEMA", "pbkdf2_sha256")
+KDF_ROUNDS = int(os.getenv("KDF_ROUNDS", "30000"))
+
+# Esquemas que se pueden verificar; todos menos KDF_ESQUEMA se rehashean al iniciar
+# sesión. hex_sha256 solo existe por hashes antiguos del fallback sin sal.
+ESQUEMAS_SOPORTADOS = ("pbkdf2_sha256", "bcrypt", "hex_sha256")
+
+
+def crear_contexto_kdf(esquema: str = KDF_ESQUEMA, rounds: int = KDF_ROUNDS) -> CryptContext:
+    if esquema not in ESQUEMAS_SOPORTADOS[:2]:
+        raise ValueError(f"KDF_ESQUEMA no soportado: {esquema}")
+
+    # min/max_desired_rounds: un hash con otros rounds también necesita actualizarse
+    return CryptContext(
+        schemes=[esquema] + [e for e in ESQUEMAS_SOPORTADOS if e != esquema],
+        default=esquema,
+        deprecated="auto",
+        **{
+            f"{esquema}__default_rounds": rounds,
+            f"{esquema}__min_desired_rounds": rounds,
+            f"{esquema}__max_desired_rounds": rounds,
+        }
+    )
+
+
+pwd_context = crear_contexto_kdf()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-# Funciones de contraseña CORREGIDAS
-def verify_password(plain_password, hashed_password):
+# Pool acotado para el hashing de contraseñas: pbkdf2 es CPU intensivo (hashlib
+# libera el GIL) y no debe correr en el event loop ni saturar el threadpool de E/S
+_pool_kdf = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix="kdf")
+# Pool aparte para importaciones: un lote de miles de hashes no deja en cola los logins
+_pool_kdf_masivo = ThreadPoolExecutor(max_workers=KDF_WORKERS_MASIVO, thread_name_prefix="kdf-masivo")
+
+
+# Funciones de contraseña
+def _verify_password(plain_password, hashed_password):
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        with DURACION_KDF.labels("verificar").time():
+            return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
         print(f"Error verifying password: {e}")
         return False
 
 
-def get_password_hash(password):
+def _verify_and_update(plain_password, hashed_password):
+    """(válida, hash nuevo o None): rehashea si el hash usa otros parámetros"""
     try:
-        return pwd_context.hash(password)
+        with DURACION_KDF.labels("verificar").time():
+            return pwd_context.verify_and_update(plain_password, hashed_password)
     except Exception as e:
-        print(f"Error hashing password: {e}")
-        # Fallback simple
-        import hashlib
-        return hashlib.sha256(password.encode()).hexdigest()
+        print(f"Error verifying password: {e}")
+        return False, None
+
+
+def _get_password_hash(password):
+    with DURACION_KDF.labels("hashear").time():
+        return pwd_context.hash(password)
+
+
+# Versiones síncronas: para código que ya corre fuera del event loop (scripts).
+# Bloquean el hilo que las llama mientras esperan al pool.
+def verify_password(plain_password, hashed_password):
+    return _pool_kdf.submit(_verify_password, plain_password, hashed_password).result()
+
+
+def get_password_hash(password):
+    return _pool_kdf.submit(_get_password_hash, password).result()
+
+
+# Versiones asíncronas: para endpoints `async def`
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_kdf, _verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_kdf, _verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_kdf, _get_password_hash, password)
+
+
+async def get_password_hashes_async(passwords):
+    """Hashear un lote en paralelo en el pool de importaciones; conserva el orden"""
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(
+        loop.run_in_executor(_pool_kdf_masivo, _get_password_hash, password) for password in passwords
+    ))
 
 
 # Funciones JWT
@@ -57,51 +135,166 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def verify_token(token: str, db: Session):
+async def verify_token(token: str, db: AsyncSession):
     try:
-        # Verificar si el token está en la lista negra
-        token_blacklisted = db.query(TokenBlacklist).filter(TokenBlacklist.token == token).first()
-        if token_blacklisted:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+        # Verificar si el token fue revocado (el filtro de Bloom evita casi siempre la consulta)
+        if await registro_revocacion.esta_revocado(clave_revocacion(token, payload), db):
             return None
 
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         rol: str = payload.get("rol")
         if username is None:
             return None
 
-        token_data = TokenData(username=username, rol=rol)
+        token_data = TokenData(
+            username=username, rol=rol, exp=payload.get("exp"),
+            uid=payload.get("uid"), ver=payload.get("ver")
+        )
         return token_data
     except JWTError:
         return None
 
 
-# Obtener usuario actual
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+# Copia del usuario desligada de la sesión, segura para guardar en caché
+def copiar_principal(user: Usuario) -> Usuario:
+    datos = {
+        columna.key: getattr(user, columna.key)
+        for columna in Usuario.__table__.columns
+        if columna.key != "hashed_password"
+    }
+    return Usuario(**datos)
+
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenciales inválidas",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token_data = verify_token(token, db)
-    if token_data is None:
-        raise credentials_exception
 
-    user = db.query(Usuario).filter(Usuario.username == token_data.username).first()
+# Versión vigente de los tokens de un usuario (None: eliminado o inactivo)
+async def version_vigente(usuario_id: int, db: AsyncSession):
+    encontrado, version = mapa_versiones.obtener(usuario_id)
+    if encontrado:
+        return version
+
+    # Si el usuario se invalida mientras se consulta, lo leído no se guarda
+    generacion = generaciones.actual()
+    resultado = await db.execute(
+        select(Usuario.token_version, Usuario.activo).where(Usuario.id == usuario_id)
+    )
+    fila = resultado.first()
+    version = fila.token_version if fila is not None and fila.activo else None
+    mapa_versiones.guardar(usuario_id, version, generacion)
+    return version
+
+
+def _tiene_version(token_data: TokenData) -> bool:
+    return token_data.uid is not None and token_data.ver is not None
+
+
+async def _usuario_de_token(token: str, token_data: TokenData, db: AsyncSession):
+    """Copia en caché del usuario completo de un token ya verificado"""
+    clave = hash_token(token)
+    principal = cache_principales.obtener(clave)
+    if principal is not None:
+        return principal
+
+    generacion = generaciones.actual()
+    resultado = await db.execute(select(Usuario).where(Usuario.username == token_data.username))
+    user = resultado.scalars().first()
     if user is None or not user.activo:
-        raise credentials_exception
+        return None
+    if _tiene_version(token_data) and user.token_version != token_data.ver:
+        return None
+
+    principal = copiar_principal(user)
+    cache_principales.guardar(clave, principal, token_data.exp, generacion)
+    return principal
+
+
+# Obtener usuario autenticado solo desde los claims
+async def get_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
+    """Usuario del token validado con sus claims y el mapa de versiones.
+
+    En el caso normal no consulta la base de datos: la firma, la revocación
+    (filtro de Bloom) y la versión en caché son trabajo de CPU. Los tokens
+    emitidos antes de tener `uid`/`ver` se validan contra la base.
+    """
+    token_data = await verify_token(token, db)
+    if token_data is None:
+        raise _credentials_exception()
+
+    if not _tiene_version(token_data):
+        usuario = await _usuario_de_token(token, token_data, db)
+        if usuario is None:
+            raise _credentials_exception()
+        return Principal(id=usuario.id, username=usuario.username, rol=usuario.rol)
+
+    if await version_vigente(token_data.uid, db) != token_data.ver:
+        raise _credentials_exception()
+
+    return Principal(id=token_data.uid, username=token_data.username, rol=token_data.rol)
+
+
+# Obtener usuario actual
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """Usuario completo del token (perfil); en caché no se consulta la base de datos.
+
+    Devuelve una copia desligada de la sesión y sin `hashed_password`: los
+    endpoints que modifican al usuario deben volver a leerlo de la base. Si solo
+    se necesitan id y rol, usar `get_principal`.
+    """
+    token_data = await verify_token(token, db)
+    if token_data is None:
+        raise _credentials_exception()
+
+    if _tiene_version(token_data) and await version_vigente(token_data.uid, db) != token_data.ver:
+        raise _credentials_exception()
+
+    usuario = await _usuario_de_token(token, token_data, db)
+    if usuario is None:
+        raise _credentials_exception()
+    return usuario
+
+
+# Datos que se firman en el token de un usuario
+def claims_usuario(usuario: Usuario) -> dict:
+    return {
+        "sub": usuario.username,
+        "rol": usuario.rol,
+        "uid": usuario.id,
+        "ver": usuario.token_version or 0,
+    }
+
+
+# Invalidar usuarios en caché
+def invalidar_token(token: str):
+    cache_principales.invalidar_token(hash_token(token))
+
+
+def invalidar_usuario(usuario_id: int):
+    # Primero la marca: una lectura en curso ya no podrá volver a guardar lo anterior
+    generaciones.invalidar(usuario_id)
+    cache_principales.invalidar_usuario(usuario_id)
+    mapa_versiones.invalidar(usuario_id)
+
 
-    return user
+# Invalidar todos los tokens emitidos de un usuario (antes de hacer commit)
+def incrementar_version_token(usuario: Usuario):
+    usuario.token_version = (usuario.token_version or 0) + 1
 
 
 # Verificar roles
-def verificar_rol(usuario: Usuario, rol_requerido: str):
+def verificar_rol(usuario: Principal, rol_requerido: str):
     if usuario.rol != rol_requerido:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -111,14 +304,14 @@ def verificar_rol(usuario: Usuario, rol_requerido: str):
 
 
 # Agregar token a lista negra
-def agregar_token_blacklist(token: str, db: Session):
+async def agregar_token_blacklist(token: str, db: AsyncSession):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         exp_timestamp = payload.get("exp")
         if exp_timestamp:
-            exp_datetime = datetime.fromtimestamp(exp_timestamp)
-            token_blacklist = TokenBlacklist(token=token, expirado_en=exp_datetime)
-            db.add(token_blacklist)
-            db.commit()
+            exp_datetime = datetime.utcfromtimestamp(exp_timestamp)
+            await registro_revocacion.revocar(clave_revocacion(token, payload), exp_datetime, db)
     except JWTError:
-        pass
\ No newline at end of file
+        pass
+    finally:
+        invalidar_token(token)
\ No newline at end of file
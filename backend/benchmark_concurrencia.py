@@ -0,0 +1,119 @@
+#D:\codigos\contador_cerdos_final\backend\benchmark_concurrencia.py
+"""Latencia de /verify-token mientras llega una ráfaga de logins.
+
+Con el hashing y las consultas en el event loop, cada login congela al resto de
+peticiones del worker y la latencia de /verify-token sube durante la ráfaga; con
+el trabajo fuera del loop debe mantenerse plana.
+
+Uso:
+    python benchmark_concurrencia.py --usuario admin --password admin123
+    python benchmark_concurrencia.py --url http://localhost:8000 --logins 50 --lectores 8
+
+Solo usa la biblioteca estándar.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+def login(url, usuario, password):
+    datos = urllib.parse.urlencode({"username": usuario, "password": password}).encode()
+    with urllib.request.urlopen(urllib.request.Request(f"{url}/login", data=datos), timeout=60) as respuesta:
+        return json.load(respuesta)["access_token"]
+
+
+def verificar(url, token):
+    peticion = urllib.request.Request(f"{url}/verify-token", headers={"Authorization": f"Bearer {token}"})
+    with urllib.request.urlopen(peticion, timeout=60) as respuesta:
+        respuesta.read()
+
+
+def lector(url, token, detener, muestras):
+    """Llamar a /verify-token en bucle registrando (instante, latencia)"""
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        try:
+            verificar(url, token)
+        except (urllib.error.URLError, OSError):
+            continue
+        muestras.append((inicio, time.perf_counter() - inicio))
+
+
+def rafaga_logins(url, usuario, password, cantidad):
+    """Lanzar `cantidad` logins a la vez y devolver sus duraciones"""
+    duraciones = []
+
+    def uno():
+        inicio = time.perf_counter()
+        try:
+            login(url, usuario, password)
+            duraciones.append(time.perf_counter() - inicio)
+        except (urllib.error.URLError, OSError):
+            pass
+
+    hilos = [threading.Thread(target=uno) for _ in range(cantidad)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return duraciones
+
+
+def resumen(nombre, latencias):
+    if not latencias:
+        print(f"{nombre:<14} sin muestras")
+        return
+    latencias = sorted(latencias)
+    p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+    print(f"{nombre:<14} n={len(latencias):>6}  p50={statistics.median(latencias) * 1000:8.1f} ms  "
+          f"p95={p95 * 1000:8.1f} ms  max={latencias[-1] * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--logins", type=int, default=20, help="logins simultáneos en la ráfaga")
+    parser.add_argument("--lectores", type=int, default=4, help="hilos llamando a /verify-token")
+    parser.add_argument("--calentamiento", type=float, default=3.0, help="segundos antes y después de la ráfaga")
+    args = parser.parse_args()
+
+    token = login(args.url, args.usuario, args.password)
+
+    detener = threading.Event()
+    muestras = []
+    lectores = [
+        threading.Thread(target=lector, args=(args.url, token, detener, muestras), daemon=True)
+        for _ in range(args.lectores)
+    ]
+    for hilo in lectores:
+        hilo.start()
+
+    time.sleep(args.calentamiento)
+    inicio_rafaga = time.perf_counter()
+    duraciones_login = rafaga_logins(args.url, args.usuario, args.password, args.logins)
+    fin_rafaga = time.perf_counter()
+    time.sleep(args.calentamiento)
+
+    detener.set()
+    for hilo in lectores:
+        hilo.join()
+
+    print(f"Ráfaga de {args.logins} logins en {fin_rafaga - inicio_rafaga:.2f} s "
+          f"({len(duraciones_login)} exitosos)\n")
+    print("/verify-token")
+    resumen("antes", [lat for t, lat in muestras if t < inicio_rafaga])
+    resumen("durante", [lat for t, lat in muestras if inicio_rafaga <= t < fin_rafaga])
+    resumen("después", [lat for t, lat in muestras if t >= fin_rafaga])
+    print("\n/login")
+    resumen("ráfaga", duraciones_login)
+
+
+if __name__ == "__main__":
+    main()
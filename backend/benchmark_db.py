@@ -0,0 +1,100 @@
+#D:\codigos\contador_cerdos_final\backend\benchmark_db.py
+"""Capa de datos síncrona vs asíncrona con la consulta de autenticación.
+
+Ejecuta la misma carga (buscar un usuario por username, como hace
+get_current_user en cada petición) de dos formas:
+
+  sync   Session síncrona en un pool de hilos, como los endpoints `def` de FastAPI
+         (40 hilos, el límite por defecto de su threadpool)
+  async  AsyncSession sobre asyncpg con asyncio.gather en un solo hilo
+
+y reporta peticiones por segundo y latencias p50/p99 para cada concurrencia.
+
+Uso:
+    python benchmark_db.py --usuario admin
+    python benchmark_db.py --usuario admin --consultas 5000 --concurrencia 10 50 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal, SessionLocal, async_engine, engine
+from models import Usuario
+
+HILOS_THREADPOOL = 40
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def consulta_sync(username):
+    inicio = time.perf_counter()
+    db = SessionLocal()
+    try:
+        db.execute(select(Usuario).where(Usuario.username == username)).scalars().first()
+    finally:
+        db.close()
+    return time.perf_counter() - inicio
+
+
+def medir_sync(username, consultas, concurrencia):
+    latencias = []
+    inicio = time.perf_counter()
+    # `concurrencia` clientes, pero nunca más hilos que el threadpool de FastAPI
+    with ThreadPoolExecutor(max_workers=min(concurrencia, HILOS_THREADPOOL)) as pool:
+        latencias.extend(pool.map(lambda _: consulta_sync(username), range(consultas)))
+    return time.perf_counter() - inicio, latencias
+
+
+async def medir_async(username, consultas, concurrencia):
+    latencias = []
+    limite = asyncio.Semaphore(concurrencia)
+
+    async def una():
+        async with limite:
+            inicio = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                resultado = await db.execute(select(Usuario).where(Usuario.username == username))
+                resultado.scalars().first()
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una() for _ in range(consultas)))
+    return time.perf_counter() - inicio, latencias
+
+
+def reportar(nombre, concurrencia, duracion, latencias):
+    print(f"{nombre:<6} c={concurrencia:<5} {len(latencias) / duracion:9.1f} req/s  "
+          f"p50={statistics.median(latencias) * 1000:7.2f} ms  p99={percentil(latencias, 0.99) * 1000:8.2f} ms")
+
+
+async def main_async(args):
+    for concurrencia in args.concurrencia:
+        # Calentar los pools de conexiones antes de medir
+        medir_sync(args.usuario, concurrencia, concurrencia)
+        await medir_async(args.usuario, concurrencia, concurrencia)
+
+        reportar("sync", concurrencia, *medir_sync(args.usuario, args.consultas, concurrencia))
+        reportar("async", concurrencia, *await medir_async(args.usuario, args.consultas, concurrencia))
+        print()
+
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuario", default="admin", help="username existente a consultar")
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[1, 10, 50, 200])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
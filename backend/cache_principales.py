@@ -0,0 +1,199 @@
+#D:\codigos\contador_cerdos_final\backend\cache_principales.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))  # segundos
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))  # tokens en caché
+VERSION_CACHE_TTL = int(os.getenv("VERSION_CACHE_TTL", "30"))  # segundos
+
+
+def hash_token(token: str) -> str:
+    """Clave de caché del token (no se guarda el token en claro)"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class Generaciones:
+    """Marcas de invalidación por usuario, para no cachear datos leídos antes de una.
+
+    Una petición toma `actual()` antes de leer el usuario de la base; si mientras
+    tanto se invalidó a ese usuario (cambio confirmado en otro request), lo leído
+    puede ser anterior al cambio y `vigente()` devuelve False: no se guarda.
+
+    Solo se recuerdan las últimas `max_entradas` invalidaciones; una marca anterior
+    a la más vieja olvidada se trata como no vigente (a lo sumo cuesta una consulta).
+    """
+
+    def __init__(self, max_entradas: int = AUTH_CACHE_MAX):
+        self.max_entradas = max_entradas
+        self._contador = 0
+        self._piso = 0  # generación de la invalidación más reciente olvidada
+        self._invalidado_en = OrderedDict()  # usuario_id -> generación
+        self._lock = threading.Lock()
+
+    def actual(self) -> int:
+        with self._lock:
+            return self._contador
+
+    def invalidar(self, usuario_id: int):
+        with self._lock:
+            self._contador += 1
+            self._invalidado_en.pop(usuario_id, None)
+            self._invalidado_en[usuario_id] = self._contador
+            while len(self._invalidado_en) > self.max_entradas:
+                _, generacion = self._invalidado_en.popitem(last=False)
+                self._piso = max(self._piso, generacion)
+
+    def vigente(self, usuario_id: int, generacion) -> bool:
+        """Si lo leído con la marca `generacion` sigue valiendo para el usuario"""
+        if generacion is None:
+            return True
+        with self._lock:
+            return generacion >= self._piso and self._invalidado_en.get(usuario_id, 0) <= generacion
+
+
+class CachePrincipales:
+    """Caché LRU con TTL de (hash del token -> usuario autenticado).
+
+    Guarda un índice inverso usuario -> tokens para poder invalidar todas las
+    sesiones de un usuario cuando cambia su contraseña, rol o estado. La caché es
+    por proceso: con varios workers el TTL acota cuánto puede tardar un cambio
+    hecho en otro proceso.
+    """
+
+    def __init__(self, ttl: int = AUTH_CACHE_TTL, max_entradas: int = AUTH_CACHE_MAX,
+                 generaciones: Generaciones = None):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.generaciones = generaciones or Generaciones(max_entradas)
+        self._entradas = OrderedDict()  # clave -> (usuario, expira_en)
+        self._tokens_por_usuario = {}  # usuario_id -> {claves}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str):
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+
+            usuario, expira_en = entrada
+            if expira_en <= ahora:
+                self._quitar(clave)
+                return None
+
+            self._entradas.move_to_end(clave)
+            return usuario
+
+    def guardar(self, clave: str, usuario, token_exp=None, generacion=None):
+        """Guardar el usuario de un token; nunca más allá del `exp` del token
+
+        `generacion` es la marca tomada antes de leer el usuario (ver Generaciones).
+        """
+        expira_en = time.time() + self.ttl
+        if token_exp is not None:
+            expira_en = min(expira_en, token_exp)
+
+        with self._lock:
+            if not self.generaciones.vigente(usuario.id, generacion):
+                return
+            self._quitar(clave)
+            self._entradas[clave] = (usuario, expira_en)
+            self._tokens_por_usuario.setdefault(usuario.id, set()).add(clave)
+
+            while len(self._entradas) > self.max_entradas:
+                self._quitar(next(iter(self._entradas)))
+
+    def invalidar_token(self, clave: str):
+        with self._lock:
+            self._quitar(clave)
+
+    def invalidar_usuario(self, usuario_id: int):
+        with self._lock:
+            for clave in list(self._tokens_por_usuario.get(usuario_id, ())):
+                self._quitar(clave)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._tokens_por_usuario.clear()
+
+    def _quitar(self, clave: str):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+
+        usuario_id = entrada[0].id
+        claves = self._tokens_por_usuario.get(usuario_id)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._tokens_por_usuario[usuario_id]
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+class MapaVersiones:
+    """Caché LRU con TTL de (usuario_id -> token_version vigente).
+
+    `None` significa que el usuario no existe o está inactivo: ningún token suyo es
+    válido. Es lo único que se consulta para validar un token con claims `uid` y
+    `ver`, así que casi siempre la validación no toca la base de datos.
+    """
+
+    def __init__(self, ttl: int = VERSION_CACHE_TTL, max_entradas: int = AUTH_CACHE_MAX,
+                 generaciones: Generaciones = None):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.generaciones = generaciones or Generaciones(max_entradas)
+        self._versiones = OrderedDict()  # usuario_id -> (version, expira_en)
+        self._lock = threading.Lock()
+
+    def obtener(self, usuario_id: int):
+        """(encontrado, versión) del usuario"""
+        with self._lock:
+            entrada = self._versiones.get(usuario_id)
+            if entrada is None:
+                return False, None
+
+            version, expira_en = entrada
+            if expira_en <= time.time():
+                del self._versiones[usuario_id]
+                return False, None
+
+            self._versiones.move_to_end(usuario_id)
+            return True, version
+
+    def guardar(self, usuario_id: int, version, generacion=None):
+        """Guardar la versión leída de la base con la marca `generacion` (ver Generaciones)"""
+        with self._lock:
+            if not self.generaciones.vigente(usuario_id, generacion):
+                return
+            self._versiones[usuario_id] = (version, time.time() + self.ttl)
+            self._versiones.move_to_end(usuario_id)
+            while len(self._versiones) > self.max_entradas:
+                self._versiones.popitem(last=False)
+
+    def invalidar(self, usuario_id: int):
+        with self._lock:
+            self._versiones.pop(usuario_id, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._versiones.clear()
+
+    def __len__(self):
+        return len(self._versiones)
+
+
+generaciones = Generaciones()
+cache_principales = CachePrincipales(generaciones=generaciones)
+mapa_versiones = MapaVersiones(generaciones=generaciones)
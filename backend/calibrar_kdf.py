@@ -0,0 +1,83 @@
+#D:\codigos\contador_cerdos_final\backend\calibrar_kdf.py
+"""Calibrar los parámetros del KDF de contraseñas para este host.
+
+Mide cuánto tarda un hash con el esquema elegido y sugiere KDF_ROUNDS para una
+latencia objetivo por login. Con KDF_WORKERS hilos verificando en paralelo, la
+capacidad aproximada es KDF_WORKERS / tiempo_por_hash logins por segundo.
+
+Uso:
+    python calibrar_kdf.py
+    python calibrar_kdf.py --esquema pbkdf2_sha256 --objetivo-ms 250
+    python calibrar_kdf.py --esquema bcrypt --objetivo-ms 300 --workers 4
+
+Las contraseñas existentes se rehashean con los nuevos parámetros la próxima vez
+que cada usuario inicia sesión.
+"""
+import argparse
+import math
+import os
+import statistics
+import time
+
+from passlib.hash import bcrypt, pbkdf2_sha256
+
+CONTRASEÑA_PRUEBA = "contraseña-de-calibracion"
+
+
+def medir(handler, rounds, repeticiones):
+    """Mediana en segundos de `repeticiones` hashes con los rounds indicados"""
+    configurado = handler.using(rounds=rounds)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        configurado.hash(CONTRASEÑA_PRUEBA)
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+
+def calibrar_pbkdf2(objetivo, repeticiones):
+    # El costo de pbkdf2 es lineal en las iteraciones
+    base = 20000
+    segundos = medir(pbkdf2_sha256, base, repeticiones)
+    rounds = max(pbkdf2_sha256.min_rounds, int(base * objetivo / segundos) // 1000 * 1000)
+    return rounds, medir(pbkdf2_sha256, rounds, repeticiones)
+
+
+def calibrar_bcrypt(objetivo, repeticiones):
+    # El costo de bcrypt se duplica con cada unidad de `rounds` (log2)
+    base = 10
+    segundos = medir(bcrypt, base, repeticiones)
+    rounds = min(bcrypt.max_rounds, max(bcrypt.min_rounds, base + round(math.log2(objetivo / segundos))))
+    return rounds, medir(bcrypt, rounds, repeticiones)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--esquema", choices=["pbkdf2_sha256", "bcrypt"],
+                        default=os.getenv("KDF_ESQUEMA", "pbkdf2_sha256"))
+    parser.add_argument("--objetivo-ms", type=float, default=250, help="tiempo objetivo por hash")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("KDF_WORKERS", min(4, os.cpu_count() or 1))),
+                        help="hilos del pool de KDF (KDF_WORKERS)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    objetivo = args.objetivo_ms / 1000
+    calibrar = calibrar_pbkdf2 if args.esquema == "pbkdf2_sha256" else calibrar_bcrypt
+    rounds, segundos = calibrar(objetivo, args.repeticiones)
+
+    actual = os.getenv("KDF_ROUNDS")
+    if actual and os.getenv("KDF_ESQUEMA", "pbkdf2_sha256") == args.esquema:
+        handler = pbkdf2_sha256 if args.esquema == "pbkdf2_sha256" else bcrypt
+        print(f"Actual:    KDF_ROUNDS={actual} -> {medir(handler, int(actual), args.repeticiones) * 1000:.0f} ms por hash")
+
+    print(f"Sugerido:  {args.esquema} con {rounds} rounds -> {segundos * 1000:.0f} ms por hash "
+          f"(objetivo {args.objetivo_ms:.0f} ms)")
+    print(f"Capacidad: ~{args.workers / segundos:.1f} logins/s con {args.workers} workers de KDF\n")
+    print("Variables de entorno:")
+    print(f"KDF_ESQUEMA={args.esquema}")
+    print(f"KDF_ROUNDS={rounds}")
+    print(f"KDF_WORKERS={args.workers}")
+
+
+if __name__ == "__main__":
+    main()
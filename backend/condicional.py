@@ -0,0 +1,63 @@
+#D:\codigos\contador_cerdos_final\backend\condicional.py
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+# Las respuestas dependen del token: solo el cliente puede guardarlas y debe revalidar
+CACHE_CONTROL = "private, no-cache"
+
+
+def calcular_etag(*partes) -> str:
+    """ETag débil a partir de los valores que determinan la representación"""
+    resumen = hashlib.sha256("|".join(map(str, partes)).encode()).hexdigest()[:32]
+    return f'W/"{resumen}"'
+
+
+def _a_utc(fecha: datetime) -> datetime:
+    # Las columnas DateTime no guardan zona horaria; el servidor trabaja en UTC
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return fecha.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def no_modificado(request: Request, etag: str, ultima_modificacion: datetime = None) -> bool:
+    """Si las validaciones condicionales de la petición coinciden con la representación
+
+    If-None-Match tiene prioridad (comparación débil). If-Modified-Since solo se usa
+    si no hay If-None-Match y se indicó `ultima_modificacion`; no pasarla cuando la
+    fecha no refleja todos los cambios (p. ej. borrados en un listado).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etiquetas = {etiqueta.strip().removeprefix("W/") for etiqueta in if_none_match.split(",")}
+        return etag.removeprefix("W/") in etiquetas
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and ultima_modificacion is not None:
+        try:
+            desde = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if desde.tzinfo is None:
+            desde = desde.replace(tzinfo=timezone.utc)
+        return _a_utc(ultima_modificacion) <= desde
+
+    return False
+
+
+def aplicar_validadores(response: Response, etag: str, ultima_modificacion: datetime = None):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if ultima_modificacion is not None:
+        response.headers["Last-Modified"] = format_datetime(_a_utc(ultima_modificacion), usegmt=True)
+
+
+def respuesta_no_modificada(etag: str, ultima_modificacion: datetime = None) -> Response:
+    """304 sin cuerpo: no se construye ni serializa ningún modelo"""
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    aplicar_validadores(response, etag, ultima_modificacion)
+    return response
@@ -1,9 +1,11 @@
-from database import SessionLocal
+from database import SessionLocal, inicializar_esquema_sync
 from models import Usuario
 from auth import get_password_hash
 
 
 def init_db():
+    # Puede correr antes que la API sobre una base existente: migrar primero
+    inicializar_esquema_sync()
     db = SessionLocal()
 
     # Verificar si el usuario ya existe para no duplicarlo
@@ -1,40 +1,114 @@
 #D:\codigos\contador_cerdos_final\backend\crud.py
-from sqlalchemy.orm import Session
+import csv
+import io
+import os
+
+from pydantic import ValidationError
+from sqlalchemy import select, update, case, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
-from models import Usuario
-from schemas import UsuarioCreate, UsuarioUpdate
-from auth import get_password_hash, verify_password
+from models import Usuario, VersionTabla
+from schemas import (
+    UsuarioCreate, UsuarioUpdate, CambioMasivo,
+    ErrorImportacion, ResultadoImportacion, Omision, ResultadoCambioMasivo
+)
+from auth import (
+    get_password_hash_async, get_password_hashes_async,
+    invalidar_usuario, incrementar_version_token
+)
+
+ROLES = ("usuario", "supervisor", "admin")
+COLUMNAS_IMPORTACION = ("username", "email", "password", "nombre_completo", "rol")
+IMPORTACION_MAX_FILAS = int(os.getenv("IMPORTACION_MAX_FILAS", "10000"))
 
 
 # Operaciones CRUD para Usuarios
-def get_usuario_by_username(db: Session, username: str):
-    return db.query(Usuario).filter(Usuario.username == username).first()
+async def get_usuario_by_username(db: AsyncSession, username: str):
+    resultado = await db.execute(select(Usuario).where(Usuario.username == username))
+    return resultado.scalars().first()
+
+
+async def get_usuario_by_email(db: AsyncSession, email: str):
+    resultado = await db.execute(select(Usuario).where(Usuario.email == email))
+    return resultado.scalars().first()
+
+
+async def get_usuario(db: AsyncSession, usuario_id: int):
+    return await db.get(Usuario, usuario_id)
 
 
-def get_usuario_by_email(db: Session, email: str):
-    return db.query(Usuario).filter(Usuario.email == email).first()
+def escapar_like(texto: str) -> str:
+    """Escapar los comodines de LIKE para buscar el texto literal"""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
-def get_usuario(db: Session, usuario_id: int):
-    return db.query(Usuario).filter(Usuario.id == usuario_id).first()
+def filtrar_usuarios(consulta, rol: str = None, activo: bool = None, buscar: str = None):
+    """Aplicar los filtros del listado de usuarios a una consulta"""
+    if rol:
+        consulta = consulta.where(Usuario.rol == rol)
+    if activo is not None:
+        consulta = consulta.where(Usuario.activo == activo)
+    if buscar and buscar.strip():
+        # Búsqueda por prefijo sobre lower(): usa los índices text_pattern_ops
+        prefijo = escapar_like(buscar.strip().lower()) + "%"
+        consulta = consulta.where(or_(
+            func.lower(Usuario.username).like(prefijo, escape="\\"),
+            func.lower(Usuario.email).like(prefijo, escape="\\"),
+        ))
+    return consulta
 
 
-def get_usuarios(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Usuario).offset(skip).limit(limit).all()
+async def get_usuarios(db: AsyncSession, despues_de: int = None, limit: int = 100,
+                       rol: str = None, activo: bool = None, buscar: str = None):
+    """Página de usuarios ordenada por id; devuelve (usuarios, siguiente cursor o None)
 
+    Paginación por cursor (keyset): `despues_de` es el último id de la página
+    anterior, así cada página cuesta lo mismo sin importar su profundidad.
+    """
+    consulta = filtrar_usuarios(select(Usuario), rol, activo, buscar)
+    if despues_de is not None:
+        consulta = consulta.where(Usuario.id > despues_de)
+
+    # Pedir una fila de más para saber si hay otra página sin contar
+    resultado = await db.execute(consulta.order_by(Usuario.id).limit(limit + 1))
+    usuarios = resultado.scalars().all()
+    if len(usuarios) > limit:
+        return usuarios[:limit], usuarios[limit - 1].id
+    return usuarios, None
+
+
+async def version_usuarios(db: AsyncSession):
+    """(versión, última modificación) de la tabla de usuarios
+
+    Es la versión del listado: el trigger tr_usuarios_version la incrementa en la
+    transacción de cada alta, modificación o baja. Una lectura por clave primaria.
+    """
+    resultado = await db.execute(
+        select(VersionTabla.version, VersionTabla.modificado_en).where(VersionTabla.tabla == "usuarios")
+    )
+    fila = resultado.first()
+    return (fila.version, fila.modificado_en) if fila is not None else (0, None)
 
-def create_usuario(db: Session, usuario: UsuarioCreate):
+
+async def contar_usuarios(db: AsyncSession, rol: str = None, activo: bool = None, buscar: str = None) -> int:
+    """Total de usuarios que cumplen los filtros"""
+    consulta = filtrar_usuarios(select(func.count()).select_from(Usuario), rol, activo, buscar)
+    return (await db.execute(consulta)).scalar_one()
+
+
+async def create_usuario(db: AsyncSession, usuario: UsuarioCreate):
     # Verificar si el usuario ya existe
-    db_user = get_usuario_by_username(db, username=usuario.username)
+    db_user = await get_usuario_by_username(db, username=usuario.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El nombre de usuario ya está registrado"
         )
 
-    db_email = get_usuario_by_email(db, email=usuario.email)
+    db_email = await get_usuario_by_email(db, email=usuario.email)
     if db_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -42,7 +116,7 @@ def create_usuario(db: Session, usuario: UsuarioCreate):
         )
 
     # Crear nuevo usuario
-    hashed_password = get_password_hash(usuario.password)
+    hashed_password = await get_password_hash_async(usuario.password)
     db_usuario = Usuario(
         username=usuario.username,
         email=usuario.email,
@@ -53,19 +127,19 @@ def create_usuario(db: Session, usuario: UsuarioCreate):
 
     try:
         db.add(db_usuario)
-        db.commit()
-        db.refresh(db_usuario)
+        await db.commit()
+        await db.refresh(db_usuario)
         return db_usuario
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error al crear el usuario"
         )
 
 
-def update_usuario(db: Session, usuario_id: int, usuario_update: UsuarioUpdate, current_user: Usuario):
-    db_usuario = get_usuario(db, usuario_id)
+async def update_usuario(db: AsyncSession, usuario_id: int, usuario_update: UsuarioUpdate, current_user: Usuario):
+    db_usuario = await get_usuario(db, usuario_id)
     if not db_usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -83,31 +157,37 @@ def update_usuario(db: Session, usuario_id: int, usuario_update: UsuarioUpdate,
     update_data = usuario_update.dict(exclude_unset=True)
 
     if "password" in update_data:
-        update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+        update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
+
+    # Un cambio de contraseña invalida los tokens ya emitidos (los de rol pasan
+    # por cambiar_usuarios_masivo)
+    if "hashed_password" in update_data:
+        incrementar_version_token(db_usuario)
 
     for field, value in update_data.items():
         setattr(db_usuario, field, value)
 
     try:
-        db.commit()
-        db.refresh(db_usuario)
+        await db.commit()
+        await db.refresh(db_usuario)
+        invalidar_usuario(db_usuario.id)
         return db_usuario
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error al actualizar el usuario"
         )
 
 
-def delete_usuario(db: Session, usuario_id: int, current_user: Usuario):
+async def delete_usuario(db: AsyncSession, usuario_id: int, current_user: Usuario):
     if current_user.rol != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Solo los administradores pueden eliminar usuarios"
         )
 
-    db_usuario = get_usuario(db, usuario_id)
+    db_usuario = await get_usuario(db, usuario_id)
     if not db_usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,25 +202,26 @@ def delete_usuario(db: Session, usuario_id: int, current_user: Usuario):
         )
 
     try:
-        db.delete(db_usuario)
-        db.commit()
+        await db.delete(db_usuario)
+        await db.commit()
+        invalidar_usuario(usuario_id)
         return {"message": "Usuario eliminado correctamente"}
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al eliminar el usuario"
         )
 
 
-def cambiar_estado_usuario(db: Session, usuario_id: int, activo: bool, current_user: Usuario):
+async def cambiar_estado_usuario(db: AsyncSession, usuario_id: int, activo: bool, current_user: Usuario):
     if current_user.rol != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Solo los administradores pueden cambiar el estado de usuarios"
         )
 
-    db_usuario = get_usuario(db, usuario_id)
+    db_usuario = await get_usuario(db, usuario_id)
     if not db_usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -154,7 +235,239 @@ def cambiar_estado_usuario(db: Session, usuario_id: int, activo: bool, current_u
             detail="No puede desactivarse a sí mismo"
         )
 
+    # Desactivar invalida los tokens ya emitidos
+    if db_usuario.activo and not activo:
+        incrementar_version_token(db_usuario)
+
     db_usuario.activo = activo
-    db.commit()
-    db.refresh(db_usuario)
-    return db_usuario
\ No newline at end of file
+    await db.commit()
+    await db.refresh(db_usuario)
+    invalidar_usuario(db_usuario.id)
+    return db_usuario
+
+# Operaciones masivas
+def preparar_importacion(registros):
+    """Validar registros (fila, dict) como UsuarioCreate; devuelve (válidos, errores)
+
+    Además de los campos obligatorios se rechazan roles desconocidos y usernames o
+    emails repetidos dentro del mismo lote.
+    """
+    validos, errores = [], []
+    usernames, emails = set(), set()
+
+    for fila, datos in registros:
+        if not isinstance(datos, dict):
+            errores.append(ErrorImportacion(fila=fila, motivo="Se esperaba un objeto con los datos del usuario"))
+            continue
+
+        try:
+            usuario = UsuarioCreate(**datos)
+        except ValidationError as e:
+            detalle = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            errores.append(ErrorImportacion(fila=fila, username=str(datos.get("username") or "") or None,
+                                            motivo=detalle))
+            continue
+
+        motivo = None
+        if not usuario.username.strip() or not usuario.email.strip() or not usuario.password:
+            motivo = "username, email y password son obligatorios"
+        elif usuario.rol not in ROLES:
+            motivo = f"Rol inválido: {usuario.rol}"
+        elif usuario.username in usernames:
+            motivo = "Nombre de usuario repetido en el lote"
+        elif usuario.email in emails:
+            motivo = "Email repetido en el lote"
+
+        if motivo:
+            errores.append(ErrorImportacion(fila=fila, username=usuario.username, motivo=motivo))
+            continue
+
+        usernames.add(usuario.username)
+        emails.add(usuario.email)
+        validos.append((fila, usuario))
+
+    return validos, errores
+
+
+def leer_importacion_csv(contenido: bytes):
+    """Registros (línea, dict) de un CSV con cabecera username,email,password[,nombre_completo,rol]"""
+    try:
+        texto = contenido.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo debe estar codificado en UTF-8"
+        )
+
+    lector = csv.DictReader(io.StringIO(texto))
+    faltantes = {"username", "email", "password"} - set(lector.fieldnames or ())
+    if faltantes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Faltan columnas en el CSV: {', '.join(sorted(faltantes))}"
+        )
+
+    registros = []
+    # La línea 1 es la cabecera
+    for linea, fila in enumerate(lector, start=2):
+        datos = {}
+        for columna in COLUMNAS_IMPORTACION:
+            valor = fila.get(columna) or ""
+            if columna != "password":
+                valor = valor.strip()
+            if valor:  # celdas vacías: valor por defecto del schema
+                datos[columna] = valor
+        registros.append((linea, datos))
+    return registros
+
+
+async def importar_usuarios(db: AsyncSession, registros, current_user: Usuario):
+    """Crear usuarios en lote: una consulta de validación, hashing en paralelo y
+    un solo INSERT ... ON CONFLICT DO NOTHING en una transacción"""
+    if current_user.rol != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo los administradores pueden importar usuarios"
+        )
+
+    if len(registros) > IMPORTACION_MAX_FILAS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {IMPORTACION_MAX_FILAS} usuarios por importación"
+        )
+
+    validos, errores = preparar_importacion(registros)
+    conflictos = []
+
+    # Una sola consulta para todos los usernames y emails ya registrados
+    if validos:
+        resultado = await db.execute(
+            select(Usuario.username, Usuario.email).where(or_(
+                Usuario.username.in_([usuario.username for _, usuario in validos]),
+                Usuario.email.in_([usuario.email for _, usuario in validos]),
+            ))
+        )
+        usernames_registrados, emails_registrados = set(), set()
+        for username, email in resultado:
+            usernames_registrados.add(username)
+            emails_registrados.add(email)
+
+        pendientes = []
+        for fila, usuario in validos:
+            if usuario.username in usernames_registrados:
+                conflictos.append(ErrorImportacion(fila=fila, username=usuario.username,
+                                                   motivo="El nombre de usuario ya está registrado"))
+            elif usuario.email in emails_registrados:
+                conflictos.append(ErrorImportacion(fila=fila, username=usuario.username,
+                                                   motivo="El email ya está registrado"))
+            else:
+                pendientes.append((fila, usuario))
+        validos = pendientes
+
+    if not validos:
+        return ResultadoImportacion(creados=[], conflictos=conflictos, errores=errores)
+
+    hashes = await get_password_hashes_async([usuario.password for _, usuario in validos])
+    valores = [
+        {
+            "username": usuario.username,
+            "email": usuario.email,
+            "hashed_password": hashed_password,
+            "nombre_completo": usuario.nombre_completo,
+            "rol": usuario.rol,
+        }
+        for (_, usuario), hashed_password in zip(validos, hashes)
+    ]
+
+    try:
+        # Quien se registró mientras se hasheaba el lote no se inserta y se reporta
+        resultado = await db.execute(
+            pg_insert(Usuario).on_conflict_do_nothing().returning(Usuario),
+            valores
+        )
+        creados = resultado.scalars().all()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Error al importar los usuarios"
+        )
+
+    usernames_creados = {usuario.username for usuario in creados}
+    conflictos.extend(
+        ErrorImportacion(fila=fila, username=usuario.username, motivo="Registrado durante la importación")
+        for fila, usuario in validos if usuario.username not in usernames_creados
+    )
+    creados.sort(key=lambda usuario: usuario.id)
+    return ResultadoImportacion(creados=creados, conflictos=conflictos, errores=errores)
+
+
+async def cambiar_usuarios_masivo(db: AsyncSession, cambio: CambioMasivo, current_user: Usuario):
+    """Activar, desactivar o cambiar el rol de varios usuarios con un solo UPDATE"""
+    if current_user.rol != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo los administradores pueden modificar usuarios en lote"
+        )
+
+    if cambio.activo is None and cambio.rol is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indique el estado o el rol a aplicar"
+        )
+
+    if cambio.rol is not None and cambio.rol not in ROLES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Rol inválido: {cambio.rol}"
+        )
+
+    ids = list(dict.fromkeys(cambio.ids))
+    if len(ids) > IMPORTACION_MAX_FILAS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {IMPORTACION_MAX_FILAS} usuarios por operación"
+        )
+
+    # No permitir desactivarse ni quitarse el rol a sí mismo
+    omitidos = []
+    if current_user.id in ids and (cambio.activo is False or cambio.rol not in (None, current_user.rol)):
+        ids.remove(current_user.id)
+        omitidos.append(Omision(id=current_user.id, motivo="No puede desactivarse ni cambiar su propio rol"))
+
+    valores, difiere, invalida_tokens = {}, [], []
+    if cambio.activo is not None:
+        valores["activo"] = cambio.activo
+        difiere.append(Usuario.activo.is_distinct_from(cambio.activo))
+        if not cambio.activo:
+            invalida_tokens.append(Usuario.activo.is_distinct_from(False))
+    if cambio.rol is not None:
+        valores["rol"] = cambio.rol
+        difiere.append(Usuario.rol.is_distinct_from(cambio.rol))
+        invalida_tokens.append(Usuario.rol.is_distinct_from(cambio.rol))
+
+    # Igual que en los cambios individuales: desactivar o cambiar el rol invalida los tokens
+    if invalida_tokens:
+        valores["token_version"] = Usuario.token_version + case((or_(*invalida_tokens), 1), else_=0)
+
+    existentes = set((await db.execute(select(Usuario.id).where(Usuario.id.in_(ids)))).scalars().all())
+    resultado = await db.execute(
+        update(Usuario)
+        .where(Usuario.id.in_(existentes), or_(*difiere))
+        .values(**valores)
+        .returning(Usuario.id)
+        .execution_options(synchronize_session=False)
+    )
+    actualizados = sorted(resultado.scalars().all())
+    await db.commit()
+
+    for usuario_id in actualizados:
+        invalidar_usuario(usuario_id)
+
+    return ResultadoCambioMasivo(
+        actualizados=actualizados,
+        sin_cambios=sorted(existentes.difference(actualizados)),
+        no_encontrados=[usuario_id for usuario_id in ids if usuario_id not in existentes],
+        omitidos=omitidos,
+    )
@@ -0,0 +1,195 @@
+#D:\codigos\contador_cerdos_final\backend\instrumentacion_sql.py
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import greenlet
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+# Configuración (mismas variables que frontend/instrumentacion_sql.py)
+SQL_UMBRAL_MS = float(os.getenv("SQL_UMBRAL_MS", "200"))  # consultas más lentas van al log
+SQL_EXPLAIN = os.getenv("SQL_EXPLAIN", "0") == "1"  # capturar EXPLAIN (ANALYZE, BUFFERS) de las lentas
+SQL_EXPLAIN_INTERVALO = float(os.getenv("SQL_EXPLAIN_INTERVALO", "300"))  # por sentencia, en segundos
+SQL_MAX_SENTENCIAS = int(os.getenv("SQL_MAX_SENTENCIAS", "500"))
+
+DIRECTORIO_PROYECTO = Path(__file__).resolve().parent
+
+logger = logging.getLogger("sql_lento")
+
+
+def normalizar_sentencia(sql: str, largo: int = 300) -> str:
+    return re.sub(r"\s+", " ", sql).strip()[:largo]
+
+
+@lru_cache(maxsize=1024)
+def _es_del_proyecto(archivo: str) -> bool:
+    ruta = Path(archivo).resolve()
+    return ruta.parent == DIRECTORIO_PROYECTO and ruta != Path(__file__).resolve()
+
+
+def _sitio_en(frame):
+    while frame is not None:
+        if _es_del_proyecto(frame.f_code.co_filename):
+            return f"{Path(frame.f_code.co_filename).name}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return None
+
+
+def sitio_llamada() -> str:
+    """Primer frame del proyecto (fuera de SQLAlchemy) que originó la consulta"""
+    sitio = _sitio_en(sys._getframe(1))
+    if sitio is None:
+        # Con AsyncSession la consulta corre en un greenlet hijo: el código que hizo
+        # `await db.execute(...)` está en la pila del greenlet padre
+        padre = greenlet.getcurrent().parent
+        if padre is not None:
+            sitio = _sitio_en(padre.gr_frame)
+    return sitio or "desconocido"
+
+
+class RegistroConsultas:
+    """Tiempos acumulados por (sentencia, sitio de llamada) y log de consultas lentas"""
+
+    def __init__(self, umbral_ms: float = SQL_UMBRAL_MS, explain: bool = SQL_EXPLAIN,
+                 intervalo_explain: float = SQL_EXPLAIN_INTERVALO, max_sentencias: int = SQL_MAX_SENTENCIAS):
+        self.umbral = umbral_ms / 1000
+        self.explain = explain
+        self.intervalo_explain = intervalo_explain
+        self.max_sentencias = max_sentencias
+        self._estadisticas = {}  # (sentencia, sitio) -> dict
+        self._ultimo_explain = {}  # sentencia -> instante
+        self._lock = threading.Lock()
+
+    def registrar(self, sql: str, segundos: float, filas: int, sitio: str) -> bool:
+        """Acumular una ejecución; devuelve si conviene capturar su EXPLAIN"""
+        sentencia = normalizar_sentencia(sql)
+        clave = (sentencia, sitio)
+        with self._lock:
+            estadistica = self._estadisticas.get(clave)
+            if estadistica is None:
+                if len(self._estadisticas) >= self.max_sentencias:
+                    clave = ("(otras sentencias)", "varios")
+                estadistica = self._estadisticas.setdefault(
+                    clave, {"llamadas": 0, "segundos": 0.0, "max_segundos": 0.0, "filas": 0, "lentas": 0}
+                )
+            estadistica["llamadas"] += 1
+            estadistica["segundos"] += segundos
+            estadistica["max_segundos"] = max(estadistica["max_segundos"], segundos)
+            estadistica["filas"] += max(filas, 0)
+
+            if segundos < self.umbral:
+                return False
+            estadistica["lentas"] += 1
+
+            # EXPLAIN ANALYZE vuelve a ejecutar la consulta: solo lecturas y a lo sumo
+            # una vez por sentencia cada intervalo
+            capturar = False
+            if self.explain and sentencia.lower().startswith(("select", "with")):
+                ahora = time.monotonic()
+                if ahora - self._ultimo_explain.get(sentencia, float("-inf")) >= self.intervalo_explain:
+                    self._ultimo_explain[sentencia] = ahora
+                    capturar = True
+
+        logger.warning("Consulta lenta: %.1f ms, %d filas, %s: %s", segundos * 1000, filas, sitio, sentencia)
+        return capturar
+
+    def registrar_plan(self, sql: str, plan: str):
+        logger.warning("Plan de %s\n%s", normalizar_sentencia(sql, 120), plan)
+
+    def estadisticas(self, limite: int = 50) -> list:
+        """Sentencias ordenadas por tiempo total"""
+        with self._lock:
+            filas = [
+                {
+                    "sentencia": sentencia,
+                    "sitio": sitio,
+                    "llamadas": datos["llamadas"],
+                    "total_ms": round(datos["segundos"] * 1000, 2),
+                    "promedio_ms": round(datos["segundos"] * 1000 / datos["llamadas"], 2),
+                    "max_ms": round(datos["max_segundos"] * 1000, 2),
+                    "filas": datos["filas"],
+                    "lentas": datos["lentas"],
+                }
+                for (sentencia, sitio), datos in self._estadisticas.items()
+            ]
+        filas.sort(key=lambda fila: fila["total_ms"], reverse=True)
+        return filas[:limite]
+
+    def limpiar(self):
+        with self._lock:
+            self._estadisticas.clear()
+            self._ultimo_explain.clear()
+
+
+registro_consultas = RegistroConsultas()
+
+
+def instrumentar_engine(engine, registro: RegistroConsultas = registro_consultas):
+    """Medir cada sentencia del engine con los eventos de cursor de SQLAlchemy"""
+    engine = getattr(engine, "sync_engine", engine)  # AsyncEngine -> Engine
+
+    # Pila de (sentencia, inicio) en la conexión del pool: la vacían
+    # after_cursor_execute o, si la sentencia falla, handle_error
+    @event.listens_for(engine, "before_cursor_execute")
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicios_consulta", []).append((statement, time.perf_counter()))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def despues(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("inicios_consulta")
+        if not inicios:
+            return
+        segundos = time.perf_counter() - inicios.pop()[1]
+
+        filas = cursor.rowcount
+        if filas < 0 and cursor.description is not None:
+            # El adaptador de asyncpg precarga las filas de un SELECT y deja rowcount en -1
+            filas = len(getattr(cursor, "_rows", ()))
+
+        if registro.registrar(statement, segundos, filas, sitio_llamada()) and not executemany:
+            plan = explicar(conn.connection, statement, parameters)
+            if plan:
+                registro.registrar_plan(statement, plan)
+
+    @event.listens_for(engine, "handle_error")
+    def error(contexto):
+        if contexto.connection is None:  # falló la conexión, no una sentencia
+            return
+        # Solo la entrada de esta sentencia: un error al leer filas llega después
+        # de after_cursor_execute, cuando la entrada ya salió
+        inicios = contexto.connection.info.get("inicios_consulta")
+        if inicios and inicios[-1][0] == contexto.statement:
+            inicios.pop()
+
+
+def explicar(conexion_dbapi, statement, parameters):
+    """EXPLAIN (ANALYZE, BUFFERS) de una sentencia, o None si falla.
+
+    Usa un cursor aparte (no toca el resultado pendiente) dentro de un savepoint,
+    para que un error no deje abortada la transacción de la petición.
+    """
+    cursor = conexion_dbapi.cursor()
+    try:
+        cursor.execute("SAVEPOINT instrumentacion_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(fila[0] for fila in cursor.fetchall())
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT instrumentacion_explain")
+            logger.warning("No se pudo capturar el plan: %s", e)
+            return None
+        cursor.execute("RELEASE SAVEPOINT instrumentacion_explain")
+        return plan
+    except Exception as e:
+        logger.warning("No se pudo capturar el plan: %s", e)
+        return None
+    finally:
+        cursor.close()
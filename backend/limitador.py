@@ -0,0 +1,175 @@
+#D:\codigos\contador_cerdos_final\backend\limitador.py
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from auth import KDF_WORKERS
+
+load_dotenv()
+
+# Configuración: ráfaga permitida y recarga por minuto de cada cubo
+LOGIN_USUARIO_RAFAGA = int(os.getenv("LOGIN_USUARIO_RAFAGA", "5"))
+LOGIN_USUARIO_POR_MINUTO = float(os.getenv("LOGIN_USUARIO_POR_MINUTO", "5"))
+LOGIN_IP_RAFAGA = int(os.getenv("LOGIN_IP_RAFAGA", "20"))
+LOGIN_IP_POR_MINUTO = float(os.getenv("LOGIN_IP_POR_MINUTO", "30"))
+# Verificaciones de contraseña simultáneas; por defecto el doble de hilos de KDF
+LOGIN_MAX_CONCURRENTES = int(os.getenv("LOGIN_MAX_CONCURRENTES", str(2 * KDF_WORKERS)))
+# Cubos guardados por tipo de clave (los menos usados se descartan)
+LOGIN_MAX_CLAVES = int(os.getenv("LOGIN_MAX_CLAVES", "10000"))
+# Proxies (IPs o redes) cuyo X-Forwarded-For se acepta: el frontend de Streamlit y
+# el balanceador. Sin ellos todos los logins llegarían con la IP del frontend.
+PROXIES_CONFIABLES = tuple(
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv("PROXIES_CONFIABLES", "127.0.0.1,::1").split(",")
+    if proxy.strip()
+)
+
+
+def _es_confiable(ip: str, confiables) -> bool:
+    try:
+        direccion = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(direccion in red for red in confiables)
+
+
+def ip_cliente(ip_conexion: str, reenviado: str = None, confiables=PROXIES_CONFIABLES) -> str:
+    """IP real del cliente para el cubo por IP.
+
+    X-Forwarded-For solo se lee si la conexión viene de un proxy confiable, y se
+    recorre de derecha a izquierda saltando los proxies confiables: lo que está
+    a la izquierda del primer salto desconocido lo pudo escribir el propio cliente.
+    """
+    ip = ip_conexion
+    if not reenviado or not _es_confiable(ip, confiables):
+        return ip
+
+    for salto in reversed([salto.strip() for salto in reenviado.split(",") if salto.strip()]):
+        ip = salto
+        if not _es_confiable(salto, confiables):
+            break
+    return ip
+
+
+class LimiteExcedido(Exception):
+    def __init__(self, motivo: str, reintentar_en: float):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.reintentar_en = reintentar_en
+
+    @property
+    def retry_after(self) -> str:
+        """Valor de la cabecera Retry-After (segundos enteros, mínimo 1)"""
+        return str(max(1, math.ceil(self.reintentar_en)))
+
+
+class CubosTokens:
+    """Cubos de tokens por clave (usuario o IP) con LRU acotado.
+
+    Cada cubo admite una ráfaga de `rafaga` intentos y se recarga a `por_minuto`
+    tokens por minuto. Un cubo descartado por el LRU vuelve lleno, por eso el
+    límite de claves debe superar con holgura las claves activas normales.
+    """
+
+    def __init__(self, rafaga: int, por_minuto: float, max_claves: int = LOGIN_MAX_CLAVES):
+        self.rafaga = rafaga
+        self.tasa = por_minuto / 60
+        self.max_claves = max_claves
+        self._cubos = OrderedDict()  # clave -> (tokens, actualizado_en)
+
+    def _tokens(self, clave: str, ahora: float) -> float:
+        tokens, actualizado_en = self._cubos.get(clave, (self.rafaga, ahora))
+        return min(self.rafaga, tokens + (ahora - actualizado_en) * self.tasa)
+
+    def espera(self, clave: str, ahora: float) -> float:
+        """Segundos hasta que haya un token disponible (0 si ya hay)"""
+        faltante = 1 - self._tokens(clave, ahora)
+        if faltante <= 0:
+            return 0.0
+        return faltante / self.tasa if self.tasa > 0 else float("inf")
+
+    def consumir(self, clave: str, ahora: float):
+        self._cubos[clave] = (self._tokens(clave, ahora) - 1, ahora)
+        self._cubos.move_to_end(clave)
+        while len(self._cubos) > self.max_claves:
+            self._cubos.popitem(last=False)
+
+    def __len__(self):
+        return len(self._cubos)
+
+
+class LimitadorLogin:
+    """Control de admisión de /login: cubos por usuario y por IP más un tope global
+    de verificaciones de contraseña en curso.
+
+    Se rechaza antes de tocar el KDF, así que una ráfaga de intentos cuesta unos
+    microsegundos por petición en lugar de un hash completo.
+    """
+
+    def __init__(self,
+                 usuario_rafaga: int = LOGIN_USUARIO_RAFAGA, usuario_por_minuto: float = LOGIN_USUARIO_POR_MINUTO,
+                 ip_rafaga: int = LOGIN_IP_RAFAGA, ip_por_minuto: float = LOGIN_IP_POR_MINUTO,
+                 max_concurrentes: int = LOGIN_MAX_CONCURRENTES):
+        self.por_usuario = CubosTokens(usuario_rafaga, usuario_por_minuto)
+        self.por_ip = CubosTokens(ip_rafaga, ip_por_minuto)
+        self.max_concurrentes = max_concurrentes
+        self.en_curso = 0
+        self.contadores = {
+            "admitidos": 0,
+            "rechazados_usuario": 0,
+            "rechazados_ip": 0,
+            "rechazados_concurrencia": 0,
+        }
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admitir(self, username: str, ip: str):
+        """Reservar un intento de login o lanzar LimiteExcedido"""
+        usuario = (username or "").strip().lower()
+        ahora = time.monotonic()
+
+        with self._lock:
+            # Comprobar todo antes de consumir: un rechazo no gasta tokens del otro cubo
+            espera_ip = self.por_ip.espera(ip, ahora)
+            if espera_ip > 0:
+                self.contadores["rechazados_ip"] += 1
+                raise LimiteExcedido("Demasiados intentos desde esta dirección", espera_ip)
+
+            espera_usuario = self.por_usuario.espera(usuario, ahora)
+            if espera_usuario > 0:
+                self.contadores["rechazados_usuario"] += 1
+                raise LimiteExcedido("Demasiados intentos para este usuario", espera_usuario)
+
+            if self.en_curso >= self.max_concurrentes:
+                self.contadores["rechazados_concurrencia"] += 1
+                raise LimiteExcedido("Servidor ocupado, intente nuevamente", 1)
+
+            self.por_ip.consumir(ip, ahora)
+            self.por_usuario.consumir(usuario, ahora)
+            self.en_curso += 1
+            self.contadores["admitidos"] += 1
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.en_curso -= 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                **self.contadores,
+                "en_curso": self.en_curso,
+                "max_concurrentes": self.max_concurrentes,
+                "usuarios_registrados": len(self.por_usuario),
+                "ips_registradas": len(self.por_ip),
+            }
+
+
+limitador_login = LimitadorLogin()
@@ -1,32 +1,45 @@
 #D:\codigos\contador_cerdos_final\backend\main.py
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Body, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
+from typing import Any, List, Optional
+import asyncio
+import time
 import uvicorn
 import os
 
-from database import engine, get_db
-from models import Base, Usuario, TokenBlacklist
+from database import get_db, AsyncSessionLocal, async_engine, OPCIONES_POOL, conectar_escucha, inicializar_esquema
+from models import Usuario
+from limitador import limitador_login, LimiteExcedido, ip_cliente
+from metricas import MiddlewareMetricas, TimeoutPool, estadisticas_pool, exportar_metricas
+from instrumentacion_sql import registro_consultas
+from perfilador import MiddlewarePerfilador, listar_perfiles, ruta_perfil
+from condicional import calcular_etag, no_modificado, aplicar_validadores, respuesta_no_modificada
+from revocacion import (
+    registro_revocacion, REVOCACION_RECONSTRUIR_SEGUNDOS, REVOCACION_PURGA_SEGUNDOS
+)
 from schemas import (
     UsuarioCreate, UsuarioResponse, UsuarioUpdate,
-    Token, LoginRequest, CambioPassword
+    Token, LoginRequest, CambioPassword, Principal,
+    CambioMasivo, ResultadoImportacion, ResultadoCambioMasivo
 )
 from auth import (
-    verify_password, create_access_token,
-    get_current_user, get_password_hash,
-    agregar_token_blacklist, verificar_rol
+    verify_password_async, verify_and_update_async, create_access_token,
+    get_current_user, get_principal, get_password_hash_async,
+    agregar_token_blacklist, verificar_rol,
+    oauth2_scheme, invalidar_usuario,
+    claims_usuario, incrementar_version_token
 )
 from crud import (
     get_usuario_by_username, create_usuario,
-    get_usuarios, update_usuario, delete_usuario,
-    cambiar_estado_usuario
+    get_usuarios, version_usuarios, contar_usuarios, update_usuario, delete_usuario,
+    cambiar_estado_usuario, get_usuario,
+    importar_usuarios, leer_importacion_csv, cambiar_usuarios_masivo
 )
 
-# Crear tablas en la base de datos
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="API de Autenticación - Sistema de Conteo",
     description="API para gestión de usuarios y autenticación",
@@ -40,25 +53,101 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Siguiente-Cursor", "X-Total-Count", "ETag", "Last-Modified", "X-Perfil"],
 )
+app.add_middleware(MiddlewarePerfilador)
+# Último en agregarse = el más externo: mide también el trabajo de CORS y del perfilador
+app.add_middleware(MiddlewareMetricas)
+
+
+@app.exception_handler(TimeoutPool)
+async def pool_agotado(request: Request, exc: TimeoutPool):
+    """Sin conexión libre tras DB_POOL_TIMEOUT: 503 en vez de un 500 genérico"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Servidor ocupado, intente nuevamente en unos segundos"},
+        headers={"Retry-After": "5"},
+    )
+
+
+# ==================== TAREAS DE FONDO ====================
+
+async def mantener_revocaciones(purgar: bool):
+    """Purgar revocaciones expiradas (si toca) y reconstruir el filtro de Bloom"""
+    async with AsyncSessionLocal() as db:
+        if purgar:
+            await registro_revocacion.purgar_expirados(db)
+        await registro_revocacion.reconstruir(db)
+
+
+async def tarea_revocaciones():
+    ultima_purga = time.monotonic()
+    while True:
+        await asyncio.sleep(REVOCACION_RECONSTRUIR_SEGUNDOS)
+        purgar = time.monotonic() - ultima_purga >= REVOCACION_PURGA_SEGUNDOS
+        try:
+            await mantener_revocaciones(purgar)
+            if purgar:
+                ultima_purga = time.monotonic()
+        except Exception as e:
+            print(f"Error al mantener las revocaciones: {e}")
+
+
+@app.on_event("startup")
+async def iniciar_revocaciones():
+    # Crear tablas en la base de datos
+    await inicializar_esquema()
+    await mantener_revocaciones(True)
+    # Revocaciones de los otros workers; hasta que escuche, se confirma todo en la base
+    app.state.tarea_escucha = asyncio.create_task(
+        registro_revocacion.escuchar(conectar_escucha, AsyncSessionLocal)
+    )
+    app.state.tarea_revocaciones = asyncio.create_task(tarea_revocaciones())
+
+
+@app.on_event("shutdown")
+async def detener_revocaciones():
+    app.state.tarea_escucha.cancel()
+    app.state.tarea_revocaciones.cancel()
 
 
 # ==================== ENDPOINTS DE AUTENTICACIÓN ====================
 
 @app.post("/login", response_model=Token)
 async def login(
+        request: Request,
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    usuario = get_usuario_by_username(db, username=form_data.username)
+    # Control de admisión: rechazar rápido antes de gastar CPU en el KDF
+    ip = ip_cliente(request.client.host if request.client else "desconocida",
+                    request.headers.get("x-forwarded-for"))
+    try:
+        with limitador_login.admitir(form_data.username, ip):
+            usuario = await get_usuario_by_username(db, username=form_data.username)
+
+            valida, hash_nuevo = (False, None)
+            if usuario:
+                valida, hash_nuevo = await verify_and_update_async(form_data.password, usuario.hashed_password)
+    except LimiteExcedido as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=e.motivo,
+            headers={"Retry-After": e.retry_after},
+        )
 
-    if not usuario or not verify_password(form_data.password, usuario.hashed_password):
+    if not valida:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Hash con parámetros del KDF distintos a los actuales: guardar el nuevo
+    if hash_nuevo:
+        usuario.hashed_password = hash_nuevo
+        await db.commit()
+
     if not usuario.activo:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -68,7 +157,7 @@ async def login(
     # Crear token de acceso
     access_token_expires = timedelta(minutes=60 * 24)  # 24 horas
     access_token = create_access_token(
-        data={"sub": usuario.username, "rol": usuario.rol},
+        data=claims_usuario(usuario),
         expires_delta=access_token_expires
     )
 
@@ -81,31 +170,42 @@ async def login(
 
 @app.post("/logout")
 async def logout(
-        token: str = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        token: str = Depends(oauth2_scheme),
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
 ):
     """Invalidar token actual"""
-    agregar_token_blacklist(token, db)
+    await agregar_token_blacklist(token, db)
     return {"message": "Sesión cerrada correctamente"}
 
 
 @app.post("/cambiar-password")
 async def cambiar_password(
         cambio_password: CambioPassword,
-        usuario_actual: Usuario = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
 ):
     """Cambiar contraseña del usuario actual"""
+    # El usuario autenticado solo trae los claims del token: leer la fila actual
+    usuario = await get_usuario(db, usuario_actual.id)
+    if usuario is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+
     # Verificar contraseña actual
-    if not verify_password(cambio_password.password_actual, usuario_actual.hashed_password):
+    if not await verify_password_async(cambio_password.password_actual, usuario.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Contraseña actual incorrecta"
         )
 
     # Actualizar contraseña
-    usuario_actual.hashed_password = get_password_hash(cambio_password.password_nuevo)
-    db.commit()
+    usuario.hashed_password = await get_password_hash_async(cambio_password.password_nuevo)
+    incrementar_version_token(usuario)
+    await db.commit()
+    invalidar_usuario(usuario.id)
 
     return {"message": "Contraseña cambiada correctamente"}
 
@@ -115,30 +215,105 @@ async def cambiar_password(
 @app.post("/usuarios/", response_model=UsuarioResponse)
 async def crear_usuario(
         usuario: UsuarioCreate,
-        usuario_actual: Usuario = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
 ):
     """Crear nuevo usuario (solo admin)"""
     verificar_rol(usuario_actual, "admin")
-    return create_usuario(db=db, usuario=usuario)
+    return await create_usuario(db=db, usuario=usuario)
 
 
 @app.get("/usuarios/", response_model=list[UsuarioResponse])
 async def leer_usuarios(
-        skip: int = 0,
-        limit: int = 100,
-        usuario_actual: Usuario = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        request: Request,
+        response: Response,
+        despues_de: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=500),
+        rol: Optional[str] = None,
+        activo: Optional[bool] = None,
+        buscar: Optional[str] = Query(None, max_length=100),
+        contar: bool = False,
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
 ):
-    """Obtener lista de usuarios (solo admin)"""
+    """Obtener una página de usuarios (solo admin)
+
+    - despues_de: cursor; el id en X-Siguiente-Cursor de la página anterior
+    - rol / activo: filtros exactos
+    - buscar: prefijo de username o email (sin distinguir mayúsculas)
+    - contar: incluir X-Total-Count con el total que cumple los filtros
+
+    Con If-None-Match responde 304 sin leer los usuarios de la página.
+    """
     verificar_rol(usuario_actual, "admin")
-    usuarios = get_usuarios(db, skip=skip, limit=limit)
+    version, ultima_modificacion = await version_usuarios(db)
+    etag = calcular_etag("usuarios", version, despues_de, limit, rol, activo, buscar, contar)
+    # Last-Modified es informativo (de toda la tabla): solo se valida el ETag
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag, ultima_modificacion)
+
+    usuarios, siguiente = await get_usuarios(
+        db, despues_de=despues_de, limit=limit, rol=rol, activo=activo, buscar=buscar
+    )
+    aplicar_validadores(response, etag, ultima_modificacion)
+    if siguiente is not None:
+        response.headers["X-Siguiente-Cursor"] = str(siguiente)
+    if contar:
+        response.headers["X-Total-Count"] = str(await contar_usuarios(db, rol=rol, activo=activo, buscar=buscar))
     return usuarios
 
 
+@app.post("/usuarios/importar", response_model=ResultadoImportacion)
+async def importar_usuarios_json(
+        usuarios: List[Any] = Body(...),
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """Crear usuarios en lote desde una lista JSON de UsuarioCreate (solo admin)
+
+    Las filas inválidas o ya registradas se reportan y no impiden crear el resto.
+    """
+    verificar_rol(usuario_actual, "admin")
+    registros = list(enumerate(usuarios, start=1))
+    return await importar_usuarios(db, registros, usuario_actual)
+
+
+@app.post("/usuarios/importar/csv", response_model=ResultadoImportacion)
+async def importar_usuarios_csv(
+        archivo: UploadFile = File(...),
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """Crear usuarios en lote desde un CSV con cabecera
+    username,email,password[,nombre_completo,rol] (solo admin)"""
+    verificar_rol(usuario_actual, "admin")
+    registros = leer_importacion_csv(await archivo.read())
+    return await importar_usuarios(db, registros, usuario_actual)
+
+
+@app.patch("/usuarios/masivo", response_model=ResultadoCambioMasivo)
+async def cambiar_usuarios(
+        cambio: CambioMasivo,
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """Activar, desactivar o cambiar el rol de varios usuarios (solo admin)"""
+    verificar_rol(usuario_actual, "admin")
+    return await cambiar_usuarios_masivo(db, cambio, usuario_actual)
+
+
 @app.get("/usuarios/me", response_model=UsuarioResponse)
-async def leer_usuario_actual(usuario_actual: Usuario = Depends(get_current_user)):
-    """Obtener información del usuario actual"""
+async def leer_usuario_actual(
+        request: Request,
+        response: Response,
+        usuario_actual: Usuario = Depends(get_current_user)
+):
+    """Obtener información del usuario actual (admite If-None-Match / If-Modified-Since)"""
+    etag = calcular_etag("usuario", usuario_actual.id, usuario_actual.actualizado_en)
+    if no_modificado(request, etag, usuario_actual.actualizado_en):
+        return respuesta_no_modificada(etag, usuario_actual.actualizado_en)
+
+    aplicar_validadores(response, etag, usuario_actual.actualizado_en)
     return usuario_actual
 
 
@@ -146,48 +321,104 @@ async def leer_usuario_actual(usuario_actual: Usuario = Depends(get_current_user
 async def actualizar_usuario(
         usuario_id: int,
         usuario_update: UsuarioUpdate,
-        usuario_actual: Usuario = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
 ):
     """Actualizar usuario"""
-    return update_usuario(db, usuario_id, usuario_update, usuario_actual)
+    return await update_usuario(db, usuario_id, usuario_update, usuario_actual)
 
 
 @app.delete("/usuarios/{usuario_id}")
 async def eliminar_usuario(
         usuario_id: int,
-        usuario_actual: Usuario = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
 ):
     """Eliminar usuario (solo admin)"""
-    return delete_usuario(db, usuario_id, usuario_actual)
+    return await delete_usuario(db, usuario_id, usuario_actual)
 
 
 @app.patch("/usuarios/{usuario_id}/activar")
 async def activar_usuario(
         usuario_id: int,
-        usuario_actual: Usuario = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
 ):
     """Activar/desactivar usuario (solo admin)"""
-    return cambiar_estado_usuario(db, usuario_id, True, usuario_actual)
+    return await cambiar_estado_usuario(db, usuario_id, True, usuario_actual)
 
 
 @app.patch("/usuarios/{usuario_id}/desactivar")
 async def desactivar_usuario(
         usuario_id: int,
-        usuario_actual: Usuario = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        usuario_actual: Principal = Depends(get_principal),
+        db: AsyncSession = Depends(get_db)
 ):
     """Activar/desactivar usuario (solo admin)"""
-    return cambiar_estado_usuario(db, usuario_id, False, usuario_actual)
+    return await cambiar_estado_usuario(db, usuario_id, False, usuario_actual)
+
+
+# ==================== ENDPOINTS DE ADMINISTRACIÓN ====================
+
+@app.get("/admin/limitador")
+async def estado_limitador(usuario_actual: Principal = Depends(get_principal)):
+    """Contadores del control de admisión de /login (solo admin)"""
+    verificar_rol(usuario_actual, "admin")
+    return limitador_login.estadisticas()
+
+
+@app.get("/admin/pool")
+async def estado_pool(usuario_actual: Principal = Depends(get_principal)):
+    """Configuración, ocupación y tiempos de espera del pool de conexiones (solo admin)"""
+    verificar_rol(usuario_actual, "admin")
+    return estadisticas_pool(async_engine, OPCIONES_POOL)
+
+
+@app.get("/admin/consultas")
+async def consultas_sql(
+        limite: int = Query(50, ge=1, le=500),
+        usuario_actual: Principal = Depends(get_principal)
+):
+    """Tiempos por sentencia SQL y sitio de llamada, por tiempo total (solo admin)"""
+    verificar_rol(usuario_actual, "admin")
+    return registro_consultas.estadisticas(limite)
+
+
+@app.get("/admin/perfiles")
+async def perfiles_guardados(usuario_actual: Principal = Depends(get_principal)):
+    """Perfiles de peticiones guardados: solicitados con X-Perfilar y lentos (solo admin)"""
+    verificar_rol(usuario_actual, "admin")
+    return listar_perfiles()
+
+
+@app.get("/admin/perfiles/{tipo}/{nombre}")
+async def descargar_perfil(tipo: str, nombre: str, usuario_actual: Principal = Depends(get_principal)):
+    """Descargar un perfil en formato speedscope (solo admin)"""
+    verificar_rol(usuario_actual, "admin")
+    archivo = ruta_perfil(tipo, nombre)
+    if archivo is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil no encontrado")
+    return FileResponse(archivo, media_type="application/json", filename=nombre)
 
 
 # ==================== ENDPOINTS DE VERIFICACIÓN ====================
 
 @app.get("/verify-token")
-async def verify_token_endpoint(usuario_actual: Usuario = Depends(get_current_user)):
-    """Verificar si el token es válido"""
+async def verify_token_endpoint(
+        request: Request,
+        response: Response,
+        usuario_actual: Principal = Depends(get_principal)
+):
+    """Verificar si el token es válido (solo claims: normalmente sin consultas)
+
+    Un token inválido responde 401 antes de evaluar If-None-Match, así que un 304
+    también confirma que el token sigue vigente.
+    """
+    etag = calcular_etag("principal", usuario_actual.id, usuario_actual.username, usuario_actual.rol)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    aplicar_validadores(response, etag)
     return {"valid": True, "user": usuario_actual}
 
 
@@ -195,8 +426,22 @@ async def verify_token_endpoint(usuario_actual: Usuario = Depends(get_current_us
 
 @app.get("/health")
 async def health_check():
-    """Endpoint para verificar estado del servidor"""
-    return {"status": "healthy", "service": "auth-api"}
+    """Endpoint para verificar estado del servidor (no consulta la base)"""
+    pool = estadisticas_pool(async_engine, OPCIONES_POOL)
+    return {
+        "status": "degraded" if pool["saturado"] else "healthy",
+        "service": "auth-api",
+        "pool": {clave: pool[clave] for clave in ("en_uso", "libres", "desborde", "saturado", "timeouts", "espera_p95_ms")},
+    }
+
+
+# ==================== MÉTRICAS ====================
+
+@app.get("/metrics", include_in_schema=False)
+async def exponer_metricas():
+    """Métricas en formato Prometheus (peticiones, latencias, pool de la base y KDF)"""
+    cuerpo, tipo = exportar_metricas()
+    return Response(content=cuerpo, headers={"Content-Type": tipo})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+#D:\codigos\contador_cerdos_final\backend\metricas.py
+import time
+from collections import deque
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, disable_created_metrics, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy.exc import TimeoutError as TimeoutPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Métricas de la API en formato Prometheus (un solo proceso de uvicorn: el registro
+# global del proceso basta). Las etiquetas de ruta usan la plantilla
+# (/usuarios/{usuario_id}) y no la URL, para acotar la cardinalidad.
+
+# Las series *_created solo agregan volumen al scrape
+disable_created_metrics()
+
+PETICIONES = Counter(
+    "api_peticiones_total", "Peticiones HTTP atendidas",
+    ["metodo", "ruta", "estado"],
+)
+DURACION_PETICION = Histogram(
+    "api_peticion_duracion_segundos", "Duración de las peticiones HTTP",
+    ["metodo", "ruta"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+PETICIONES_EN_CURSO = Gauge(
+    "api_peticiones_en_curso", "Peticiones HTTP en curso",
+)
+ESPERA_CONEXION_DB = Histogram(
+    "api_db_checkout_segundos", "Tiempo para obtener una conexión del pool (espera y apertura)",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+TIMEOUTS_CONEXION_DB = Counter(
+    "api_db_checkout_timeouts_total", "Checkouts que agotaron pool_timeout sin obtener conexión",
+)
+DURACION_KDF = Histogram(
+    "api_kdf_duracion_segundos", "Duración del KDF de contraseñas",
+    ["operacion"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+RUTA_DESCONOCIDA = "sin_ruta"
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro: cuenta, mide y lleva las peticiones en curso.
+
+    Al no envolver la respuesta en objetos de Starlette (como BaseHTTPMiddleware)
+    el costo por petición es un par de lecturas de reloj y tres actualizaciones de
+    métricas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        PETICIONES_EN_CURSO.inc()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            PETICIONES_EN_CURSO.dec()
+            # FastAPI deja en el scope la ruta que atendió la petición
+            ruta = scope.get("route")
+            plantilla = getattr(ruta, "path", RUTA_DESCONOCIDA)
+            metodo = scope["method"]
+            DURACION_PETICION.labels(metodo, plantilla).observe(time.perf_counter() - inicio)
+            PETICIONES.labels(metodo, plantilla, str(estado)).inc()
+
+
+class PoolMedido(AsyncAdaptedQueuePool):
+    """Pool de conexiones que registra cuánto tarda cada checkout.
+
+    Además del histograma de Prometheus guarda agregados propios (para
+    /admin/pool y /health): se reinician si el pool se recrea (engine.dispose()).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.segundos_espera = 0.0
+        self.max_segundos_espera = 0.0
+        self.esperas_recientes = deque(maxlen=1000)
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            return super().connect()
+        except TimeoutPool:
+            self.timeouts += 1
+            TIMEOUTS_CONEXION_DB.inc()
+            raise
+        finally:
+            segundos = time.perf_counter() - inicio
+            ESPERA_CONEXION_DB.observe(segundos)
+            self.checkouts += 1
+            self.segundos_espera += segundos
+            self.max_segundos_espera = max(self.max_segundos_espera, segundos)
+            self.esperas_recientes.append(segundos)
+
+
+def estadisticas_pool(engine, opciones: dict) -> dict:
+    """Configuración, ocupación y esperas del pool de un engine
+
+    La configuración se informa desde `opciones` (las que se pasaron a
+    create_engine) y el estado en vivo solo con la API pública del pool.
+    """
+    pool = engine.pool
+    max_desborde = opciones["max_overflow"]
+    en_uso = pool.checkedout()
+    estadisticas = {
+        "tamano": pool.size(),
+        "max_desborde": max_desborde,
+        "timeout_s": opciones["pool_timeout"],
+        "reciclar_s": opciones["pool_recycle"],
+        "pre_ping": opciones["pool_pre_ping"],
+        "en_uso": en_uso,
+        "libres": pool.checkedin(),
+        "desborde": pool.overflow(),
+        # max_desborde -1 significa sin límite
+        "saturado": max_desborde >= 0 and en_uso >= pool.size() + max_desborde,
+    }
+    if isinstance(pool, PoolMedido):
+        recientes = sorted(pool.esperas_recientes)
+        estadisticas.update({
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "espera_promedio_ms": round(pool.segundos_espera * 1000 / pool.checkouts, 2) if pool.checkouts else 0.0,
+            "espera_p95_ms": round(recientes[int(len(recientes) * 0.95)] * 1000, 2) if recientes else 0.0,
+            "espera_max_ms": round(pool.max_segundos_espera * 1000, 2),
+        })
+    return estadisticas
+
+
+class ColectorPool:
+    """Estado del pool leído en cada scrape (sin costo entre scrapes)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def collect(self):
+        pool = self.engine.pool
+        for nombre, descripcion, valor in (
+            ("api_db_pool_tamano", "Conexiones permanentes configuradas", pool.size()),
+            ("api_db_pool_en_uso", "Conexiones prestadas a sesiones", pool.checkedout()),
+            ("api_db_pool_libres", "Conexiones abiertas esperando en el pool", pool.checkedin()),
+            ("api_db_pool_desborde", "Conexiones por encima de pool_size (negativo: sin abrir)", pool.overflow()),
+        ):
+            yield GaugeMetricFamily(nombre, descripcion, value=valor)
+
+
+def registrar_pool(engine):
+    REGISTRY.register(ColectorPool(engine))
+
+
+def exportar_metricas():
+    """(cuerpo, content type) en formato de texto de Prometheus"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
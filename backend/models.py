@@ -1,5 +1,5 @@
 #D:\codigos\contador_cerdos_final\backend\models.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func
+from sqlalchemy import Column, BigInteger, Integer, String, Boolean, DateTime, func
 from database import Base
 
 
@@ -13,6 +13,7 @@ class Usuario(Base):
     nombre_completo = Column(String(100))
     rol = Column(String(20), default="usuario")  # admin, supervisor, usuario
     activo = Column(Boolean, default=True)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")  # invalida tokens previos
     creado_en = Column(DateTime, default=func.now())
     actualizado_en = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -21,5 +22,13 @@ class TokenBlacklist(Base):
     __tablename__ = "token_blacklist"
 
     id = Column(Integer, primary_key=True, index=True)
-    token = Column(String(500), unique=True, index=True)
-    expirado_en = Column(DateTime, nullable=False)
\ No newline at end of file
+    jti = Column(String(64), unique=True, index=True, nullable=False)  # jti o sha256 del token
+    expirado_en = Column(DateTime, nullable=False, index=True)  # UTC
+
+
+class VersionTabla(Base):
+    __tablename__ = "versiones_tablas"
+
+    tabla = Column(String(63), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")  # la sube un trigger
+    modificado_en = Column(DateTime, default=func.now())
\ No newline at end of file
@@ -0,0 +1,192 @@
+#D:\codigos\contador_cerdos_final\backend\perfilador.py
+import asyncio
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+
+from auth import get_principal
+from database import AsyncSessionLocal
+
+load_dotenv()
+
+# Configuración
+PERFILES_DIR = Path(os.getenv("PERFILES_DIR", "perfiles"))
+PERFILES_MAX = int(os.getenv("PERFILES_MAX", "20"))  # por tipo: solicitados y lentos
+PERFIL_UMBRAL_MS = float(os.getenv("PERFIL_UMBRAL_MS", "1000"))  # se guarda si tarda más
+# Rutas perfiladas siempre (la ruta o lo que cuelga de ella); vacío para desactivar
+PERFIL_RUTAS = tuple(ruta.strip().rstrip("/") for ruta in os.getenv("PERFIL_RUTAS", "/login,/usuarios").split(",")
+                     if ruta.strip())
+PERFIL_INTERVALO = float(os.getenv("PERFIL_INTERVALO", "0.001"))  # segundos entre muestras (a pedido)
+PERFIL_INTERVALO_AUTOMATICO = float(os.getenv("PERFIL_INTERVALO_AUTOMATICO", "0.01"))  # más barato
+PERFIL_MAX_SIMULTANEOS = int(os.getenv("PERFIL_MAX_SIMULTANEOS", "8"))
+
+EXTENSION = ".speedscope.json"
+
+
+def _nombre_seguro(texto: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", texto).strip("_") or "raiz"
+
+
+def _duracion_de(archivo: Path) -> int:
+    # Los perfiles lentos empiezan con la duración en ms: 00001234ms_...
+    try:
+        return int(archivo.name.split("ms_", 1)[0])
+    except ValueError:
+        return 0
+
+
+class MiddlewarePerfilador:
+    """Perfilado por muestreo (pyinstrument) de peticiones individuales.
+
+    - A pedido: cabecera `X-Perfilar: 1` o `?perfilar=1` con un token de admin. Se
+      guarda siempre y la respuesta indica el archivo en `X-Perfil`.
+    - Automático: toda petición a PERFIL_RUTAS se perfila con un intervalo más
+      grueso (PERFIL_INTERVALO_AUTOMATICO) y se guarda si supera PERFIL_UMBRAL_MS;
+      la duración solo se conoce al terminar, así que el umbral decide qué se guarda.
+
+    Los perfiles se escriben en formato speedscope (https://www.speedscope.app) en
+    PERFILES_DIR/solicitados (los N más recientes) y PERFILES_DIR/lentos (los N
+    más lentos). Las demás rutas solo pagan una comparación. Con más de
+    PERFIL_MAX_SIMULTANEOS perfiles en curso, las peticiones extra no se perfilan.
+    """
+
+    def __init__(self, app, directorio: Path = PERFILES_DIR, max_perfiles: int = PERFILES_MAX,
+                 umbral_ms: float = PERFIL_UMBRAL_MS, rutas: tuple = PERFIL_RUTAS,
+                 intervalo: float = PERFIL_INTERVALO, intervalo_automatico: float = PERFIL_INTERVALO_AUTOMATICO,
+                 max_simultaneos: int = PERFIL_MAX_SIMULTANEOS):
+        self.app = app
+        self.directorio = Path(directorio)
+        self.max_perfiles = max_perfiles
+        self.umbral = umbral_ms / 1000
+        self.rutas = rutas
+        self.intervalo = intervalo
+        self.intervalo_automatico = intervalo_automatico
+        self.max_simultaneos = max_simultaneos
+        self.en_curso = 0
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        solicitado = self._solicitado(scope) and await self._es_admin(scope)
+        automatico = not solicitado and self._ruta_objetivo(scope["path"])
+        if not (solicitado or automatico) or not self._reservar():
+            await self.app(scope, receive, send)
+            return
+
+        nombre = None
+        if solicitado:
+            nombre = (f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}_"
+                      f"{scope['method']}_{_nombre_seguro(scope['path'])}{EXTENSION}")
+
+        async def enviar(mensaje):
+            if nombre and mensaje["type"] == "http.response.start":
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [(b"x-perfil", nombre.encode())]
+            await send(mensaje)
+
+        perfil = Profiler(interval=self.intervalo if solicitado else self.intervalo_automatico, async_mode="enabled")
+        inicio = time.perf_counter()
+        perfil.start()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            perfil.stop()
+            duracion = time.perf_counter() - inicio
+            self._liberar()
+
+        if solicitado:
+            await self._guardar(perfil, self.directorio / "solicitados", nombre)
+        elif duracion >= self.umbral:
+            nombre = (f"{int(duracion * 1000):08d}ms_{scope['method']}_{_nombre_seguro(scope['path'])}_"
+                      f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}{EXTENSION}")
+            await self._guardar(perfil, self.directorio / "lentos", nombre)
+
+    def _ruta_objetivo(self, ruta: str) -> bool:
+        ruta = ruta.rstrip("/")
+        return any(ruta == objetivo or ruta.startswith(objetivo + "/") for objetivo in self.rutas)
+
+    def _solicitado(self, scope) -> bool:
+        for clave, valor in scope.get("headers", []):
+            if clave == b"x-perfilar":
+                return valor.strip() not in (b"", b"0")
+        consulta = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return consulta.get("perfilar", ["0"])[-1] not in ("", "0")
+
+    async def _es_admin(self, scope) -> bool:
+        autorizacion = dict(scope.get("headers", [])).get(b"authorization", b"").decode("latin-1")
+        esquema, _, token = autorizacion.partition(" ")
+        if esquema.lower() != "bearer" or not token:
+            return False
+
+        # Misma validación que los endpoints; normalmente no consulta la base
+        async with AsyncSessionLocal() as db:
+            try:
+                principal = await get_principal(token, db)
+            except HTTPException:
+                return False
+        return principal.rol == "admin"
+
+    def _reservar(self) -> bool:
+        # Tope de perfiles simultáneos: acota el costo de muestrear bajo carga
+        with self._lock:
+            if self.en_curso >= self.max_simultaneos:
+                return False
+            self.en_curso += 1
+            return True
+
+    def _liberar(self):
+        with self._lock:
+            self.en_curso -= 1
+
+    async def _guardar(self, perfil: Profiler, carpeta: Path, nombre: str):
+        loop = asyncio.get_running_loop()
+        try:
+            # Renderizar y escribir fuera del event loop
+            await loop.run_in_executor(None, self._escribir, perfil, carpeta, nombre)
+        except Exception as e:
+            print(f"Error guardando el perfil {nombre}: {e}")
+
+    def _escribir(self, perfil: Profiler, carpeta: Path, nombre: str):
+        carpeta.mkdir(parents=True, exist_ok=True)
+        temporal = carpeta / f".{nombre}.tmp"
+        temporal.write_text(perfil.output(renderer=SpeedscopeRenderer()), encoding="utf-8")
+        temporal.replace(carpeta / nombre)
+
+        # Conservar los N más recientes (solicitados) o los N más lentos
+        orden = _duracion_de if carpeta.name == "lentos" else (lambda archivo: archivo.stat().st_mtime)
+        archivos = sorted(carpeta.glob(f"*{EXTENSION}"), key=orden, reverse=True)
+        for archivo in archivos[self.max_perfiles:]:
+            archivo.unlink(missing_ok=True)
+
+
+def listar_perfiles(directorio: Path = PERFILES_DIR) -> dict:
+    """Perfiles guardados por tipo, del más reciente/lento al menos"""
+    perfiles = {}
+    for tipo, orden in (("solicitados", lambda archivo: archivo.stat().st_mtime), ("lentos", _duracion_de)):
+        carpeta = Path(directorio) / tipo
+        archivos = sorted(carpeta.glob(f"*{EXTENSION}"), key=orden, reverse=True) if carpeta.is_dir() else []
+        perfiles[tipo] = [
+            {"nombre": archivo.name, "bytes": archivo.stat().st_size,
+             "creado_en": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(archivo.stat().st_mtime))}
+            for archivo in archivos
+        ]
+    return perfiles
+
+
+def ruta_perfil(tipo: str, nombre: str, directorio: Path = PERFILES_DIR):
+    """Ruta de un perfil guardado o None (sin permitir salir del directorio)"""
+    if tipo not in ("solicitados", "lentos") or Path(nombre).name != nombre or not nombre.endswith(EXTENSION):
+        return None
+    archivo = Path(directorio) / tipo / nombre
+    return archivo if archivo.is_file() else None
@@ -0,0 +1,171 @@
+#D:\codigos\contador_cerdos_final\backend\revocacion.py
+import asyncio
+import hashlib
+import math
+import os
+import threading
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import TokenBlacklist
+
+load_dotenv()
+
+# Configuración
+REVOCACION_CAPACIDAD = int(os.getenv("REVOCACION_CAPACIDAD", "100000"))  # tokens esperados
+REVOCACION_TASA_ERROR = float(os.getenv("REVOCACION_TASA_ERROR", "0.01"))  # falsos positivos
+REVOCACION_RECONSTRUIR_SEGUNDOS = int(os.getenv("REVOCACION_RECONSTRUIR_SEGUNDOS", "60"))
+REVOCACION_PURGA_SEGUNDOS = int(os.getenv("REVOCACION_PURGA_SEGUNDOS", "3600"))
+REVOCACION_LATIDO_SEGUNDOS = float(os.getenv("REVOCACION_LATIDO_SEGUNDOS", "5"))  # comprueba el LISTEN
+REVOCACION_REINTENTO_SEGUNDOS = float(os.getenv("REVOCACION_REINTENTO_SEGUNDOS", "5"))
+
+# Canal de LISTEN/NOTIFY por el que cada proceso avisa sus revocaciones a los demás
+CANAL_REVOCACIONES = "revocaciones"
+
+
+def clave_revocacion(token: str, payload: dict) -> str:
+    """`jti` del token; los tokens emitidos antes de tener `jti` usan su hash"""
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
+class FiltroBloom:
+    """Filtro de Bloom: sin falsos negativos, con una tasa acotada de falsos positivos"""
+
+    def __init__(self, capacidad: int, tasa_error: float):
+        capacidad = max(capacidad, 1)
+        self.n_bits = max(8, int(-capacidad * math.log(tasa_error) / (math.log(2) ** 2)))
+        self.n_hashes = max(1, round(self.n_bits / capacidad * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def _posiciones(self, clave: str):
+        # Doble hashing (Kirsch-Mitzenmacher) a partir de un solo digest
+        digest = hashlib.blake2b(clave.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    def agregar(self, clave: str):
+        for posicion in self._posiciones(clave):
+            self.bits[posicion >> 3] |= 1 << (posicion & 7)
+
+    def __contains__(self, clave: str) -> bool:
+        return all(self.bits[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(clave))
+
+
+class RegistroRevocacion:
+    """Tokens revocados en la tabla `token_blacklist` con un filtro de Bloom delante.
+
+    Si la clave no está en el filtro el token no fue revocado y no se consulta la
+    base de datos; solo los positivos (revocados o falsos positivos) se confirman
+    en Postgres. Cada revocación se publica con NOTIFY en la misma transacción y
+    `escuchar` la agrega al filtro de los demás workers. Mientras ese LISTEN no
+    está activo (al iniciar o tras perder la conexión) toda verificación se
+    confirma en la base, como antes del filtro. La reconstrucción periódica
+    descarta los tokens ya purgados.
+    """
+
+    def __init__(self, capacidad: int = REVOCACION_CAPACIDAD, tasa_error: float = REVOCACION_TASA_ERROR):
+        self.capacidad = capacidad
+        self.tasa_error = tasa_error
+        self.sincronizado = False  # LISTEN activo y filtro reconstruido después de él
+        self._filtro = FiltroBloom(capacidad, tasa_error)
+        self._revocadas_durante_reconstruccion = None
+        self._lock = threading.Lock()
+
+    async def reconstruir(self, db: AsyncSession) -> int:
+        """Cargar en un filtro nuevo las claves no expiradas y reemplazar el actual"""
+        with self._lock:
+            self._revocadas_durante_reconstruccion = []
+
+        resultado = await db.execute(
+            select(TokenBlacklist.jti).where(TokenBlacklist.expirado_en >= datetime.utcnow())
+        )
+        claves = resultado.scalars().all()
+
+        filtro = FiltroBloom(max(self.capacidad, 2 * len(claves)), self.tasa_error)
+        for clave in claves:
+            filtro.agregar(clave)
+
+        with self._lock:
+            # Las revocaciones hechas mientras se leía la tabla no deben perderse
+            for clave in self._revocadas_durante_reconstruccion:
+                filtro.agregar(clave)
+            self._revocadas_durante_reconstruccion = None
+            self._filtro = filtro
+        return len(claves)
+
+    async def esta_revocado(self, clave: str, db: AsyncSession) -> bool:
+        if self.sincronizado and clave not in self._filtro:
+            return False
+
+        resultado = await db.execute(select(TokenBlacklist.id).where(TokenBlacklist.jti == clave))
+        return resultado.first() is not None
+
+    def agregar(self, clave: str):
+        """Marcar una clave como revocada en el filtro de este proceso"""
+        with self._lock:
+            self._filtro.agregar(clave)
+            if self._revocadas_durante_reconstruccion is not None:
+                self._revocadas_durante_reconstruccion.append(clave)
+
+    async def revocar(self, clave: str, expirado_en: datetime, db: AsyncSession):
+        # Agregar al filtro antes de confirmar: un falso positivo es inofensivo
+        self.agregar(clave)
+
+        await db.execute(
+            insert(TokenBlacklist)
+            .values(jti=clave, expirado_en=expirado_en)
+            .on_conflict_do_nothing(index_elements=[TokenBlacklist.jti])
+        )
+        # Postgres entrega el aviso a los demás workers solo si la transacción se confirma
+        await db.execute(select(func.pg_notify(CANAL_REVOCACIONES, clave)))
+        await db.commit()
+
+    async def escuchar(self, conectar, abrir_sesion, latido: float = REVOCACION_LATIDO_SEGUNDOS,
+                       reintento: float = REVOCACION_REINTENTO_SEGUNDOS):
+        """Recibir por LISTEN las revocaciones de otros procesos (tarea de fondo).
+
+        `conectar` abre una conexión asyncpg dedicada y `abrir_sesion` una
+        AsyncSession para reconstruir el filtro. El filtro se reconstruye después
+        de empezar a escuchar, así no se pierde lo revocado entre ambos pasos. Un
+        latido detecta la conexión caída; hasta reconectar, `esta_revocado`
+        consulta siempre la base.
+        """
+        while True:
+            conexion = None
+            try:
+                conexion = await conectar()
+                await conexion.add_listener(
+                    CANAL_REVOCACIONES, lambda _conexion, _pid, _canal, clave: self.agregar(clave)
+                )
+                async with abrir_sesion() as db:
+                    await self.reconstruir(db)
+                self.sincronizado = True
+
+                while True:
+                    await asyncio.sleep(latido)
+                    await conexion.fetchval("SELECT 1", timeout=latido)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Sin aviso de revocaciones entre workers, se consulta la base: {e}")
+            finally:
+                self.sincronizado = False
+                if conexion is not None and not conexion.is_closed():
+                    conexion.terminate()
+            await asyncio.sleep(reintento)
+
+    async def purgar_expirados(self, db: AsyncSession) -> int:
+        """Eliminar las revocaciones de tokens que ya expiraron por sí solos"""
+        resultado = await db.execute(
+            delete(TokenBlacklist).where(TokenBlacklist.expirado_en < datetime.utcnow())
+        )
+        await db.commit()
+        return resultado.rowcount
+
+
+registro_revocacion = RegistroRevocacion()
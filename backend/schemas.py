@@ -1,7 +1,7 @@
 #D:\codigos\contador_cerdos_final\backend\schemas.py
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 # Schemas para Usuarios
@@ -31,6 +31,37 @@ class UsuarioResponse(UsuarioBase):
         from_attributes = True
 
 
+# Schemas para operaciones masivas
+class ErrorImportacion(BaseModel):
+    fila: int  # posición en el lote (en CSV, línea del archivo)
+    username: Optional[str] = None
+    motivo: str
+
+
+class ResultadoImportacion(BaseModel):
+    creados: List[UsuarioResponse]
+    conflictos: List[ErrorImportacion]  # username o email ya registrados
+    errores: List[ErrorImportacion]  # filas inválidas
+
+
+class CambioMasivo(BaseModel):
+    ids: List[int]
+    activo: Optional[bool] = None
+    rol: Optional[str] = None
+
+
+class Omision(BaseModel):
+    id: int
+    motivo: str
+
+
+class ResultadoCambioMasivo(BaseModel):
+    actualizados: List[int]
+    sin_cambios: List[int]  # ya tenían esos valores
+    no_encontrados: List[int]
+    omitidos: List[Omision]  # cambios rechazados (p. ej. sobre uno mismo)
+
+
 # Schemas para Autenticación
 class Token(BaseModel):
     access_token: str
@@ -41,6 +72,17 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
     rol: Optional[str] = None
+    exp: Optional[int] = None
+    uid: Optional[int] = None
+    ver: Optional[int] = None
+
+
+class Principal(BaseModel):
+    """Usuario autenticado construido solo con los claims del token"""
+    id: int
+    username: str
+    rol: Optional[str] = "usuario"
+    activo: bool = True
 
 
 class LoginRequest(BaseModel):
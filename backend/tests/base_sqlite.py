@@ -0,0 +1,24 @@
+#D:\codigos\contador_cerdos_final\backend\tests\base_sqlite.py
+from types import SimpleNamespace
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import models  # noqa: F401  (registra las tablas en Base.metadata)
+from database import Base
+
+
+async def crear_base():
+    """Base SQLite en memoria con el esquema de los modelos; devuelve (engine, fábrica de sesiones).
+
+    Sirve para las consultas portables de crud; lo propio de Postgres (triggers,
+    índices text_pattern_ops, LISTEN) no se ejercita aquí.
+    """
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def administrador(usuario_id=1):
+    return SimpleNamespace(id=usuario_id, rol="admin")
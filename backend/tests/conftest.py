@@ -0,0 +1,6 @@
+#D:\codigos\contador_cerdos_final\backend\tests\conftest.py
+import os
+import sys
+
+# Los módulos del backend se importan por nombre, como al correr uvicorn desde backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
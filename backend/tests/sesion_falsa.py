@@ -0,0 +1,37 @@
+#D:\codigos\contador_cerdos_final\backend\tests\sesion_falsa.py
+
+
+class ResultadoFalso:
+    def __init__(self, filas):
+        self.filas = list(filas)
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.filas
+
+    def first(self):
+        return self.filas[0] if self.filas else None
+
+
+class SesionFalsa:
+    """AsyncSession mínima: responde las filas indicadas a cualquier consulta.
+
+    `al_consultar` (async) se ejecuta dentro de `execute`, antes de responder,
+    para simular lo que hace otra petición mientras la consulta está en curso.
+    """
+
+    def __init__(self, filas=(), al_consultar=None):
+        self.filas = filas
+        self.al_consultar = al_consultar
+        self.consultas = []
+
+    async def execute(self, consulta):
+        self.consultas.append(consulta)
+        if self.al_consultar is not None:
+            await self.al_consultar()
+        return ResultadoFalso(self.filas)
+
+    async def commit(self):
+        pass
@@ -0,0 +1,147 @@
+#D:\codigos\contador_cerdos_final\backend\tests\test_cache_principales.py
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import auth
+from cache_principales import CachePrincipales, Generaciones, MapaVersiones, cache_principales, mapa_versiones
+from sesion_falsa import SesionFalsa
+
+
+@pytest.fixture(autouse=True)
+def caches_vacias():
+    mapa_versiones.limpiar()
+    cache_principales.limpiar()
+    yield
+    mapa_versiones.limpiar()
+    cache_principales.limpiar()
+
+
+def usuario(usuario_id=1, token_version=0, activo=True):
+    return SimpleNamespace(id=usuario_id, token_version=token_version, activo=activo)
+
+
+# ==================== MapaVersiones ====================
+
+def test_version_guardada_e_invalidada():
+    mapa = MapaVersiones(ttl=60)
+    mapa.guardar(1, 3)
+    assert mapa.obtener(1) == (True, 3)
+
+    mapa.invalidar(1)
+    assert mapa.obtener(1) == (False, None)
+
+
+def test_version_none_significa_usuario_inactivo_y_se_cachea():
+    mapa = MapaVersiones(ttl=60)
+    mapa.guardar(1, None)
+    assert mapa.obtener(1) == (True, None)
+
+
+def test_version_expira_con_el_ttl():
+    mapa = MapaVersiones(ttl=0)
+    mapa.guardar(1, 3)
+    assert mapa.obtener(1) == (False, None)
+
+
+def test_lru_acotado():
+    mapa = MapaVersiones(ttl=60, max_entradas=2)
+    for usuario_id in (1, 2, 3):
+        mapa.guardar(usuario_id, 0)
+    assert len(mapa) == 2
+    assert mapa.obtener(1) == (False, None)
+
+
+# ==================== Generaciones ====================
+
+def test_no_se_guarda_lo_leido_antes_de_una_invalidacion():
+    generaciones = Generaciones()
+    mapa = MapaVersiones(ttl=60, generaciones=generaciones)
+
+    marca = generaciones.actual()
+    generaciones.invalidar(1)  # el cambio se confirma mientras se consultaba
+    mapa.guardar(1, 3, marca)
+    assert mapa.obtener(1) == (False, None)
+
+    # Una lectura posterior a la invalidación sí se guarda
+    mapa.guardar(1, 4, generaciones.actual())
+    assert mapa.obtener(1) == (True, 4)
+
+
+def test_invalidar_otro_usuario_no_afecta():
+    generaciones = Generaciones()
+    mapa = MapaVersiones(ttl=60, generaciones=generaciones)
+
+    marca = generaciones.actual()
+    generaciones.invalidar(2)
+    mapa.guardar(1, 3, marca)
+    assert mapa.obtener(1) == (True, 3)
+
+
+def test_marcas_olvidadas_se_tratan_como_no_vigentes():
+    generaciones = Generaciones(max_entradas=2)
+    marca = generaciones.actual()
+    for usuario_id in (1, 2, 3):
+        generaciones.invalidar(usuario_id)
+
+    # La invalidación del usuario 1 ya no se recuerda: por las dudas no se guarda nada
+    assert not generaciones.vigente(1, marca)
+    assert not generaciones.vigente(99, marca)
+    assert generaciones.vigente(1, generaciones.actual())
+
+
+# ==================== CachePrincipales ====================
+
+def test_invalidar_usuario_quita_todos_sus_tokens():
+    cache = CachePrincipales(ttl=60)
+    cache.guardar("t1", usuario(1))
+    cache.guardar("t2", usuario(1))
+    cache.guardar("t3", usuario(2))
+
+    cache.invalidar_usuario(1)
+    assert cache.obtener("t1") is None and cache.obtener("t2") is None
+    assert cache.obtener("t3") is not None
+
+
+def test_principal_no_sobrevive_al_exp_del_token():
+    cache = CachePrincipales(ttl=60)
+    cache.guardar("t1", usuario(1), token_exp=time.time() - 1)
+    assert cache.obtener("t1") is None
+
+
+def test_cache_principales_respeta_la_marca():
+    generaciones = Generaciones()
+    cache = CachePrincipales(ttl=60, generaciones=generaciones)
+
+    marca = generaciones.actual()
+    generaciones.invalidar(1)
+    cache.guardar("t1", usuario(1), generacion=marca)
+    assert cache.obtener("t1") is None
+
+
+# ==================== auth.version_vigente ====================
+
+def test_version_vigente_consulta_una_vez_y_luego_usa_la_cache():
+    sesion = SesionFalsa(filas=[usuario(1, token_version=5)])
+
+    assert asyncio.run(auth.version_vigente(1, sesion)) == 5
+    assert asyncio.run(auth.version_vigente(1, sesion)) == 5
+    assert len(sesion.consultas) == 1
+
+
+def test_version_vigente_de_usuario_inactivo_es_none():
+    sesion = SesionFalsa(filas=[usuario(1, token_version=5, activo=False)])
+    assert asyncio.run(auth.version_vigente(1, sesion)) is None
+
+
+def test_desactivacion_concurrente_no_deja_la_version_vieja_en_cache():
+    async def desactivar_mientras_se_consulta():
+        # Otra petición confirma la desactivación e invalida al usuario
+        auth.invalidar_usuario(1)
+
+    sesion = SesionFalsa(filas=[usuario(1, token_version=5)], al_consultar=desactivar_mientras_se_consulta)
+    asyncio.run(auth.version_vigente(1, sesion))
+
+    assert mapa_versiones.obtener(1) == (False, None)
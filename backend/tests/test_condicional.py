@@ -0,0 +1,74 @@
+#D:\codigos\contador_cerdos_final\backend\tests\test_condicional.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from starlette.requests import Request
+
+from condicional import calcular_etag, no_modificado, respuesta_no_modificada
+
+MODIFICADO = datetime(2024, 3, 5, 14, 30, 15, 123456)  # sin zona: UTC, como en la base
+
+
+def peticion(**cabeceras):
+    headers = [(nombre.replace("_", "-").encode(), valor.encode()) for nombre, valor in cabeceras.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_etag_debil_y_determinista():
+    etag = calcular_etag("usuarios", 7, None, 100)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert calcular_etag("usuarios", 7, None, 100) == etag
+    assert calcular_etag("usuarios", 8, None, 100) != etag
+
+
+@pytest.mark.parametrize("if_none_match, esperado", [
+    ('W/"abc"', True),
+    ('"abc"', True),  # comparación débil: W/ no importa
+    ('"otro", W/"abc"', True),
+    ('"otro"', False),
+    ('*', True),
+    ('', False),
+])
+def test_if_none_match(if_none_match, esperado):
+    assert no_modificado(peticion(if_none_match=if_none_match), 'W/"abc"') is esperado
+
+
+def test_etag_fuerte_contra_validador_debil():
+    assert no_modificado(peticion(if_none_match='W/"abc"'), '"abc"')
+
+
+def test_if_none_match_tiene_prioridad_sobre_if_modified_since():
+    solicitud = peticion(if_none_match='"otro"', if_modified_since="Wed, 01 Jan 2030 00:00:00 GMT")
+    assert not no_modificado(solicitud, 'W/"abc"', MODIFICADO)
+
+
+@pytest.mark.parametrize("if_modified_since, esperado", [
+    ("Tue, 05 Mar 2024 14:30:15 GMT", True),  # mismo segundo (se ignoran los microsegundos)
+    ("Tue, 05 Mar 2024 14:31:00 GMT", True),
+    ("Tue, 05 Mar 2024 14:30:14 GMT", False),
+    ("no es una fecha", False),
+])
+def test_if_modified_since(if_modified_since, esperado):
+    assert no_modificado(peticion(if_modified_since=if_modified_since), 'W/"abc"', MODIFICADO) is esperado
+
+
+def test_if_modified_since_con_fecha_con_zona():
+    modificado = datetime(2024, 3, 5, 11, 30, 15, tzinfo=timezone(timedelta(hours=-3)))
+    assert no_modificado(peticion(if_modified_since="Tue, 05 Mar 2024 14:30:15 GMT"), 'W/"abc"', modificado)
+
+
+def test_if_modified_since_se_ignora_sin_ultima_modificacion():
+    assert not no_modificado(peticion(if_modified_since="Wed, 01 Jan 2030 00:00:00 GMT"), 'W/"abc"')
+
+
+def test_sin_cabeceras_condicionales():
+    assert not no_modificado(peticion(), 'W/"abc"', MODIFICADO)
+
+
+def test_respuesta_no_modificada():
+    respuesta = respuesta_no_modificada('W/"abc"', MODIFICADO)
+    assert respuesta.status_code == 304
+    assert respuesta.body == b""
+    assert respuesta.headers["ETag"] == 'W/"abc"'
+    assert respuesta.headers["Cache-Control"] == "private, no-cache"
+    assert respuesta.headers["Last-Modified"] == "Tue, 05 Mar 2024 14:30:15 GMT"
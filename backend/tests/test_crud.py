@@ -0,0 +1,258 @@
+#D:\codigos\contador_cerdos_final\backend\tests\test_crud.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import crud
+from base_sqlite import administrador, crear_base
+from crud import cambiar_usuarios_masivo, contar_usuarios, get_usuarios, importar_usuarios, leer_importacion_csv
+from models import Usuario
+from schemas import CambioMasivo
+
+
+def usuarios_de_prueba(n):
+    roles = ("usuario", "supervisor", "admin")
+    return [
+        {
+            "username": f"user_{i:02d}" if i % 5 else f"Ana{i:02d}",
+            "email": f"correo{i:02d}@granja.com",
+            "hashed_password": "x",
+            "rol": roles[i % 3],
+            "activo": i % 4 != 0,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def con_base(escenario, filas):
+    """Ejecutar `escenario(sesion)` sobre una base nueva con las filas de usuarios dadas"""
+    async def ejecutar():
+        engine, sesiones = await crear_base()
+        try:
+            async with sesiones() as db:
+                if filas:
+                    await db.execute(insert(Usuario), filas)
+                    await db.commit()
+            async with sesiones() as db:
+                return await escenario(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(ejecutar())
+
+
+async def recorrer(db, limite, **filtros):
+    """Todas las páginas siguiendo el cursor; devuelve la lista de páginas (ids)"""
+    paginas, cursor = [], None
+    while True:
+        usuarios, cursor = await get_usuarios(db, despues_de=cursor, limit=limite, **filtros)
+        paginas.append([usuario.id for usuario in usuarios])
+        if cursor is None:
+            return paginas
+        assert cursor == usuarios[-1].id
+
+
+# ==================== Paginación keyset (GET /usuarios/) ====================
+
+@pytest.mark.parametrize("total, limite, tamaños", [
+    (25, 10, [10, 10, 5]),
+    (20, 10, [10, 10]),  # múltiplo exacto: la fila de más evita una página vacía
+    (3, 10, [3]),
+    (0, 10, [0]),
+])
+def test_cursores_recorren_todo_sin_repetir(total, limite, tamaños):
+    paginas = con_base(lambda db: recorrer(db, limite), usuarios_de_prueba(total))
+
+    assert [len(pagina) for pagina in paginas] == tamaños
+    ids = [usuario_id for pagina in paginas for usuario_id in pagina]
+    assert ids == sorted(ids) and len(set(ids)) == total
+
+
+def test_cursor_con_filtros():
+    filas = usuarios_de_prueba(40)
+
+    async def escenario(db):
+        return await recorrer(db, 4, rol="supervisor", activo=True), await contar_usuarios(db, "supervisor", True)
+
+    paginas, total = con_base(escenario, filas)
+    esperados = [i for i, fila in enumerate(filas, start=1) if fila["rol"] == "supervisor" and fila["activo"]]
+    assert [usuario_id for pagina in paginas for usuario_id in pagina] == esperados
+    assert total == len(esperados)
+    assert all(len(pagina) == 4 for pagina in paginas[:-1])
+
+
+def test_un_alta_entre_paginas_no_desplaza_el_cursor():
+    async def escenario(db):
+        primera, cursor = await get_usuarios(db, limit=5)
+        # Un alta posterior queda al final (id mayor): la página siguiente no cambia ni repite filas
+        await db.execute(insert(Usuario), [{"username": "nuevo", "email": "nuevo@granja.com", "hashed_password": "x"}])
+        await db.commit()
+        segunda, _ = await get_usuarios(db, despues_de=cursor, limit=5)
+        return [u.id for u in primera], [u.id for u in segunda]
+
+    primera, segunda = con_base(escenario, usuarios_de_prueba(12))
+    assert primera == [1, 2, 3, 4, 5]
+    assert segunda == [6, 7, 8, 9, 10]
+
+
+@pytest.mark.parametrize("buscar, esperados", [
+    ("ana", ["Ana05", "Ana10"]),  # prefijo, sin distinguir mayúsculas
+    ("  ANA1", ["Ana10"]),
+    ("correo03@", ["user_03"]),  # también por email
+    ("user_0", ["user_01", "user_02", "user_03", "user_04", "user_06", "user_07", "user_08", "user_09"]),
+    ("user%", []),  # los comodines se buscan literalmente
+    ("ana_", []),  # sin escapar, '_' aceptaría "Ana05"
+    ("ser_", []),  # solo prefijos
+    ("", [f"user_{i:02d}" if i % 5 else f"Ana{i:02d}" for i in range(1, 11)]),
+])
+def test_buscar_por_prefijo(buscar, esperados):
+    async def escenario(db):
+        usuarios, _ = await get_usuarios(db, buscar=buscar)
+        return [usuario.username for usuario in usuarios], await contar_usuarios(db, buscar=buscar)
+
+    usernames, total = con_base(escenario, usuarios_de_prueba(10))
+    assert sorted(usernames) == sorted(esperados)
+    assert total == len(esperados)
+
+
+# ==================== Operaciones masivas ====================
+
+@pytest.fixture
+def hashes_rapidos(monkeypatch):
+    # El KDF real corre en un pool de procesos; aquí solo importa el agrupamiento
+    async def hashear(passwords):
+        return [f"hash:{password}" for password in passwords]
+
+    monkeypatch.setattr(crud, "get_password_hashes_async", hashear)
+    # La importación usa INSERT ... ON CONFLICT DO NOTHING RETURNING; SQLite acepta la misma forma
+    monkeypatch.setattr(crud, "pg_insert", sqlite_insert)
+
+
+def test_importar_agrupa_creados_conflictos_y_errores(hashes_rapidos):
+    registros = [
+        (1, {"username": "nuevo1", "email": "n1@granja.com", "password": "a"}),
+        (2, {"username": "user_01", "email": "otro@granja.com", "password": "a"}),  # username registrado
+        (3, {"username": "nuevo3", "email": "correo02@granja.com", "password": "a"}),  # email registrado
+        (4, {"username": "nuevo4", "email": "n4@granja.com", "password": "a", "rol": "jefe"}),
+        (5, {"username": "nuevo1", "email": "n5@granja.com", "password": "a"}),  # repetido en el lote
+        (6, {"username": "nuevo6", "email": "n6@granja.com"}),  # sin password
+        (7, "no es un objeto"),
+        (8, {"username": "nuevo8", "email": "n8@granja.com", "password": "b", "rol": "supervisor"}),
+    ]
+
+    async def escenario(db):
+        resultado = await importar_usuarios(db, registros, administrador())
+        guardados = (await db.execute(select(Usuario.username, Usuario.hashed_password, Usuario.rol)
+                                      .where(Usuario.username.like("nuevo%")))).all()
+        return resultado, sorted(guardados)
+
+    resultado, guardados = con_base(escenario, usuarios_de_prueba(3))
+
+    assert [usuario.username for usuario in resultado.creados] == ["nuevo1", "nuevo8"]
+    assert guardados == [("nuevo1", "hash:a", "usuario"), ("nuevo8", "hash:b", "supervisor")]
+    assert [(error.fila, error.motivo) for error in resultado.conflictos] == [
+        (2, "El nombre de usuario ya está registrado"),
+        (3, "El email ya está registrado"),
+    ]
+    assert [error.fila for error in resultado.errores] == [4, 5, 6, 7]
+    assert resultado.errores[0].motivo == "Rol inválido: jefe"
+    assert resultado.errores[1].motivo == "Nombre de usuario repetido en el lote"
+
+
+def test_importar_reporta_lo_registrado_mientras_se_hasheaba(monkeypatch, hashes_rapidos):
+    async def escenario(db):
+        async def hashear_y_competir(passwords):
+            # Otra petición registra el mismo username antes del INSERT del lote
+            await db.execute(insert(Usuario), [{"username": "carrera", "email": "c@otra.com", "hashed_password": "x"}])
+            return [f"hash:{password}" for password in passwords]
+
+        monkeypatch.setattr(crud, "get_password_hashes_async", hashear_y_competir)
+        return await importar_usuarios(db, [
+            (1, {"username": "carrera", "email": "c@granja.com", "password": "a"}),
+            (2, {"username": "libre", "email": "l@granja.com", "password": "a"}),
+        ], administrador())
+
+    resultado = con_base(escenario, [])
+    assert [usuario.username for usuario in resultado.creados] == ["libre"]
+    assert [(error.fila, error.motivo) for error in resultado.conflictos] == [(1, "Registrado durante la importación")]
+
+
+def test_importar_exige_admin_y_respeta_el_maximo(monkeypatch, hashes_rapidos):
+    monkeypatch.setattr(crud, "IMPORTACION_MAX_FILAS", 2)
+    fila = {"username": "a", "email": "a@granja.com", "password": "a"}
+
+    with pytest.raises(HTTPException) as error:
+        con_base(lambda db: importar_usuarios(db, [(1, fila)], SimpleNamespace(id=2, rol="supervisor")), [])
+    assert error.value.status_code == 403
+
+    with pytest.raises(HTTPException) as error:
+        con_base(lambda db: importar_usuarios(db, [(i, fila) for i in range(3)], administrador()), [])
+    assert error.value.status_code == 413
+
+
+def test_leer_importacion_csv():
+    contenido = ("\ufeffusername,email,password,rol\n"
+                 " ana ,ana@granja.com, clave con espacios ,\n"
+                 "beto,beto@granja.com,x,supervisor\n").encode("utf-8")
+    assert leer_importacion_csv(contenido) == [
+        (2, {"username": "ana", "email": "ana@granja.com", "password": " clave con espacios "}),
+        (3, {"username": "beto", "email": "beto@granja.com", "password": "x", "rol": "supervisor"}),
+    ]
+
+    with pytest.raises(HTTPException) as error:
+        leer_importacion_csv(b"username,email\nana,ana@granja.com\n")
+    assert error.value.status_code == 400 and "password" in error.value.detail
+
+
+def test_cambio_masivo_agrupa_el_resultado():
+    # Usuarios 1..8: activos salvo el 4 y el 8; el 1 es el admin que hace el cambio
+    async def escenario(db):
+        resultado = await cambiar_usuarios_masivo(
+            db, CambioMasivo(ids=[1, 2, 3, 4, 3, 99], activo=False), administrador(1)
+        )
+        versiones = dict((await db.execute(select(Usuario.id, Usuario.token_version))).all())
+        activos = dict((await db.execute(select(Usuario.id, Usuario.activo))).all())
+        return resultado, versiones, activos
+
+    resultado, versiones, activos = con_base(escenario, usuarios_de_prueba(8))
+
+    assert resultado.actualizados == [2, 3]
+    assert resultado.sin_cambios == [4]  # ya estaba inactivo
+    assert resultado.no_encontrados == [99]
+    assert [omision.id for omision in resultado.omitidos] == [1]
+    assert activos[1] and not activos[2] and not activos[3]
+    # Solo los desactivados ahora pierden sus tokens
+    assert [versiones[i] for i in (1, 2, 3, 4)] == [0, 1, 1, 0]
+
+
+def test_cambio_masivo_de_rol():
+    async def escenario(db):
+        resultado = await cambiar_usuarios_masivo(
+            db, CambioMasivo(ids=[1, 2, 3, 5], rol="supervisor"), administrador(3)
+        )
+        filas = dict((await db.execute(select(Usuario.id, Usuario.rol))).all())
+        versiones = dict((await db.execute(select(Usuario.id, Usuario.token_version))).all())
+        return resultado, filas, versiones
+
+    # Roles por id: 1 supervisor, 2 admin, 3 usuario, 5 admin
+    resultado, roles, versiones = con_base(escenario, usuarios_de_prueba(5))
+
+    assert resultado.actualizados == [2, 5]
+    assert resultado.sin_cambios == [1]
+    assert [omision.id for omision in resultado.omitidos] == [3]  # su propio rol
+    assert roles[2] == roles[5] == "supervisor" and roles[3] == "usuario"
+    assert [versiones[i] for i in (1, 2, 3, 5)] == [0, 1, 0, 1]
+
+
+@pytest.mark.parametrize("cambio, codigo", [
+    (CambioMasivo(ids=[2]), 400),
+    (CambioMasivo(ids=[2], rol="jefe"), 400),
+])
+def test_cambio_masivo_invalido(cambio, codigo):
+    with pytest.raises(HTTPException) as error:
+        con_base(lambda db: cambiar_usuarios_masivo(db, cambio, administrador()), [])
+    assert error.value.status_code == codigo
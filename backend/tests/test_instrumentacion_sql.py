@@ -0,0 +1,44 @@
+#D:\codigos\contador_cerdos_final\backend\tests\test_instrumentacion_sql.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import StaticPool
+
+from instrumentacion_sql import RegistroConsultas, instrumentar_engine
+
+
+@pytest.fixture
+def motor():
+    # Una sola conexión reutilizada, como una del pool de la API
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    registro = RegistroConsultas(umbral_ms=10_000)
+    instrumentar_engine(engine, registro)
+    yield engine, registro
+    engine.dispose()
+
+
+def test_registra_cada_sentencia(motor):
+    engine, registro = motor
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1), (2)"))
+        assert conn.execute(text("SELECT x FROM t")).all() == [(1,), (2,)]
+
+    sentencias = {fila["sentencia"]: fila for fila in registro.estadisticas()}
+    assert sentencias["INSERT INTO t VALUES (1), (2)"]["filas"] == 2
+    assert sentencias["SELECT x FROM t"]["llamadas"] == 1
+
+
+def test_una_sentencia_fallida_no_deja_inicios_en_la_conexion(motor):
+    engine, registro = motor
+    for _ in range(3):
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_existe"))
+            assert conn.info.get("inicios_consulta") == []
+
+    # La siguiente sentencia en la misma conexión se mide con su propio inicio
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert conn.info["inicios_consulta"] == []
+    assert [fila["sentencia"] for fila in registro.estadisticas()] == ["SELECT 1"]
@@ -0,0 +1,123 @@
+#D:\codigos\contador_cerdos_final\backend\tests\test_limitador.py
+import ipaddress
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from limitador import CubosTokens, LimitadorLogin, LimiteExcedido, ip_cliente
+
+# Recarga despreciable: los cubos no se recuperan durante un test
+SIN_RECARGA = 1e-9
+
+
+# ==================== CubosTokens ====================
+
+def test_cubo_admite_la_rafaga_y_se_recarga():
+    cubos = CubosTokens(rafaga=2, por_minuto=60)  # un token por segundo
+    for _ in range(2):
+        assert cubos.espera("ana", 0.0) == 0
+        cubos.consumir("ana", 0.0)
+
+    assert cubos.espera("ana", 0.0) == pytest.approx(1.0)
+    assert cubos.espera("ana", 0.5) == pytest.approx(0.5)
+    assert cubos.espera("ana", 1.0) == 0
+
+
+def test_cubo_no_acumula_mas_que_la_rafaga():
+    cubos = CubosTokens(rafaga=2, por_minuto=60)
+    cubos.consumir("ana", 0.0)
+    # Una hora sin intentos no da más de dos
+    for _ in range(2):
+        cubos.consumir("ana", 3600.0)
+    assert cubos.espera("ana", 3600.0) > 0
+
+
+def test_cubos_independientes_por_clave_y_lru_acotado():
+    cubos = CubosTokens(rafaga=1, por_minuto=SIN_RECARGA, max_claves=2)
+    cubos.consumir("ana", 0.0)
+    assert cubos.espera("beto", 0.0) == 0
+
+    cubos.consumir("beto", 0.0)
+    cubos.consumir("carla", 0.0)
+    assert len(cubos) == 2
+    assert cubos.espera("ana", 0.0) == 0  # descartado por el LRU: vuelve lleno
+
+
+# ==================== LimitadorLogin ====================
+
+def intentar(limitador, username="ana", ip="10.0.0.1"):
+    with limitador.admitir(username, ip):
+        pass
+
+
+def test_rechaza_por_usuario_sin_distinguir_mayusculas():
+    limitador = LimitadorLogin(usuario_rafaga=2, usuario_por_minuto=SIN_RECARGA, ip_rafaga=100)
+    intentar(limitador, "Ana")
+    intentar(limitador, " ana ")
+
+    with pytest.raises(LimiteExcedido) as error:
+        intentar(limitador, "ANA", ip="10.0.0.2")
+    assert int(error.value.retry_after) >= 1
+    assert limitador.estadisticas()["rechazados_usuario"] == 1
+
+
+def test_rechazo_por_ip_no_gasta_tokens_del_usuario():
+    limitador = LimitadorLogin(usuario_rafaga=1, usuario_por_minuto=SIN_RECARGA,
+                               ip_rafaga=1, ip_por_minuto=SIN_RECARGA)
+    intentar(limitador, "ana", ip="10.0.0.1")
+
+    with pytest.raises(LimiteExcedido):
+        intentar(limitador, "beto", ip="10.0.0.1")
+    # beto no consumió su token: desde otra IP sigue teniendo su intento
+    intentar(limitador, "beto", ip="10.0.0.2")
+
+
+def test_tope_de_verificaciones_simultaneas():
+    limitador = LimitadorLogin(usuario_rafaga=10, ip_rafaga=10, max_concurrentes=1)
+    with limitador.admitir("ana", "10.0.0.1"):
+        with pytest.raises(LimiteExcedido):
+            intentar(limitador, "beto", ip="10.0.0.2")
+
+    # Al salir (también con excepción) se libera el lugar
+    with pytest.raises(RuntimeError):
+        with limitador.admitir("carla", "10.0.0.3"):
+            raise RuntimeError
+    assert limitador.estadisticas()["en_curso"] == 0
+    intentar(limitador, "beto", ip="10.0.0.2")
+
+
+def test_retry_after_redondea_hacia_arriba():
+    assert LimiteExcedido("x", 0.2).retry_after == "1"
+    assert LimiteExcedido("x", 12.1).retry_after == "13"
+
+
+def test_login_responde_429_con_retry_after(monkeypatch):
+    monkeypatch.setattr(main, "limitador_login",
+                        LimitadorLogin(usuario_rafaga=0, usuario_por_minuto=1, ip_rafaga=100))
+
+    respuesta = TestClient(main.app).post("/login", data={"username": "ana", "password": "x"})
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers["Retry-After"]) >= 1
+
+
+# ==================== ip_cliente ====================
+
+CONFIABLES = (ipaddress.ip_network("172.28.0.10/32"), ipaddress.ip_network("10.0.0.0/8"))
+
+
+@pytest.mark.parametrize("conexion, reenviado, esperada", [
+    # Sin proxy confiable la cabecera se ignora (la pudo escribir el cliente)
+    ("203.0.113.7", "1.2.3.4", "203.0.113.7"),
+    # Frontend -> API: el salto agregado por el frontend
+    ("172.28.0.10", "198.51.100.20", "198.51.100.20"),
+    # Balanceador -> frontend -> API: se saltan los proxies confiables desde la derecha
+    ("172.28.0.10", "198.51.100.20, 10.1.2.3", "198.51.100.20"),
+    # Lo que está a la izquierda del primer salto desconocido no se cree
+    ("172.28.0.10", "6.6.6.6, 198.51.100.20", "198.51.100.20"),
+    ("172.28.0.10", None, "172.28.0.10"),
+    ("172.28.0.10", "10.1.2.3", "10.1.2.3"),
+    ("172.28.0.10", "no-es-ip", "no-es-ip"),
+])
+def test_ip_cliente(conexion, reenviado, esperada):
+    assert ip_cliente(conexion, reenviado, CONFIABLES) == esperada
@@ -0,0 +1,162 @@
+#D:\codigos\contador_cerdos_final\backend\tests\test_metricas.py
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY, CollectorRegistry
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from metricas import RUTA_DESCONOCIDA, ColectorPool, MiddlewareMetricas, PoolMedido, TimeoutPool, estadisticas_pool
+
+
+def crear_app():
+    app = FastAPI()
+
+    @app.get("/usuarios/{usuario_id}")
+    def usuario(usuario_id: int):
+        if usuario_id == 404:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        return {"id": usuario_id}
+
+    @app.get("/falla")
+    def falla():
+        raise RuntimeError("error no manejado")
+
+    app.add_middleware(MiddlewareMetricas)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def peticiones(metodo, ruta, estado):
+    # Las métricas son globales del proceso: los tests miden diferencias
+    return REGISTRY.get_sample_value("api_peticiones_total", {"metodo": metodo, "ruta": ruta, "estado": estado}) or 0
+
+
+def observaciones(metodo, ruta):
+    return REGISTRY.get_sample_value("api_peticion_duracion_segundos_count", {"metodo": metodo, "ruta": ruta}) or 0
+
+
+def test_la_etiqueta_de_ruta_es_la_plantilla_y_no_la_url():
+    cliente = crear_app()
+    antes = peticiones("GET", "/usuarios/{usuario_id}", "200")
+    duraciones = observaciones("GET", "/usuarios/{usuario_id}")
+
+    for usuario_id in (1, 2, 3):
+        assert cliente.get(f"/usuarios/{usuario_id}").status_code == 200
+
+    assert peticiones("GET", "/usuarios/{usuario_id}", "200") - antes == 3
+    assert observaciones("GET", "/usuarios/{usuario_id}") - duraciones == 3
+    assert REGISTRY.get_sample_value("api_peticiones_total", {"metodo": "GET", "ruta": "/usuarios/1", "estado": "200"}) is None
+
+
+def test_el_estado_de_la_respuesta_se_etiqueta():
+    cliente = crear_app()
+    no_encontrado = peticiones("GET", "/usuarios/{usuario_id}", "404")
+    invalido = peticiones("GET", "/usuarios/{usuario_id}", "422")
+    error = peticiones("GET", "/falla", "500")
+
+    assert cliente.get("/usuarios/404").status_code == 404
+    assert cliente.get("/usuarios/abc").status_code == 422
+    assert cliente.get("/falla").status_code == 500
+
+    assert peticiones("GET", "/usuarios/{usuario_id}", "404") - no_encontrado == 1
+    assert peticiones("GET", "/usuarios/{usuario_id}", "422") - invalido == 1
+    assert peticiones("GET", "/falla", "500") - error == 1
+
+
+@pytest.mark.parametrize("ruta", ["/no/existe", "/usuarios/1/otra/cosa", "/scan?x=1"])
+def test_las_rutas_sin_plantilla_comparten_una_etiqueta(ruta):
+    cliente = crear_app()
+    antes = peticiones("GET", RUTA_DESCONOCIDA, "404")
+
+    assert cliente.get(ruta).status_code == 404
+    assert peticiones("GET", RUTA_DESCONOCIDA, "404") - antes == 1
+
+
+def test_las_peticiones_en_curso_vuelven_a_cero():
+    cliente = crear_app()
+    cliente.get("/usuarios/1")
+    cliente.get("/falla")
+    assert REGISTRY.get_sample_value("api_peticiones_en_curso") == 0
+
+
+# ==================== Pool de conexiones ====================
+
+OPCIONES_PRUEBA = {
+    "pool_size": 1,
+    "max_overflow": 1,
+    "pool_timeout": 0.05,
+    "pool_recycle": 1800,
+    "pool_pre_ping": False,
+}
+
+
+def con_pool(escenario, tmp_path):
+    """Ejecutar `escenario(engine)` con un engine sobre PoolMedido (SQLite en archivo)"""
+    async def ejecutar():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=PoolMedido,
+                                     **OPCIONES_PRUEBA)
+        try:
+            return await escenario(engine)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(ejecutar())
+
+
+def test_estadisticas_del_pool_en_reposo(tmp_path):
+    async def escenario(engine):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return estadisticas_pool(engine, OPCIONES_PRUEBA)
+
+    estadisticas = con_pool(escenario, tmp_path)
+    assert {clave: estadisticas[clave] for clave in ("tamano", "max_desborde", "timeout_s", "reciclar_s", "pre_ping")} \
+        == {"tamano": 1, "max_desborde": 1, "timeout_s": 0.05, "reciclar_s": 1800, "pre_ping": False}
+    assert (estadisticas["en_uso"], estadisticas["libres"], estadisticas["saturado"]) == (0, 1, False)
+    assert (estadisticas["checkouts"], estadisticas["timeouts"]) == (1, 0)
+    assert 0 < estadisticas["espera_promedio_ms"] <= estadisticas["espera_max_ms"]
+
+
+def test_pool_saturado_cuenta_el_timeout(tmp_path):
+    timeouts_globales = REGISTRY.get_sample_value("api_db_checkout_timeouts_total")
+
+    async def escenario(engine):
+        async with engine.connect() as primera, engine.connect() as segunda:
+            await primera.execute(text("SELECT 1"))
+            await segunda.execute(text("SELECT 1"))
+            saturado = estadisticas_pool(engine, OPCIONES_PRUEBA)
+
+            with pytest.raises(TimeoutPool):
+                async with engine.connect():
+                    pass
+            return saturado, estadisticas_pool(engine, OPCIONES_PRUEBA)
+
+    saturado, despues = con_pool(escenario, tmp_path)
+    assert (saturado["en_uso"], saturado["desborde"], saturado["saturado"]) == (2, 1, True)
+    assert (despues["checkouts"], despues["timeouts"]) == (3, 1)
+    # La espera del checkout fallido (pool_timeout) entra en los agregados
+    assert despues["espera_max_ms"] >= OPCIONES_PRUEBA["pool_timeout"] * 1000
+    assert REGISTRY.get_sample_value("api_db_checkout_timeouts_total") - timeouts_globales == 1
+
+
+def test_sin_limite_de_desborde_nunca_esta_saturado(tmp_path):
+    async def escenario(engine):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            return estadisticas_pool(engine, {**OPCIONES_PRUEBA, "max_overflow": -1})
+
+    assert con_pool(escenario, tmp_path)["saturado"] is False
+
+
+def test_colector_expone_el_estado_del_pool(tmp_path):
+    async def escenario(engine):
+        registro = CollectorRegistry()
+        registro.register(ColectorPool(engine))
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            return {nombre: registro.get_sample_value(nombre) for nombre in
+                    ("api_db_pool_tamano", "api_db_pool_en_uso", "api_db_pool_libres")}
+
+    assert con_pool(escenario, tmp_path) == {"api_db_pool_tamano": 1, "api_db_pool_en_uso": 1, "api_db_pool_libres": 0}
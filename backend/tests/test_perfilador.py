@@ -0,0 +1,80 @@
+#D:\codigos\contador_cerdos_final\backend\tests\test_perfilador.py
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from perfilador import EXTENSION, MiddlewarePerfilador, listar_perfiles
+
+
+def crear_app(directorio, **opciones):
+    app = FastAPI()
+
+    @app.get("/usuarios/")
+    def usuarios(ms: int = 0):
+        time.sleep(ms / 1000)
+        return []
+
+    @app.get("/usuarios/{usuario_id}")
+    def usuario(usuario_id: int, ms: int = 0):
+        time.sleep(ms / 1000)
+        return {"id": usuario_id}
+
+    @app.get("/health")
+    def salud(ms: int = 0):
+        time.sleep(ms / 1000)
+        return {"status": "ok"}
+
+    app.add_middleware(MiddlewarePerfilador, directorio=directorio, umbral_ms=50, rutas=("/usuarios",), **opciones)
+    return TestClient(app)
+
+
+def lentos(directorio):
+    return [perfil["nombre"] for perfil in listar_perfiles(directorio)["lentos"]]
+
+
+def test_toda_peticion_lenta_a_una_ruta_objetivo_se_guarda(tmp_path):
+    cliente = crear_app(tmp_path)
+    for _ in range(5):
+        assert cliente.get("/usuarios/", params={"ms": 80}).status_code == 200
+    cliente.get("/usuarios/7", params={"ms": 80})
+
+    nombres = lentos(tmp_path)
+    assert len(nombres) == 6
+    assert all(nombre.endswith(EXTENSION) and "_GET_usuarios" in nombre for nombre in nombres)
+
+
+def test_peticiones_rapidas_no_se_guardan(tmp_path):
+    cliente = crear_app(tmp_path)
+    for _ in range(5):
+        cliente.get("/usuarios/")
+    assert lentos(tmp_path) == []
+
+
+def test_rutas_fuera_del_objetivo_no_se_perfilan(tmp_path):
+    cliente = crear_app(tmp_path)
+    cliente.get("/health", params={"ms": 80})
+    assert lentos(tmp_path) == []
+
+
+def test_se_conservan_los_mas_lentos(tmp_path):
+    cliente = crear_app(tmp_path, max_perfiles=2)
+    for ms in (60, 200, 120, 70):
+        cliente.get("/usuarios/", params={"ms": ms})
+
+    duraciones = [int(nombre.split("ms_", 1)[0]) for nombre in lentos(tmp_path)]
+    assert len(duraciones) == 2
+    assert min(duraciones) >= 120
+
+
+@pytest.mark.parametrize("ruta, esperado", [
+    ("/usuarios", True),
+    ("/usuarios/", True),
+    ("/usuarios/7", True),
+    ("/usuarios-masivo", False),
+    ("/login", False),
+])
+def test_ruta_objetivo(tmp_path, ruta, esperado):
+    perfilador = MiddlewarePerfilador(None, directorio=tmp_path, rutas=("/usuarios",))
+    assert perfilador._ruta_objetivo(ruta) is esperado
@@ -0,0 +1,235 @@
+#D:\codigos\contador_cerdos_final\backend\tests\test_revocacion.py
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import postgresql
+
+from revocacion import FiltroBloom, RegistroRevocacion, clave_revocacion
+from sesion_falsa import ResultadoFalso, SesionFalsa
+
+
+def test_filtro_sin_falsos_negativos():
+    filtro = FiltroBloom(capacidad=5_000, tasa_error=0.01)
+    claves = [f"jti-{i}" for i in range(5_000)]
+    for clave in claves:
+        filtro.agregar(clave)
+
+    assert all(clave in filtro for clave in claves)
+
+
+def test_tasa_de_falsos_positivos_acotada():
+    filtro = FiltroBloom(capacidad=5_000, tasa_error=0.01)
+    for i in range(5_000):
+        filtro.agregar(f"jti-{i}")
+
+    falsos_positivos = sum(f"otro-{i}" in filtro for i in range(20_000))
+    assert falsos_positivos / 20_000 < 0.02
+
+
+def test_clave_revocacion_usa_jti_o_hash_del_token():
+    assert clave_revocacion("token", {"jti": "abc"}) == "abc"
+    assert len(clave_revocacion("token", {})) == 64
+
+
+def test_token_no_revocado_no_consulta_la_base():
+    registro = RegistroRevocacion(capacidad=100)
+    registro.sincronizado = True  # LISTEN activo
+    sesion = SesionFalsa()
+
+    assert asyncio.run(registro.esta_revocado("jti-1", sesion)) is False
+    assert sesion.consultas == []
+
+
+def test_token_revocado_se_confirma_en_la_base():
+    registro = RegistroRevocacion(capacidad=100)
+    expira = datetime.utcnow() + timedelta(hours=1)
+
+    async def escenario():
+        await registro.revocar("jti-1", expira, SesionFalsa())
+        sesion = SesionFalsa(filas=[(1,)])
+        return await registro.esta_revocado("jti-1", sesion), sesion
+
+    revocado, sesion = asyncio.run(escenario())
+    assert revocado is True
+    assert len(sesion.consultas) == 1
+
+
+def test_reconstruir_carga_la_tabla_y_conserva_las_revocaciones_concurrentes():
+    registro = RegistroRevocacion(capacidad=100)
+    expira = datetime.utcnow() + timedelta(hours=1)
+
+    async def escenario():
+        # Una revocación confirmada mientras se lee token_blacklist no está en lo leído
+        async def revocar_durante_la_lectura():
+            await registro.revocar("jti-concurrente", expira, SesionFalsa())
+
+        leidas = await registro.reconstruir(
+            SesionFalsa(filas=["jti-a", "jti-b"], al_consultar=revocar_durante_la_lectura)
+        )
+        return leidas
+
+    assert asyncio.run(escenario()) == 2
+    for clave in ("jti-a", "jti-b", "jti-concurrente"):
+        assert clave in registro._filtro
+
+
+def test_reconstruir_descarta_las_claves_purgadas():
+    registro = RegistroRevocacion(capacidad=100)
+    asyncio.run(registro.revocar("jti-viejo", datetime.utcnow(), SesionFalsa()))
+
+    asyncio.run(registro.reconstruir(SesionFalsa(filas=[])))
+    assert "jti-viejo" not in registro._filtro
+
+
+# ==================== Varios workers (LISTEN/NOTIFY) ====================
+
+class PostgresFalso:
+    """token_blacklist y el canal de NOTIFY compartidos por varios workers"""
+
+    def __init__(self):
+        self.revocadas = set()
+        self.conexiones = []
+        self.consultas = 0
+
+    async def conectar(self):
+        conexion = ConexionFalsa()
+        self.conexiones.append(conexion)
+        return conexion
+
+    def sesion(self):
+        return SesionPostgresFalsa(self)
+
+    def notificar(self, canal, clave):
+        for conexion in self.conexiones:
+            if not conexion.caida and canal in conexion.oyentes:
+                conexion.oyentes[canal](conexion, 1234, canal, clave)
+
+
+class ConexionFalsa:
+    def __init__(self):
+        self.oyentes = {}
+        self.caida = False
+
+    async def add_listener(self, canal, callback):
+        self.oyentes[canal] = callback
+
+    async def fetchval(self, consulta, timeout=None):
+        if self.caida:
+            raise ConnectionResetError("conexión perdida")
+        return 1
+
+    def is_closed(self):
+        return self.caida
+
+    def terminate(self):
+        self.caida = True
+
+
+class SesionPostgresFalsa:
+    """AsyncSession que entiende las cuatro sentencias de RegistroRevocacion"""
+
+    def __init__(self, base):
+        self.base = base
+        self.insertadas = []
+        self.avisos = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, consulta):
+        self.base.consultas += 1
+        parametros = consulta.compile(dialect=postgresql.dialect()).params
+        texto = str(consulta)
+        if texto.startswith("INSERT"):
+            self.insertadas.append(parametros["jti"])
+        elif "pg_notify" in texto:
+            self.avisos.append(tuple(parametros.values()))
+        elif "token_blacklist.id" in texto:
+            return ResultadoFalso([(1,)] if parametros["jti_1"] in self.base.revocadas else [])
+        else:
+            return ResultadoFalso(sorted(self.base.revocadas))
+
+    async def commit(self):
+        # Como Postgres: lo insertado y los NOTIFY se ven recién al confirmar
+        self.base.revocadas.update(self.insertadas)
+        for canal, clave in self.avisos:
+            self.base.notificar(canal, clave)
+        self.insertadas, self.avisos = [], []
+
+
+async def esperar(condicion):
+    for _ in range(200):
+        if condicion():
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError("la condición no se cumplió a tiempo")
+
+
+def test_token_revocado_en_otro_worker_se_rechaza():
+    base = PostgresFalso()
+    worker_a, worker_b = RegistroRevocacion(capacidad=100), RegistroRevocacion(capacidad=100)
+    expira = datetime.utcnow() + timedelta(hours=1)
+
+    async def escenario():
+        tareas = [asyncio.create_task(worker.escuchar(base.conectar, base.sesion, latido=0.01, reintento=0.01))
+                  for worker in (worker_a, worker_b)]
+        await esperar(lambda: worker_a.sincronizado and worker_b.sincronizado)
+
+        # Antes del logout, B acepta el token sin consultar la base
+        consultas = base.consultas
+        assert await worker_b.esta_revocado("jti-sesion", base.sesion()) is False
+        assert base.consultas == consultas
+
+        # Logout atendido por A: B lo rechaza de inmediato, sin esperar una reconstrucción
+        await worker_a.revocar("jti-sesion", expira, base.sesion())
+        revocado_en_b = await worker_b.esta_revocado("jti-sesion", base.sesion())
+
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        return revocado_en_b
+
+    assert asyncio.run(escenario()) is True
+
+
+def test_sin_listen_toda_verificacion_se_confirma_en_la_base():
+    base = PostgresFalso()
+    worker_a, worker_b = RegistroRevocacion(capacidad=100), RegistroRevocacion(capacidad=100)
+    expira = datetime.utcnow() + timedelta(hours=1)
+
+    async def escenario():
+        # B todavía no escucha (recién iniciado): la revocación de A no le llega por NOTIFY
+        await worker_a.revocar("jti-sesion", expira, base.sesion())
+        assert worker_b.sincronizado is False
+        assert "jti-sesion" not in worker_b._filtro
+        return await worker_b.esta_revocado("jti-sesion", base.sesion())
+
+    assert asyncio.run(escenario()) is True
+
+
+def test_al_perder_la_conexion_se_consulta_la_base_y_al_volver_se_reconstruye():
+    base = PostgresFalso()
+    worker_a, worker_b = RegistroRevocacion(capacidad=100), RegistroRevocacion(capacidad=100)
+    expira = datetime.utcnow() + timedelta(hours=1)
+
+    async def escenario():
+        tarea = asyncio.create_task(worker_b.escuchar(base.conectar, base.sesion, latido=0.01, reintento=0.05))
+        await esperar(lambda: worker_b.sincronizado)
+
+        base.conexiones[0].caida = True  # el aviso de A se pierde
+        await esperar(lambda: not worker_b.sincronizado)
+        await worker_a.revocar("jti-perdido", expira, base.sesion())
+        assert await worker_b.esta_revocado("jti-perdido", base.sesion()) is True
+
+        # Al reconectar, la reconstrucción recoge lo revocado mientras no escuchaba
+        await esperar(lambda: worker_b.sincronizado)
+        en_filtro = "jti-perdido" in worker_b._filtro
+
+        tarea.cancel()
+        await asyncio.gather(tarea, return_exceptions=True)
+        return en_filtro
+
+    assert asyncio.run(escenario()) is True
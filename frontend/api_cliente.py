@@ -0,0 +1,180 @@
+# api_cliente.py - CLIENTE HTTP COMPARTIDO (KEEP-ALIVE) PARA LLAMADAS AL BACKEND
+import http.cookiejar
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+import requests
+import streamlit as st
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from urllib3.util.retry import Retry
+
+load_dotenv()
+
+# ==================== CONFIGURACIÓN ====================
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+API_MAX_CONEXIONES = int(os.getenv("API_MAX_CONEXIONES", "10"))
+API_REINTENTOS = int(os.getenv("API_REINTENTOS", "3"))
+
+# (conexión, lectura) en segundos
+TIMEOUT_POR_DEFECTO = (3.05, 10)
+
+# Solo se reintentan verbos idempotentes; POST y PATCH nunca se repiten
+METODOS_IDEMPOTENTES = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Latencias recientes que se guardan por endpoint
+MUESTRAS_LATENCIA = 200
+
+_SEGMENTO_NUMERICO = re.compile(r"/\d+(?=/|$)")
+
+
+def normalizar_endpoint(metodo, ruta):
+    """'GET /usuarios/15' -> 'GET /usuarios/{id}' para agrupar latencias"""
+    return f"{metodo} {_SEGMENTO_NUMERICO.sub('/{id}', ruta)}"
+
+
+def cadena_reenvio():
+    """X-Forwarded-For para el backend, o None fuera de una sesión de Streamlit.
+
+    Como cualquier proxy, agrega a la cadena recibida la dirección de quien abrió
+    el websocket de la sesión (el navegador o el balanceador). El backend decide
+    qué saltos creer con PROXIES_CONFIABLES.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None or not runtime.exists():
+        return None
+
+    # Misma vía que st.web.server.websocket_headers (API interna de Streamlit)
+    solicitud = getattr(runtime.get_instance().get_client(ctx.session_id), "request", None)
+    if solicitud is None:
+        return None
+
+    saltos = [solicitud.headers.get("X-Forwarded-For", ""), solicitud.remote_ip or ""]
+    return ", ".join(salto.strip() for salto in saltos if salto.strip()) or None
+
+
+class ClienteAPI:
+    """Cliente del backend sobre una `requests.Session` con pool de conexiones.
+
+    Reutiliza las conexiones TCP entre llamadas y reruns, aplica timeouts por
+    llamada, reintenta con backoff los verbos idempotentes, agrega el token bearer
+    de la sesión de Streamlit y registra la latencia de cada endpoint.
+    """
+
+    def __init__(self, base_url=API_URL, max_conexiones=API_MAX_CONEXIONES, reintentos=API_REINTENTOS):
+        self.base_url = base_url.rstrip("/")
+
+        # 503 no se reintenta: el backend lo usa cuando su pool de conexiones está
+        # agotado, y repetir la llamada solo lo satura más y bloquea el rerun. Sin
+        # respect_retry_after_header urllib3 reintentaría igual todo 503/429 con
+        # Retry-After, esperando lo que indique la cabecera.
+        reintento = Retry(
+            total=reintentos,
+            backoff_factor=0.3,
+            status_forcelist=(502, 504),
+            respect_retry_after_header=False,
+            allowed_methods=METODOS_IDEMPOTENTES,
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_conexiones, max_retries=reintento)
+
+        # La sesión es de todo el proceso (compartida por todos los usuarios de
+        # Streamlit): no se guardan cookies para que nada pase de un usuario a otro
+        self.sesion = requests.Session()
+        self.sesion.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+
+        self._latencias = defaultdict(lambda: deque(maxlen=MUESTRAS_LATENCIA))
+        self._llamadas = defaultdict(int)
+        self._errores = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def solicitud(self, metodo, ruta, autenticar=True, token=None, timeout=TIMEOUT_POR_DEFECTO, headers=None,
+                  **kwargs):
+        """Hacer una llamada al backend y devolver la `requests.Response`
+
+        Si `autenticar` es verdadero se envía el token indicado o, por defecto, el
+        `access_token` de la sesión actual. Los errores de red se propagan igual que
+        con `requests` (ConnectionError, Timeout...).
+        """
+        metodo = metodo.upper()
+        headers = dict(headers or {})
+        if autenticar:
+            token = token or st.session_state.get("access_token", "")
+            headers["Authorization"] = f"Bearer {token}"
+
+        endpoint = normalizar_endpoint(metodo, ruta)
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.sesion.request(metodo, f"{self.base_url}{ruta}", headers=headers, timeout=timeout,
+                                            **kwargs)
+        except requests.exceptions.RequestException:
+            self._registrar(endpoint, time.perf_counter() - inicio, error=True)
+            raise
+
+        self._registrar(endpoint, time.perf_counter() - inicio, error=respuesta.status_code >= 500)
+        return respuesta
+
+    def get(self, ruta, **kwargs):
+        return self.solicitud("GET", ruta, **kwargs)
+
+    def post(self, ruta, **kwargs):
+        return self.solicitud("POST", ruta, **kwargs)
+
+    def put(self, ruta, **kwargs):
+        return self.solicitud("PUT", ruta, **kwargs)
+
+    def patch(self, ruta, **kwargs):
+        return self.solicitud("PATCH", ruta, **kwargs)
+
+    def delete(self, ruta, **kwargs):
+        return self.solicitud("DELETE", ruta, **kwargs)
+
+    def _registrar(self, endpoint, segundos, error=False):
+        with self._lock:
+            self._latencias[endpoint].append(segundos * 1000)
+            self._llamadas[endpoint] += 1
+            if error:
+                self._errores[endpoint] += 1
+
+    def estadisticas(self):
+        """Latencia por endpoint (ms) sobre las últimas MUESTRAS_LATENCIA llamadas"""
+        with self._lock:
+            muestras = {endpoint: sorted(valores) for endpoint, valores in self._latencias.items()}
+            llamadas = dict(self._llamadas)
+            errores = dict(self._errores)
+
+        resultado = []
+        for endpoint, valores in sorted(muestras.items()):
+            if not valores:
+                continue
+            resultado.append({
+                'endpoint': endpoint,
+                'llamadas': llamadas.get(endpoint, 0),
+                'errores': errores.get(endpoint, 0),
+                'promedio_ms': round(sum(valores) / len(valores), 1),
+                'p50_ms': round(valores[len(valores) // 2], 1),
+                'p95_ms': round(valores[min(len(valores) - 1, int(len(valores) * 0.95))], 1),
+                'max_ms': round(valores[-1], 1),
+            })
+        return resultado
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente():
+    """Cliente compartido por todas las sesiones y reruns del proceso"""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = ClienteAPI()
+    return _cliente
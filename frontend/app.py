@@ -7,21 +7,20 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
-import psycopg2
-import calendar
 from dateutil.relativedelta import relativedelta
 import warnings
-import io
-import base64
-from io import BytesIO
-import xlsxwriter
-from fpdf import FPDF
-import tempfile
 import os
 import time
 from PIL import Image
 from dotenv import load_dotenv
+from api_cliente import obtener_cliente
 from login import verificar_autenticacion, cerrar_sesion, obtener_usuario_actual
+from datos import conectar, leer_registros
+from instrumentacion_sql import registro_consultas, SQL_UMBRAL_MS
+from filtros import COLUMNAS_FILTRABLES, IndiceBitmap, construir_expresion, firma_datos, firma_filtros
+from paginacion import PaginadorKeyset
+from trabajos_exportacion import EXPORT_DESCARGA_MAX_MB, FORMATOS_EXPORTACION, GestorExportaciones
+from reportes_programados import PERIODOS, listar_reportes
 
 load_dotenv()
 warnings.filterwarnings('ignore')
@@ -62,24 +61,6 @@ with st.sidebar:
 
     st.markdown("---")
 
-# ==================== CONFIGURACIÓN DE BASE DE DATOS ====================
-DATABASE_CONFIG = {
-    'dbname': 'contador_cerdos',
-    'user': 'postgres',
-    'password': 'a1b2c3d4',
-    'host': 'localhost',
-    'port': '5432'
-}
-
-#DATABASE_CONFIG = {
-    #'dbname': os.getenv("DB_NAME", "contador_cerdos"),
-   # 'user': os.getenv("DB_USER", "postgres"),
-   # 'password': os.getenv("DB_PASSWORD", "a1b2c3d4"),
-   # 'host': os.getenv("DB_HOST", "db"), # 'db_contador' es el nombre del contenedor de la base de datos
-  #  'port': os.getenv("DB_PORT", "5432")
-#}
-
-
 # ==================== FUNCIONES PARA LOGOS MEJORADAS ====================
 def cargar_logo(ruta, tamaño=(200, 80)):
     """Cargar y redimensionar logo manteniendo calidad"""
@@ -195,7 +176,7 @@ st.markdown("""
 def get_db_connection():
     """Establecer conexión a la base de datos"""
     try:
-        conn = psycopg2.connect(**DATABASE_CONFIG)
+        conn = conectar()
         return conn
     except Exception as e:
         st.error(f"❌ Error de conexión a la base de datos: {str(e)}")
@@ -209,53 +190,11 @@ def cargar_datos_completos():
     conn = get_db_connection()
     if conn:
         try:
-            query = """
-                    SELECT *,
-                           EXTRACT(HOUR FROM hora_inicio_embarque)                        as hora_inicio,
-                           EXTRACT(DOW FROM fecha_hora_registro)                          as dia_semana,
-                           EXTRACT(EPOCH FROM (hora_fin_embarque - hora_inicio_embarque)) as duracion_segundos,
-                           CASE
-                               WHEN EXTRACT(DOW FROM fecha_hora_registro) IN (0, 6) THEN 'Fin de Semana'
-                               ELSE 'Día Laboral'
-                               END                                                        as tipo_dia
-                    FROM registro_embarque
-                    ORDER BY fecha_hora_registro DESC
-                    """
-            df = pd.read_sql(query, conn)
+            df = leer_registros(conn)
             conn.close()
 
-            if not df.empty:
-                datetime_cols = ['fecha_hora_registro', 'hora_inicio_embarque', 'hora_fin_embarque']
-                for col in datetime_cols:
-                    if col in df.columns:
-                        df[col] = pd.to_datetime(df[col])
-
-                if 'fecha_hora_registro' in df.columns:
-                    df['anio'] = df['fecha_hora_registro'].dt.year
-                    df['mes'] = df['fecha_hora_registro'].dt.month
-                    df['fecha'] = df['fecha_hora_registro'].dt.date
-                    df['semana'] = df['fecha_hora_registro'].dt.isocalendar().week
-                    df['trimestre'] = df['fecha_hora_registro'].dt.quarter
-                    df['mes_nombre'] = df['fecha_hora_registro'].dt.strftime('%B')
-                    df['dia_nombre'] = df['fecha_hora_registro'].dt.strftime('%A')
-
-                if 'duracion_segundos' in df.columns and 'total_neto_cerdos' in df.columns:
-                    df['duracion_minutos'] = df['duracion_segundos'] / 60
-                    df['eficiencia'] = np.where(
-                        df['duracion_segundos'] > 0,
-                        df['total_neto_cerdos'] / (df['duracion_segundos'] / 3600),
-                        0
-                    )
-
-                if 'total_neto_cerdos' in df.columns:
-                    df['categoria_volumen'] = pd.cut(df['total_neto_cerdos'],
-                                                     bins=[0, 50, 100, 200, float('inf')],
-                                                     labels=['Muy Bajo', 'Bajo', 'Medio', 'Alto'])
-
-                if 'lote_cerdos' not in df.columns:
-                    df['lote_cerdos'] = 'Lote-' + (df.index + 1).astype(str).str.zfill(3)
-                else:
-                    df['lote_cerdos'] = df['lote_cerdos'].fillna('Sin Lote')
+            # Versión del contenido, calculada una vez por carga (viaja con la copia en caché)
+            df.attrs['version_datos'] = firma_datos(df)
 
             return df
         except Exception as e:
@@ -264,6 +203,31 @@ def cargar_datos_completos():
     return pd.DataFrame()
 
 
+@st.cache_resource(ttl=300, max_entries=2)
+def obtener_indice_filtros(_df, firma):
+    """Construir (una vez por carga de datos) los índices bitmap de los filtros"""
+    return IndiceBitmap(_df)
+
+
+@st.cache_resource
+def obtener_gestor_exportaciones():
+    """Cola de exportaciones compartida por todas las sesiones del servidor"""
+    return GestorExportaciones()
+
+
+@st.cache_data(ttl=60)
+def obtener_reportes_programados():
+    """Metadatos de los reportes programados (el programador los renueva una vez al día)"""
+    return listar_reportes()
+
+
+@st.cache_data(max_entries=20)
+def leer_reporte_programado(ruta, generado_en):
+    """Bytes de un reporte programado; `generado_en` cambia si el archivo se regenera"""
+    with open(ruta, 'rb') as f:
+        return f.read()
+
+
 @st.cache_data(ttl=300)
 def obtener_metricas_generales(df):
     """Calcular métricas generales del sistema mejoradas"""
@@ -312,417 +276,6 @@ def obtener_metricas_generales(df):
     return metricas
 
 
-# ==================== FUNCIONES DE EXPORTACIÓN ====================
-class PDFWithLogo(FPDF):
-    def header(self):
-        try:
-            logo1_path = "./image/logo1sinfondo.png"
-            if os.path.exists(logo1_path):
-                self.image(logo1_path, x=170, y=8, w=30, h=15)
-        except:
-            pass
-        self.set_font('Arial', 'B', 16)
-        self.cell(0, 20, 'Reporte de Conteo de Cerdos', 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        try:
-            logo_path = "./image/logo.png"
-            if os.path.exists(logo_path):
-                self.image(logo_path, x=10, y=self.get_y() - 5, w=20, h=10)
-        except:
-            pass
-        self.cell(0, 10, f'Página {self.page_no()} / {{nb}}', 0, 0, 'C')
-        self.ln(5)
-        self.set_font('Arial', 'I', 7)
-        self.cell(0, 5, 'Sistema de Conteo de Cerdos - Reporte generado automáticamente', 0, 0, 'C')
-
-
-# ==================== FUNCIÓN PDF CON TEXTO MULTILÍNEA ====================
-def exportar_a_pdf(df, titulo="Reporte de Conteo de Cerdos"):
-    """Exportar DataFrame a PDF con texto que se ajusta en múltiples líneas"""
-
-    class PDFMultilinea(FPDF):
-        def header(self):
-            try:
-                logo1_path = "./image/logo1sinfondo.png"
-                if os.path.exists(logo1_path):
-                    self.image(logo1_path, x=10, y=8, w=35, h=15)
-            except:
-                pass
-
-            self.set_font('Arial', 'B', 16)
-            self.cell(0, 15, 'REPORTE DE CONTEO DE CERDOS', 0, 1, 'C')
-            self.set_font('Arial', 'I', 10)
-            self.cell(0, 5, 'Sistema de Gestión de Embarques', 0, 1, 'C')
-            self.line(10, 30, 200, 30)
-            self.ln(10)
-
-        def multi_cell_table(self, w, h, txt, border=0, align='L', fill=False, max_lines=None):
-            """Versión mejorada de multi_cell para tablas"""
-            txt = str(txt)
-
-            # Si el texto cabe en una línea, usar cell normal
-            if self.get_string_width(txt) <= w:
-                self.cell(w, h, txt, border, 0, align, fill)
-                return h
-
-            # Calcular cuántas líneas se necesitan
-            lines = []
-            words = txt.split(' ')
-            current_line = ''
-
-            for word in words:
-                test_line = f"{current_line} {word}".strip()
-                if self.get_string_width(test_line) <= w:
-                    current_line = test_line
-                else:
-                    if current_line:
-                        lines.append(current_line)
-                    current_line = word
-
-            if current_line:
-                lines.append(current_line)
-
-            # Limitar líneas si se especifica
-            if max_lines and len(lines) > max_lines:
-                lines = lines[:max_lines]
-                if len(lines) == max_lines:
-                    lines[-1] = lines[-1][:self.get_string_width_inverse(w - 10)] + '...'
-
-            # Dibujar múltiples líneas
-            x = self.get_x()
-            y = self.get_y()
-
-            for i, line in enumerate(lines):
-                if i > 0:  # Si no es la primera línea
-                    self.set_xy(x, self.get_y() + h / 2)  # Espaciado entre líneas
-
-                self.cell(w, h, line, border, 2, align, fill)
-                if i < len(lines) - 1:  # Si no es la última línea
-                    self.set_xy(x, self.get_y())
-
-            # Calcular altura total utilizada
-            altura_total = (len(lines) * h) + ((len(lines) - 1) * (h / 2))
-            return altura_total
-
-    pdf = PDFMultilinea()
-    pdf.alias_nb_pages()
-    pdf.add_page()
-
-    # Información del reporte
-    pdf.set_font("Arial", '', 10)
-    pdf.cell(0, 8, f"Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", 0, 1)
-    pdf.cell(0, 8, f"Total de registros: {len(df):,}", 0, 1)
-    pdf.ln(5)
-
-    # Logo central
-    try:
-        logo_path = r"D:\codigos\contador_cerdos\imagenes\logo.png"
-        if os.path.exists(logo_path):
-            pdf.image(logo_path, x=(210 - 60) / 2, y=50, w=60, h=30)
-            pdf.ln(35)
-    except:
-        pass
-
-    # Estadísticas principales
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 10, "Estadísticas Principales:", 0, 1)
-    pdf.set_font("Arial", '', 10)
-
-    estadisticas = [
-        f"Total de cerdos: {df['total_neto_cerdos'].sum() if 'total_neto_cerdos' in df.columns else 0:,}",
-        f"Total de embarques: {len(df):,}",
-        f"Promedio por embarque: {df['total_neto_cerdos'].mean() if 'total_neto_cerdos' in df.columns else 0:.1f}",
-        f"Total de lotes: {df['lote_cerdos'].nunique() if 'lote_cerdos' in df.columns else 0}",
-        f"Orígenes únicos: {df['sitio_origen'].nunique() if 'sitio_origen' in df.columns else 0}",
-        f"Destinos únicos: {df['sitio_destino'].nunique() if 'sitio_destino' in df.columns else 0}"
-    ]
-
-    for i, estadistica in enumerate(estadisticas):
-        pdf.cell(0, 6, estadistica, 0, 1)
-        if i == 2:
-            pdf.ln(2)
-
-    pdf.ln(8)
-
-    # ==================== TABLA CON TEXTO MULTILÍNEA ====================
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 10, "Datos de Embarques:", 0, 1)
-
-    # Definir configuración de columnas
-    config_columnas = [
-        {'campo': 'fecha', 'nombre': 'Fecha', 'ancho': 25, 'alineacion': 'C', 'max_lineas': 1},
-        {'campo': 'lote_cerdos', 'nombre': 'Lote', 'ancho': 30, 'alineacion': 'C', 'max_lineas': 2},
-        {'campo': 'placa_vehiculo', 'nombre': 'Placa', 'ancho': 25, 'alineacion': 'C', 'max_lineas': 1},
-        {'campo': 'sitio_origen', 'nombre': 'Origen', 'ancho': 45, 'alineacion': 'L', 'max_lineas': 3},
-        {'campo': 'sitio_destino', 'nombre': 'Destino', 'ancho': 45, 'alineacion': 'L', 'max_lineas': 3},
-        {'campo': 'total_neto_cerdos', 'nombre': 'Cerdos', 'ancho': 25, 'alineacion': 'R', 'max_lineas': 1}
-    ]
-
-    # Filtrar columnas que existen
-    config_columnas = [col for col in config_columnas if col['campo'] in df.columns]
-
-    if not config_columnas or len(df) == 0:
-        pdf.cell(0, 10, "No hay datos para mostrar", 0, 1)
-        return pdf
-
-    # Tomar muestra de datos
-    df_muestra = df.head(30)
-
-    # Calcular anchos totales y posición
-    anchos = [col['ancho'] for col in config_columnas]
-    total_ancho = sum(anchos)
-    x_inicial = max(10, (210 - total_ancho) / 2)  # Mínimo margen izquierdo
-
-    # ==================== FUNCIÓN PARA PROCESAR TEXTO ====================
-    def procesar_texto(pdf, texto, ancho, max_lineas=None, fuente='Arial', tamaño=8):
-        """Dividir texto en líneas que caben en el ancho"""
-        if not isinstance(texto, str):
-            texto = str(texto)
-
-        # Si es fecha, formatear
-        if isinstance(texto, datetime) or (hasattr(texto, 'strftime') and texto != 'NaT'):
-            try:
-                texto = texto.strftime('%d/%m/%Y')
-            except:
-                texto = str(texto)
-
-        # Si es número, formatear
-        if isinstance(texto, (int, float)):
-            texto = f"{texto:,.0f}" if texto == int(texto) else f"{texto:,.2f}"
-
-        # Configurar fuente temporal para cálculo
-        pdf.set_font(fuente, '', tamaño)
-
-        # Si el texto cabe en una línea, retornar como está
-        if pdf.get_string_width(texto) <= ancho:
-            return [texto]
-
-        # Dividir en palabras
-        palabras = texto.split(' ')
-        lineas = []
-        linea_actual = ''
-
-        for palabra in palabras:
-            prueba = f"{linea_actual} {palabra}".strip()
-
-            if pdf.get_string_width(prueba) <= ancho:
-                linea_actual = prueba
-            else:
-                if linea_actual:
-                    lineas.append(linea_actual)
-                linea_actual = palabra
-
-        if linea_actual:
-            lineas.append(linea_actual)
-
-        # Limitar líneas si es necesario
-        if max_lineas and len(lineas) > max_lineas:
-            lineas = lineas[:max_lineas]
-            # Truncar última línea si es muy larga
-            if lineas:
-                ultima_linea = lineas[-1]
-                while pdf.get_string_width(ultima_linea + '...') > ancho and len(ultima_linea) > 3:
-                    ultima_linea = ultima_linea[:-1]
-                lineas[-1] = ultima_linea + '...'
-
-        return lineas
-
-    # ==================== DIBUJAR ENCABEZADOS ====================
-    pdf.set_font("Arial", 'B', 9)
-    pdf.set_fill_color(30, 58, 138)  # Color azul oscuro
-    pdf.set_text_color(255, 255, 255)  # Texto blanco
-
-    pdf.set_x(x_inicial)
-    y_inicial = pdf.get_y()
-
-    for config in config_columnas:
-        nombre = config['nombre']
-        ancho = config['ancho']
-        alineacion = config['alineacion']
-
-        # Procesar texto del encabezado
-        lineas_encabezado = procesar_texto(pdf, nombre, ancho, max_lineas=2, tamaño=9)
-
-        # Calcular altura del encabezado
-        altura_encabezado = len(lineas_encabezado) * 4 + 4  # 4mm por línea + padding
-
-        # Dibujar encabezado multilínea
-        x_actual = pdf.get_x()
-        y_actual = pdf.get_y()
-
-        for i, linea in enumerate(lineas_encabezado):
-            if i == 0:
-                pdf.cell(ancho, altura_encabezado, linea, 1, 2, alineacion, fill=True)
-                pdf.set_xy(x_actual + ancho, y_actual)
-            else:
-                pdf.set_xy(x_actual, pdf.get_y())
-                pdf.cell(ancho, 4, linea, 'LR', 2, alineacion, fill=True)
-                pdf.set_xy(x_actual + ancho, pdf.get_y() - 4)
-
-        # Restaurar posición para siguiente columna
-        pdf.set_xy(x_actual + ancho, y_actual)
-
-    pdf.ln(altura_encabezado)
-
-    # Restaurar color de texto
-    pdf.set_text_color(0, 0, 0)
-
-    # ==================== DIBUJAR DATOS ====================
-    pdf.set_font("Arial", '', 8)
-
-    # Altura base de fila (se ajustará dinámicamente)
-    altura_base_fila = 6
-    fill = False
-
-    for idx, fila in df_muestra.iterrows():
-        # Calcular altura máxima necesaria para esta fila
-        alturas_por_columna = []
-
-        for config in config_columnas:
-            campo = config['campo']
-            ancho = config['ancho']
-            max_lineas = config.get('max_lineas', 3)
-
-            if campo in fila:
-                valor = fila[campo]
-                lineas = procesar_texto(pdf, valor, ancho, max_lineas, tamaño=8)
-                altura_necesaria = len(lineas) * 3 + 2  # 3mm por línea + padding
-                alturas_por_columna.append(altura_necesaria)
-
-        altura_fila = max(alturas_por_columna) if alturas_por_columna else altura_base_fila
-
-        # Dibujar fila
-        pdf.set_x(x_inicial)
-        y_fila_inicio = pdf.get_y()
-
-        for i, config in enumerate(config_columnas):
-            campo = config['campo']
-            ancho = config['ancho']
-            alineacion = config['alineacion']
-            max_lineas = config.get('max_lineas', 3)
-
-            if campo in fila:
-                valor = fila[campo]
-                lineas = procesar_texto(pdf, valor, ancho, max_lineas, tamaño=8)
-
-                # Configurar color de fondo
-                if fill:
-                    pdf.set_fill_color(240, 240, 240)
-                else:
-                    pdf.set_fill_color(255, 255, 255)
-
-                # Dibujar celda con múltiples líneas
-                x_celda = pdf.get_x()
-                y_celda = pdf.get_y()
-
-                for j, linea in enumerate(lineas):
-                    if j == 0:
-                        # Primera línea - dibujar bordes completos
-                        bordes = 'LTR' if i == 0 else 'TR'
-                        if i == len(config_columnas) - 1:
-                            bordes += 'R'
-                        pdf.cell(ancho, altura_fila, linea, bordes, 2, alineacion, fill=fill)
-                    else:
-                        # Líneas adicionales - solo bordes laterales
-                        pdf.set_xy(x_celda, pdf.get_y())
-                        pdf.cell(ancho, 3, linea, 'LR', 2, alineacion, fill=fill)
-
-                # Rellenar espacio restante si hay menos líneas
-                lineas_dibujadas = len(lineas)
-                if lineas_dibujadas * 3 < altura_fila:
-                    espacio_extra = altura_fila - (lineas_dibujadas * 3)
-                    pdf.set_xy(x_celda, pdf.get_y())
-                    pdf.cell(ancho, espacio_extra, '', 'LRB', 2, alineacion, fill=fill)
-
-                # Posicionar para siguiente columna
-                pdf.set_xy(x_celda + ancho, y_celda)
-
-        # Mover a siguiente fila
-        pdf.set_xy(x_inicial, y_fila_inicio + altura_fila)
-        fill = not fill
-
-    # ==================== PIE INFORMATIVO ====================
-    pdf.ln(10)
-    pdf.set_font("Arial", 'I', 8)
-    pdf.cell(0, 5, f"*Mostrando {len(df_muestra)} de {len(df)} registros. Texto ajustado automáticamente.*", 0, 1, 'C')
-
-    if len(df) > 30:
-        pdf.cell(0, 5, f"*Nota: Para ver todos los registros, exporte en formato Excel.*", 0, 1, 'C')
-
-    return pdf
-
-def exportar_a_excel(df):
-    """Exportar DataFrame a Excel"""
-    output = BytesIO()
-
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Datos Completos', index=False)
-
-        resumen_data = {
-            'Métrica': ['Total Embarques', 'Total Cerdos', 'Promedio por Embarque',
-                        'Total Lotes', 'Orígenes Únicos', 'Destinos Únicos'],
-            'Valor': [
-                len(df),
-                df['total_neto_cerdos'].sum() if 'total_neto_cerdos' in df.columns else 0,
-                df['total_neto_cerdos'].mean() if 'total_neto_cerdos' in df.columns else 0,
-                df['lote_cerdos'].nunique() if 'lote_cerdos' in df.columns else 0,
-                df['sitio_origen'].nunique() if 'sitio_origen' in df.columns else 0,
-                df['sitio_destino'].nunique() if 'sitio_destino' in df.columns else 0
-            ]
-        }
-        resumen_df = pd.DataFrame(resumen_data)
-        resumen_df.to_excel(writer, sheet_name='Resumen', index=False)
-
-        workbook = writer.book
-
-        try:
-            logo1_path = "./image/logo1sinfondo.png"
-            if os.path.exists(logo1_path):
-                worksheet = writer.sheets['Resumen']
-                worksheet.insert_image('A1', logo1_path, {'x_scale': 0.4, 'y_scale': 0.4})
-        except:
-            pass
-
-        header_format = workbook.add_format({
-            'bold': True,
-            'text_wrap': True,
-            'valign': 'top',
-            'fg_color': '#1E3A8A',
-            'font_color': 'white',
-            'border': 1,
-            'font_size': 10
-        })
-
-        for sheet_name in writer.sheets:
-            worksheet = writer.sheets[sheet_name]
-            if sheet_name == 'Datos Completos':
-                columns = df.columns
-                data_df = df
-            else:
-                columns = resumen_df.columns
-                data_df = resumen_df
-
-            for col_num, value in enumerate(columns):
-                worksheet.write(0, col_num, value, header_format)
-                max_len = max(
-                    data_df[value].astype(str).apply(len).max() if len(data_df) > 0 else 0,
-                    len(str(value))
-                ) + 2
-                worksheet.set_column(col_num, col_num, min(max_len, 40))
-
-    output.seek(0)
-    return output
-
-
-def exportar_a_csv(df):
-    """Exportar DataFrame a CSV"""
-    return df.to_csv(index=False).encode('utf-8')
-
-
 # ==================== FUNCIONES DE GRÁFICOS ====================
 def crear_grafico_analisis_lotes(df):
     """Crear gráfico de análisis por lotes"""
@@ -842,6 +395,61 @@ def crear_grafico_tendencia_mensual(df):
 
 
 # ==================== FUNCIONES PARA GESTIÓN DE USUARIOS ====================
+USUARIOS_POR_PAGINA = 50
+ESTADOS_USUARIO = {"Todos": None, "Activos": "true", "Inactivos": "false"}
+
+
+def obtener_usuarios(cliente, filtros=None, despues_de=None, limite=USUARIOS_POR_PAGINA, revalidar=False):
+    """Página de usuarios con caché por sesión; devuelve (código de estado, página)
+
+    La página es un dict con 'usuarios', 'siguiente' (cursor de la página
+    siguiente o None) y 'total' (usuarios que cumplen los filtros). Cada
+    combinación de filtros y cursor se guarda por separado y se reutiliza sin
+    llamar al backend hasta que una mutación exitosa invalida la caché. Al
+    revalidar se envía el ETag recibido, de modo que un 304 conserva la página.
+    """
+    params = {clave: valor for clave, valor in (filtros or {}).items() if valor not in (None, "")}
+    params.update(limit=limite, contar="true")
+    if despues_de is not None:
+        params["despues_de"] = despues_de
+
+    paginas = st.session_state.setdefault("cache_usuarios", {})
+    clave = tuple(sorted(params.items()))
+    cache = paginas.get(clave)
+    if cache is not None and not revalidar:
+        return 200, cache
+
+    headers = {}
+    if cache is not None and cache.get('etag'):
+        headers["If-None-Match"] = cache['etag']
+
+    response = cliente.get("/usuarios/", params=params, headers=headers)
+    if response.status_code == 304:
+        return 200, cache
+    if response.status_code != 200:
+        return response.status_code, {'usuarios': [], 'siguiente': None, 'total': 0}
+
+    siguiente = response.headers.get("X-Siguiente-Cursor")
+    pagina = {
+        'usuarios': response.json(),
+        'siguiente': int(siguiente) if siguiente else None,
+        'total': int(response.headers.get("X-Total-Count", 0)),
+        'etag': response.headers.get("ETag"),
+    }
+    paginas[clave] = pagina
+    return 200, pagina
+
+
+def invalidar_usuarios():
+    """Descartar las páginas en caché después de crear, editar o eliminar un usuario"""
+    st.session_state.pop("cache_usuarios", None)
+
+
+def reiniciar_paginacion_usuarios():
+    """Volver a la primera página cuando cambian los filtros del listado"""
+    st.session_state["cursores_usuarios"] = [None]
+
+
 def mostrar_gestion_usuarios():
     """Mostrar interfaz para gestión de usuarios (solo admin)"""
     usuario_actual = obtener_usuario_actual()
@@ -852,8 +460,15 @@ def mostrar_gestion_usuarios():
 
     st.markdown('<h2 class="sub-header">👥 Gestión de Usuarios</h2>', unsafe_allow_html=True)
 
+    cliente = obtener_cliente()
+
+    # Las páginas se filtran en el servidor; el botón de actualizar revalida ambas pestañas
+    revalidar = st.session_state.pop("revalidar_usuarios", False)
+
     # Tabs para diferentes operaciones
-    tab_crear, tab_listar, tab_editar = st.tabs(["➕ Crear Usuario", "📋 Listar Usuarios", "✏️ Editar Usuario"])
+    tab_crear, tab_listar, tab_editar, tab_importar = st.tabs(
+        ["➕ Crear Usuario", "📋 Listar Usuarios", "✏️ Editar Usuario", "📥 Importar Usuarios"]
+    )
 
     with tab_crear:
         st.markdown("### Crear Nuevo Usuario")
@@ -882,11 +497,9 @@ def mostrar_gestion_usuarios():
                 elif len(nuevo_password) < 6:
                     st.error("❌ La contraseña debe tener al menos 6 caracteres")
                 else:
+                    # Acción sensible: revalidar el token aunque la verificación esté en caché
+                    verificar_autenticacion(forzar=True)
                     try:
-                        # Obtener token del usuario actual
-                        token = st.session_state.get("access_token")
-                        headers = {"Authorization": f"Bearer {token}"}
-
                         # Datos del nuevo usuario
                         usuario_data = {
                             "username": nuevo_username,
@@ -897,14 +510,10 @@ def mostrar_gestion_usuarios():
                         }
 
                         # Llamar a la API para crear usuario
-                        response = requests.post(
-                            f"{API_URL}/usuarios/",
-                            json=usuario_data,
-                            headers=headers,
-                            timeout=10
-                        )
+                        response = cliente.post("/usuarios/", json=usuario_data)
 
                         if response.status_code == 200:
+                            invalidar_usuarios()
                             st.success(f"✅ Usuario '{nuevo_username}' creado exitosamente")
                             st.balloons()
                             time.sleep(1)
@@ -923,21 +532,34 @@ def mostrar_gestion_usuarios():
     with tab_listar:
         st.markdown("### Lista de Usuarios Registrados")
 
-        try:
-            # Obtener token del usuario actual
-            token = st.session_state.get("access_token")
-            headers = {"Authorization": f"Bearer {token}"}
-
-            # Llamar a la API para obtener usuarios
-            response = requests.get(
-                f"{API_URL}/usuarios/",
-                headers=headers,
-                timeout=10
-            )
+        st.button("🔄 Actualizar lista", key="btn_actualizar_usuarios",
+                  on_click=lambda: st.session_state.update(revalidar_usuarios=True))
+
+        col_buscar, col_rol, col_estado = st.columns([2, 1, 1])
+        with col_buscar:
+            buscar = st.text_input("🔎 Buscar", placeholder="Inicio del usuario o email",
+                                   key="usuarios_buscar", on_change=reiniciar_paginacion_usuarios)
+        with col_rol:
+            rol = st.selectbox("Rol", ["Todos", "usuario", "supervisor", "admin"],
+                               key="usuarios_rol", on_change=reiniciar_paginacion_usuarios)
+        with col_estado:
+            estado = st.selectbox("Estado", list(ESTADOS_USUARIO),
+                                  key="usuarios_estado", on_change=reiniciar_paginacion_usuarios)
+
+        filtros = {
+            'buscar': buscar.strip(),
+            'rol': None if rol == "Todos" else rol,
+            'activo': ESTADOS_USUARIO[estado],
+        }
+        # Pila de cursores: el último es el de la página visible
+        cursores = st.session_state.setdefault("cursores_usuarios", [None])
 
-            if response.status_code == 200:
-                usuarios = response.json()
+        try:
+            estado_usuarios, pagina = obtener_usuarios(cliente, filtros, despues_de=cursores[-1],
+                                                       revalidar=revalidar)
+            usuarios = pagina['usuarios']
 
+            if estado_usuarios == 200:
                 if usuarios:
                     # Convertir a DataFrame para mejor visualización
                     df_usuarios = pd.DataFrame(usuarios)
@@ -958,23 +580,60 @@ def mostrar_gestion_usuarios():
                         height=400
                     )
 
-                    # Estadísticas
-                    col1, col2, col3 = st.columns(3)
+                    # Navegación entre páginas
+                    col1, col2, col3 = st.columns([1, 2, 1])
                     with col1:
-                        st.metric("Total Usuarios", len(usuarios))
+                        st.button("◀ Anterior", key="btn_pagina_anterior", disabled=len(cursores) == 1,
+                                  on_click=cursores.pop, use_container_width=True)
                     with col2:
-                        usuarios_activos = sum(1 for u in usuarios if u.get('activo', True))
-                        st.metric("Usuarios Activos", usuarios_activos)
+                        desde = (len(cursores) - 1) * USUARIOS_POR_PAGINA
+                        st.markdown(
+                            f"<p style='text-align: center;'>Usuarios {desde + 1}–{desde + len(usuarios)} "
+                            f"de {pagina['total']}</p>",
+                            unsafe_allow_html=True
+                        )
                     with col3:
-                        admins = sum(1 for u in usuarios if u.get('rol') == 'admin')
-                        st.metric("Administradores", admins)
+                        st.button("Siguiente ▶", key="btn_pagina_siguiente", disabled=pagina['siguiente'] is None,
+                                  on_click=cursores.append, args=(pagina['siguiente'],), use_container_width=True)
+
+                    # Acciones masivas sobre la página visible
+                    with st.expander("🧰 Acciones masivas"):
+                        etiquetas = {u['id']: f"{u['id']} - {u['username']} ({u['rol']})" for u in usuarios}
+                        seleccionados = st.multiselect("Usuarios", options=list(etiquetas),
+                                                       format_func=etiquetas.get, key="masivo_ids")
+                        accion = st.selectbox("Acción", ["Activar", "Desactivar", "Cambiar rol"], key="masivo_accion")
+                        rol_masivo = None
+                        if accion == "Cambiar rol":
+                            rol_masivo = st.selectbox("Nuevo rol", ["usuario", "supervisor", "admin"],
+                                                      key="masivo_rol")
+
+                        if st.button("✅ Aplicar", key="btn_masivo", disabled=not seleccionados):
+                            verificar_autenticacion(forzar=True)
+                            cambio = {"ids": seleccionados}
+                            if accion == "Cambiar rol":
+                                cambio["rol"] = rol_masivo
+                            else:
+                                cambio["activo"] = accion == "Activar"
+
+                            response = cliente.patch("/usuarios/masivo", json=cambio)
+                            if response.status_code == 200:
+                                resultado = response.json()
+                                invalidar_usuarios()
+                                st.success(f"✅ {len(resultado['actualizados'])} usuarios actualizados, "
+                                           f"{len(resultado['sin_cambios'])} sin cambios")
+                                for omision in resultado['omitidos']:
+                                    st.warning(f"⚠️ Usuario {omision['id']}: {omision['motivo']}")
+                            else:
+                                st.error(f"❌ {response.json().get('detail', 'Error al aplicar la acción')}")
+                elif any(filtros.values()):
+                    st.info("🔍 Ningún usuario coincide con los filtros")
                 else:
                     st.info("📭 No hay usuarios registrados")
 
-            elif response.status_code == 403:
+            elif estado_usuarios == 403:
                 st.error("❌ No tiene permisos para ver usuarios")
             else:
-                st.error(f"❌ Error al obtener usuarios: {response.status_code}")
+                st.error(f"❌ Error al obtener usuarios: {estado_usuarios}")
 
         except requests.exceptions.ConnectionError:
             st.error("❌ No se puede conectar con el servidor")
@@ -984,19 +643,18 @@ def mostrar_gestion_usuarios():
     with tab_editar:
         st.markdown("### Editar o Desactivar Usuario")
 
+        buscar_editar = st.text_input("🔎 Buscar usuario", placeholder="Inicio del usuario o email",
+                                      key="editar_buscar")
+
         try:
-            # Obtener lista de usuarios primero
-            token = st.session_state.get("access_token")
-            headers = {"Authorization": f"Bearer {token}"}
-
-            response = requests.get(
-                f"{API_URL}/usuarios/",
-                headers=headers,
-                timeout=10
-            )
+            estado_usuarios, pagina = obtener_usuarios(cliente, {'buscar': buscar_editar.strip()},
+                                                       revalidar=revalidar)
+            usuarios = pagina['usuarios']
 
-            if response.status_code == 200:
-                usuarios = response.json()
+            if estado_usuarios == 200:
+                if pagina['siguiente'] is not None:
+                    st.caption(f"Mostrando {len(usuarios)} de {pagina['total']} usuarios; "
+                               f"escriba el inicio del usuario o email para acotar la lista")
 
                 if usuarios:
                     # Filtrar usuarios (no mostrar el usuario actual para no desactivarse a sí mismo)
@@ -1049,15 +707,13 @@ def mostrar_gestion_usuarios():
 
                                     if st.button("🔄 Actualizar Estado", key=f"btn_estado_{usuario_id}",
                                                  use_container_width=True):
+                                        verificar_autenticacion(forzar=True)
                                         try:
                                             endpoint = "activar" if nuevo_estado == "Activo" else "desactivar"
-                                            response = requests.patch(
-                                                f"{API_URL}/usuarios/{usuario_id}/{endpoint}",
-                                                headers=headers,
-                                                timeout=10
-                                            )
+                                            response = cliente.patch(f"/usuarios/{usuario_id}/{endpoint}")
 
                                             if response.status_code == 200:
+                                                invalidar_usuarios()
                                                 st.success(f"✅ Usuario {nuevo_estado.lower()} correctamente")
                                                 time.sleep(1)
                                                 st.rerun()
@@ -1079,17 +735,14 @@ def mostrar_gestion_usuarios():
 
                                     if st.button("🎭 Cambiar Rol", key=f"btn_rol_{usuario_id}",
                                                  use_container_width=True):
+                                        verificar_autenticacion(forzar=True)
                                         try:
-                                            # Para cambiar rol necesitamos usar el endpoint de actualización
-                                            update_data = {"rol": nuevo_rol}
-                                            response = requests.put(
-                                                f"{API_URL}/usuarios/{usuario_id}",
-                                                json=update_data,
-                                                headers=headers,
-                                                timeout=10
-                                            )
+                                            # UsuarioUpdate no incluye el rol: se usa el cambio masivo
+                                            response = cliente.patch("/usuarios/masivo",
+                                                                     json={"ids": [usuario_id], "rol": nuevo_rol})
 
                                             if response.status_code == 200:
+                                                invalidar_usuarios()
                                                 st.success(f"✅ Rol cambiado a {nuevo_rol}")
                                                 time.sleep(1)
                                                 st.rerun()
@@ -1115,14 +768,12 @@ def mostrar_gestion_usuarios():
                                                          type="secondary",
                                                          key=f"delete_{usuario_id}",
                                                          use_container_width=True):
+                                                verificar_autenticacion(forzar=True)
                                                 try:
-                                                    response = requests.delete(
-                                                        f"{API_URL}/usuarios/{usuario_id}",
-                                                        headers=headers,
-                                                        timeout=10
-                                                    )
+                                                    response = cliente.delete(f"/usuarios/{usuario_id}")
 
                                                     if response.status_code == 200:
+                                                        invalidar_usuarios()
                                                         st.success("✅ Usuario eliminado correctamente")
                                                         time.sleep(1)
                                                         st.rerun()
@@ -1133,6 +784,8 @@ def mostrar_gestion_usuarios():
                                                     st.error(f"❌ Error: {str(e)}")
                     else:
                         st.info("📭 No hay otros usuarios para editar (solo existe su usuario)")
+                elif buscar_editar.strip():
+                    st.info("🔍 Ningún usuario coincide con la búsqueda")
                 else:
                     st.info("📭 No hay usuarios registrados")
 
@@ -1144,6 +797,87 @@ def mostrar_gestion_usuarios():
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
 
+    with tab_importar:
+        st.markdown("### Importar Usuarios desde CSV")
+        st.caption("Columnas: username, email, password y opcionalmente nombre_completo y rol "
+                   "(usuario, supervisor o admin). Codificación UTF-8.")
+
+        st.download_button(
+            "📄 Descargar plantilla",
+            data="username,email,password,nombre_completo,rol\n",
+            file_name="plantilla_usuarios.csv",
+            mime="text/csv"
+        )
+
+        archivo = st.file_uploader("Archivo CSV", type=["csv"], key="archivo_importacion")
+        if archivo is not None:
+            try:
+                vista_previa = pd.read_csv(archivo, dtype=str, nrows=5)
+                st.dataframe(vista_previa.drop(columns=["password"], errors="ignore"),
+                             use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.warning(f"⚠️ No se pudo mostrar la vista previa: {str(e)}")
+
+            if st.button("📥 Importar", type="primary", key="btn_importar"):
+                verificar_autenticacion(forzar=True)
+                try:
+                    with st.spinner("Importando usuarios..."):
+                        # Hashear miles de contraseñas toma tiempo: ampliar el timeout de lectura
+                        response = cliente.post(
+                            "/usuarios/importar/csv",
+                            files={"archivo": (archivo.name, archivo.getvalue(), "text/csv")},
+                            timeout=(3.05, 600)
+                        )
+
+                    if response.status_code == 200:
+                        resultado = response.json()
+                        if resultado['creados']:
+                            invalidar_usuarios()
+                        st.success(f"✅ {len(resultado['creados'])} usuarios creados")
+
+                        for titulo, filas in (("⚠️ Ya registrados", resultado['conflictos']),
+                                              ("❌ Filas con errores", resultado['errores'])):
+                            if filas:
+                                st.markdown(f"**{titulo}: {len(filas)}**")
+                                st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+                    else:
+                        st.error(f"❌ {response.json().get('detail', 'Error al importar usuarios')}")
+
+                except requests.exceptions.ConnectionError:
+                    st.error("❌ No se puede conectar con el servidor")
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+
+    with st.expander("⏱️ Latencia de la API"):
+        estadisticas = cliente.estadisticas()
+        if estadisticas:
+            st.dataframe(pd.DataFrame(estadisticas), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Aún no hay llamadas registradas")
+
+    with st.expander("🐢 Consultas SQL"):
+        st.caption(f"Por tiempo total; las que superan {SQL_UMBRAL_MS:.0f} ms se registran en el log")
+        st.markdown("**Dashboard**")
+        consultas = registro_consultas.estadisticas()
+        if consultas:
+            st.dataframe(pd.DataFrame(consultas), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Aún no hay consultas registradas")
+
+        st.markdown("**API**")
+        # El contenido de un expander se ejecuta en cada rerun: consultar solo a pedido
+        if st.button("🔄 Consultar la API", key="btn_consultas_api"):
+            try:
+                response = cliente.get("/admin/consultas")
+                if response.status_code == 200 and response.json():
+                    st.dataframe(pd.DataFrame(response.json()), use_container_width=True, hide_index=True)
+                elif response.status_code == 200:
+                    st.caption("Aún no hay consultas registradas")
+                else:
+                    st.caption(f"No disponible ({response.status_code})")
+            except requests.exceptions.RequestException:
+                st.caption("No se puede conectar con el servidor")
+
 
 # ==================== INTERFAZ PRINCIPAL ====================
 def main():
@@ -1177,6 +911,8 @@ def main():
         st.error("No se pudieron cargar datos de la base de datos")
         return
 
+    version_datos = df_completo.attrs.get('version_datos') or firma_datos(df_completo)
+
     # Sidebar con filtros
     with st.sidebar:
         mostrar_logo_sidebar()
@@ -1195,8 +931,24 @@ def main():
             if 'fecha' in df_completo.columns:
                 fecha_fin = st.date_input("Hasta", value=fecha_max, key="fecha_fin")
 
-        if 'lote_cerdos' in df_completo.columns:
-            lote_seleccionado = st.selectbox("Lote", ["Todos"] + sorted(df_completo['lote_cerdos'].unique().tolist()))
+        indice_filtros = obtener_indice_filtros(df_completo, version_datos)
+
+        selecciones = {}
+        for columna, etiqueta in COLUMNAS_FILTRABLES.items():
+            if columna in indice_filtros.valores:
+                selecciones[columna] = st.multiselect(
+                    etiqueta,
+                    options=indice_filtros.valores[columna],
+                    placeholder="Todos",
+                    key=f"filtro_{columna}"
+                )
+
+        combinar_columnas = st.radio(
+            "Combinar filtros",
+            ["Todos (Y)", "Cualquiera (O)"],
+            horizontal=True,
+            key="filtro_combinar"
+        )
 
         col_b1, col_b2 = st.columns(2)
         with col_b1:
@@ -1209,24 +961,29 @@ def main():
     # Aplicar filtros
     if limpiar_filtros:
         st.session_state.df_filtrado = df_completo.copy()
+        st.session_state.filtros_activos = None
+        st.session_state.version_filtrado = version_datos
+        for columna in COLUMNAS_FILTRABLES:
+            st.session_state.pop(f"filtro_{columna}", None)
         st.rerun()
 
     if 'df_filtrado' not in st.session_state:
         st.session_state.df_filtrado = df_completo.copy()
+        st.session_state.filtros_activos = None
+        st.session_state.version_filtrado = version_datos
 
     if aplicar_filtros:
-        df_filtrado = df_completo.copy()
-
-        if 'fecha' in df_filtrado.columns:
-            df_filtrado = df_filtrado[
-                (df_filtrado['fecha'] >= fecha_inicio) &
-                (df_filtrado['fecha'] <= fecha_fin)
-                ]
-
-        if 'lote_cerdos' in df_filtrado.columns and lote_seleccionado != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['lote_cerdos'] == lote_seleccionado]
+        # Rango de fechas AND (OR de valores dentro de cada columna, combinado entre columnas)
+        expresion = construir_expresion(
+            fecha_inicio=fecha_inicio if 'fecha' in df_completo.columns else None,
+            fecha_fin=fecha_fin if 'fecha' in df_completo.columns else None,
+            selecciones=selecciones,
+            combinar='y' if combinar_columnas == "Todos (Y)" else 'o'
+        )
 
-        st.session_state.df_filtrado = df_filtrado
+        st.session_state.df_filtrado = indice_filtros.filtrar(df_completo, expresion)
+        st.session_state.filtros_activos = firma_filtros(expresion)
+        st.session_state.version_filtrado = version_datos
 
     df_filtrado = st.session_state.df_filtrado
     metricas = obtener_metricas_generales(df_filtrado)
@@ -1330,13 +1087,53 @@ def main():
         columnas_mostrar = [col for col in columnas_importantes if col in df_filtrado.columns]
 
         if columnas_mostrar:
+            opciones_orden = [col for col in ['fecha_hora_registro'] + columnas_mostrar if col in df_filtrado.columns]
+
+            col_orden1, col_orden2 = st.columns([3, 1])
+            with col_orden1:
+                columna_orden = st.selectbox("Ordenar por", opciones_orden, key="detalle_orden")
+            with col_orden2:
+                descendente = st.radio("Dirección", ["Desc", "Asc"], horizontal=True,
+                                       key="detalle_direccion") == "Desc"
+
+            # El orden se calcula una vez por conjunto filtrado; las páginas se leen por cursor
+            clave_paginador = (id(df_filtrado), columna_orden, descendente)
+            if st.session_state.get('detalle_clave') != clave_paginador:
+                st.session_state.detalle_paginador = PaginadorKeyset(df_filtrado, columna_orden, descendente)
+                st.session_state.detalle_clave = clave_paginador
+                st.session_state.detalle_pagina = st.session_state.detalle_paginador.pagina()
+
+            paginador = st.session_state.detalle_paginador
+            pagina = st.session_state.detalle_pagina
+
+            def navegar_detalle(cursor=None, direccion='siguiente'):
+                st.session_state.detalle_pagina = st.session_state.detalle_paginador.pagina(cursor, direccion)
+
+            # Los callbacks actualizan la página antes del rerun que dibuja los botones
+            col_nav1, col_nav2, col_nav3, col_nav4 = st.columns(4)
+            with col_nav1:
+                st.button("⏮ Primera", disabled=not pagina['hay_anterior'], use_container_width=True,
+                          on_click=navegar_detalle)
+            with col_nav2:
+                st.button("◀ Anterior", disabled=not pagina['hay_anterior'], use_container_width=True,
+                          on_click=navegar_detalle, args=(pagina['cursor_inicio'], 'anterior'))
+            with col_nav3:
+                st.button("Siguiente ▶", disabled=not pagina['hay_siguiente'], use_container_width=True,
+                          on_click=navegar_detalle, args=(pagina['cursor_fin'], 'siguiente'))
+            with col_nav4:
+                st.button("Última ⏭", disabled=not pagina['hay_siguiente'], use_container_width=True,
+                          on_click=navegar_detalle, kwargs={'direccion': 'ultima'})
+
             st.dataframe(
-                df_filtrado[columnas_mostrar].head(100),
+                pagina['filas'][columnas_mostrar],
                 use_container_width=True,
                 height=400
             )
+            st.caption(f"Mostrando {pagina['desde'] + 1 if pagina['hasta'] else 0:,}-{pagina['hasta']:,} "
+                       f"de {paginador.total:,} registros")
 
     with tab4:
+        exportacion_pendiente = False
         col_exp1, col_exp2 = st.columns(2)
 
         with col_exp1:
@@ -1344,7 +1141,7 @@ def main():
 
             formato = st.radio(
                 "Formato de exportación",
-                ["Excel", "PDF", "CSV"],
+                ["Excel", "PDF", "CSV", "Parquet", "Arrow"],
                 horizontal=True
             )
 
@@ -1353,53 +1150,69 @@ def main():
                 value=f"reporte_{datetime.now().strftime('%Y%m%d_%H%M')}"
             )
 
-            if formato == "Excel":
-                if st.button("📊 Exportar a Excel", use_container_width=True):
-                    try:
-                        excel_data = exportar_a_excel(df_filtrado)
-                        st.download_button(
-                            label="⬇️ Descargar Excel",
-                            data=excel_data.getvalue(),
-                            file_name=f"{nombre_base}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                    except Exception as e:
-                        st.error(f"Error: {str(e)}")
-
-            elif formato == "PDF":
-                if st.button("📄 Exportar a PDF", use_container_width=True):
-                    try:
-                        pdf = exportar_a_pdf(df_filtrado)
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                            pdf.output(tmp.name)
-                            with open(tmp.name, 'rb') as f:
-                                pdf_data = f.read()
+            comprimir_csv = False
+            if formato == "CSV":
+                comprimir_csv = st.checkbox("Comprimir (gzip)", value=len(df_filtrado) > 100_000)
+
+            formato_trabajo = {
+                'Excel': 'excel',
+                'PDF': 'pdf',
+                'CSV': 'csv.gz' if comprimir_csv else 'csv',
+                'Parquet': 'parquet',
+                'Arrow': 'arrow',
+            }[formato]
+            icono = {'Excel': '📊', 'PDF': '📄', 'CSV': '📝', 'Parquet': '🧱', 'Arrow': '🏹'}[formato]
+
+            if formato in ("Parquet", "Arrow"):
+                st.caption("Conserva los tipos de columna (fechas, categorías); ideal para notebooks.")
+
+            # La exportación corre en el pool de procesos; la página sigue respondiendo
+            gestor = obtener_gestor_exportaciones()
+            if st.button(f"{icono} Exportar a {formato}", use_container_width=True):
+                clave = gestor.solicitar(
+                    formato_trabajo,
+                    df_filtrado,
+                    st.session_state.filtros_activos,
+                    st.session_state.version_filtrado
+                )
+                st.session_state.exportacion = (clave, formato_trabajo)
 
-                        st.download_button(
-                            label="⬇️ Descargar PDF",
-                            data=pdf_data,
-                            file_name=f"{nombre_base}.pdf",
-                            mime="application/pdf",
-                            use_container_width=True
-                        )
-                        os.unlink(tmp.name)
-                    except Exception as e:
-                        st.error(f"Error: {str(e)}")
+            if 'exportacion' in st.session_state:
+                clave, formato_exportado = st.session_state.exportacion
+                estado = gestor.estado(clave, formato_exportado)
 
-            elif formato == "CSV":
-                if st.button("📝 Exportar a CSV", use_container_width=True):
+                if estado['estado'] == 'en_proceso':
+                    st.progress(estado['progreso'], text=f"⏳ Generando archivo... {estado['progreso']:.0%}")
+                    exportacion_pendiente = True
+                elif estado['estado'] == 'listo':
+                    extension, mime = FORMATOS_EXPORTACION[formato_exportado]
                     try:
-                        csv_data = exportar_a_csv(df_filtrado)
-                        st.download_button(
-                            label="⬇️ Descargar CSV",
-                            data=csv_data,
-                            file_name=f"{nombre_base}.csv",
-                            mime="text/csv",
-                            use_container_width=True
-                        )
-                    except Exception as e:
-                        st.error(f"Error: {str(e)}")
+                        megas = os.path.getsize(estado['ruta']) / 1024 ** 2
+                        if megas > EXPORT_DESCARGA_MAX_MB:
+                            st.warning(f"El archivo pesa {megas:,.0f} MB y supera el máximo de descarga "
+                                       f"({EXPORT_DESCARGA_MAX_MB} MB). Acote los filtros o use CSV comprimido o Parquet.")
+                        elif st.button(f"📦 Preparar descarga ({megas:,.1f} MB)", use_container_width=True):
+                            # download_button guarda los bytes en memoria: se leen solo en la
+                            # ejecución del clic y Streamlit los suelta cuando el botón deja de mostrarse
+                            with open(estado['ruta'], 'rb') as f:
+                                datos = f.read()
+                            st.download_button(
+                                label="⬇️ Descargar archivo",
+                                data=datos,
+                                file_name=f"{nombre_base}{extension}",
+                                mime=mime,
+                                use_container_width=True
+                            )
+                    except FileNotFoundError:
+                        # Desalojado de la caché entre la consulta del estado y la lectura
+                        estado = {'estado': 'desconocido'}
+                elif estado['estado'] == 'error':
+                    st.error(f"Error: {estado['error']}")
+
+                if estado['estado'] == 'desconocido':
+                    # El archivo salió de la caché en disco o se perdió el trabajo
+                    del st.session_state.exportacion
+                    st.warning("El archivo exportado ya no está disponible. Vuelva a exportar.")
 
         with col_exp2:
             st.markdown("### 📊 Resumen")
@@ -1420,6 +1233,49 @@ def main():
                 st.metric("Orígenes", metricas.get('origenes_unicos', 0))
                 st.metric("Destinos", metricas.get('destinos_unicos', 0))
 
+        # Reportes estándar generados por el programador después del corte nocturno
+        st.markdown("---")
+        st.markdown("### 🗓️ Reportes programados")
+
+        reportes = obtener_reportes_programados()
+        if not reportes:
+            st.info("Aún no hay reportes programados disponibles")
+        else:
+            # Solo el más reciente de cada período, con todos sus formatos
+            ultimos = {}
+            for reporte in reportes:
+                hasta, disponibles = ultimos.setdefault(reporte['periodo'], (reporte['hasta'], []))
+                if reporte['hasta'] == hasta:
+                    disponibles.append(reporte)
+
+            columnas_reportes = st.columns(len(PERIODOS))
+            for columna, periodo in zip(columnas_reportes, PERIODOS):
+                with columna:
+                    _, disponibles = ultimos.get(periodo, (None, []))
+                    if not disponibles:
+                        st.caption(f"{PERIODOS[periodo][0]}: sin reporte disponible")
+                        continue
+
+                    reporte = disponibles[0]
+                    st.markdown(f"**{reporte['titulo']}**")
+                    st.caption(f"{reporte['registros']:,} embarques • {reporte['total_cerdos']:,} cerdos • "
+                               f"generado {reporte['generado_en'].replace('T', ' ')}")
+
+                    for reporte in sorted(disponibles, key=lambda r: r['formato']):
+                        extension, mime = FORMATOS_EXPORTACION[reporte['formato']]
+                        try:
+                            datos = leer_reporte_programado(reporte['ruta'], reporte['generado_en'])
+                        except FileNotFoundError:
+                            continue  # reemplazado o purgado desde el último listado
+                        st.download_button(
+                            label=f"⬇️ {reporte['formato'].upper()} ({reporte['tamaño_bytes'] / 1024:,.0f} KB)",
+                            data=datos,
+                            file_name=reporte['archivo'],
+                            mime=mime,
+                            key=f"reporte_{reporte['archivo']}",
+                            use_container_width=True
+                        )
+
     # Manejar la pestaña de usuarios si es admin
     if es_admin:
         with tab5:
@@ -1438,6 +1294,11 @@ def main():
         st.markdown(
             f"**{len(df_filtrado):,} registros** • **{df_filtrado['lote_cerdos'].nunique() if 'lote_cerdos' in df_filtrado.columns else 0} lotes**")
 
+    # Mientras haya una exportación en curso, refrescar para actualizar el progreso
+    if exportacion_pendiente:
+        time.sleep(1)
+        st.rerun()
+
 
 # ==================== EJECUCIÓN PRINCIPAL ====================
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+# datos.py - CARGA Y PREPARACIÓN DE LOS REGISTROS DE EMBARQUE
+import os
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+from instrumentacion_sql import CursorMedido
+
+load_dotenv()
+
+# ==================== CONFIGURACIÓN DE BASE DE DATOS ====================
+DATABASE_CONFIG = {
+    'dbname': os.getenv("DB_NAME", "contador_cerdos"),
+    'user': os.getenv("DB_USER", "postgres"),
+    'password': os.getenv("DB_PASSWORD", "a1b2c3d4"),
+    'host': os.getenv("DB_HOST", "localhost"),
+    'port': os.getenv("DB_PORT", "5432")
+}
+
+CONSULTA_REGISTROS = """
+                     SELECT *,
+                            EXTRACT(HOUR FROM hora_inicio_embarque)                        as hora_inicio,
+                            EXTRACT(DOW FROM fecha_hora_registro)                          as dia_semana,
+                            EXTRACT(EPOCH FROM (hora_fin_embarque - hora_inicio_embarque)) as duracion_segundos,
+                            CASE
+                                WHEN EXTRACT(DOW FROM fecha_hora_registro) IN (0, 6) THEN 'Fin de Semana'
+                                ELSE 'Día Laboral'
+                                END                                                        as tipo_dia
+                     FROM registro_embarque
+                     ORDER BY fecha_hora_registro DESC
+                     """
+
+
+def conectar():
+    """Abrir una conexión a la base de datos de embarques (consultas medidas)"""
+    return psycopg2.connect(**DATABASE_CONFIG, cursor_factory=CursorMedido)
+
+
+def preparar_registros(df):
+    """Agregar las columnas derivadas (fechas, eficiencia, categorías) a los registros"""
+    if df.empty:
+        return df
+
+    datetime_cols = ['fecha_hora_registro', 'hora_inicio_embarque', 'hora_fin_embarque']
+    for col in datetime_cols:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+
+    if 'fecha_hora_registro' in df.columns:
+        df['anio'] = df['fecha_hora_registro'].dt.year
+        df['mes'] = df['fecha_hora_registro'].dt.month
+        df['fecha'] = df['fecha_hora_registro'].dt.date
+        df['semana'] = df['fecha_hora_registro'].dt.isocalendar().week
+        df['trimestre'] = df['fecha_hora_registro'].dt.quarter
+        df['mes_nombre'] = df['fecha_hora_registro'].dt.strftime('%B')
+        df['dia_nombre'] = df['fecha_hora_registro'].dt.strftime('%A')
+
+    if 'duracion_segundos' in df.columns and 'total_neto_cerdos' in df.columns:
+        df['duracion_minutos'] = df['duracion_segundos'] / 60
+        df['eficiencia'] = np.where(
+            df['duracion_segundos'] > 0,
+            df['total_neto_cerdos'] / (df['duracion_segundos'] / 3600),
+            0
+        )
+
+    if 'total_neto_cerdos' in df.columns:
+        df['categoria_volumen'] = pd.cut(df['total_neto_cerdos'],
+                                         bins=[0, 50, 100, 200, float('inf')],
+                                         labels=['Muy Bajo', 'Bajo', 'Medio', 'Alto'])
+
+    if 'lote_cerdos' not in df.columns:
+        df['lote_cerdos'] = 'Lote-' + (df.index + 1).astype(str).str.zfill(3)
+    else:
+        df['lote_cerdos'] = df['lote_cerdos'].fillna('Sin Lote')
+
+    return df
+
+
+def leer_registros(conn):
+    """Leer todos los registros de embarque y agregar sus columnas derivadas"""
+    df = pd.read_sql(CONSULTA_REGISTROS, conn)
+    return preparar_registros(df)
@@ -0,0 +1,466 @@
+# exportacion.py - FUNCIONES DE EXPORTACIÓN DE REPORTES
+import gzip
+import os
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+from fpdf import FPDF
+
+# Título por defecto de los reportes PDF y Excel
+TITULO_REPORTE = "Reporte de Conteo de Cerdos"
+
+# Filas que se serializan a la vez; acota la memoria de la exportación
+FILAS_POR_BLOQUE = 50_000
+
+# Columnas de texto con pocos valores distintos: se guardan como diccionario en Parquet/Arrow
+COLUMNAS_DICCIONARIO = ('lote_cerdos', 'sitio_origen', 'sitio_destino', 'placa_vehiculo',
+                        'tipo_dia', 'mes_nombre', 'dia_nombre')
+
+# Límite de filas de una hoja de Excel (incluye la fila de encabezado)
+MAX_FILAS_EXCEL = 1_048_576
+
+# Filas muestreadas para estimar el ancho de las columnas
+MUESTRA_ANCHOS = 2_000
+ANCHO_MAXIMO_COLUMNA = 40
+
+# Día cero del sistema de fechas de Excel (1900, con el día bisiesto ficticio)
+EPOCA_EXCEL = pd.Timestamp('1899-12-30')
+
+
+def calcular_resumen(df):
+    """Métricas de resumen que acompañan a los reportes exportados"""
+    return pd.DataFrame({
+        'Métrica': ['Total Embarques', 'Total Cerdos', 'Promedio por Embarque',
+                    'Total Lotes', 'Orígenes Únicos', 'Destinos Únicos'],
+        'Valor': [
+            len(df),
+            df['total_neto_cerdos'].sum() if 'total_neto_cerdos' in df.columns else 0,
+            df['total_neto_cerdos'].mean() if 'total_neto_cerdos' in df.columns else 0,
+            df['lote_cerdos'].nunique() if 'lote_cerdos' in df.columns else 0,
+            df['sitio_origen'].nunique() if 'sitio_origen' in df.columns else 0,
+            df['sitio_destino'].nunique() if 'sitio_destino' in df.columns else 0
+        ]
+    })
+
+
+# ==================== CSV ====================
+def exportar_a_csv(df, destino, comprimir=False, filas_por_bloque=FILAS_POR_BLOQUE, progreso=None):
+    """Escribir el DataFrame como CSV por bloques en un archivo binario (opcionalmente gzip)
+
+    Solo un bloque de filas se convierte a texto a la vez, así que la memoria
+    usada no depende del tamaño de la exportación.
+    """
+    salida = gzip.GzipFile(fileobj=destino, mode='wb', compresslevel=6) if comprimir else destino
+
+    try:
+        # Con un DataFrame vacío igual se escribe el encabezado
+        for inicio in range(0, max(len(df), 1), filas_por_bloque):
+            bloque = df.iloc[inicio:inicio + filas_por_bloque]
+            salida.write(bloque.to_csv(index=False, header=(inicio == 0)).encode('utf-8'))
+            if progreso:
+                progreso(min(inicio + filas_por_bloque, len(df)) / max(len(df), 1))
+    finally:
+        if comprimir:
+            # Cierra solo el flujo gzip; el archivo destino sigue abierto
+            salida.close()
+
+    return destino
+
+
+# ==================== PARQUET / ARROW ====================
+def _tabla_arrow(df):
+    """Convertir el DataFrame en una tabla Arrow columnar, conservando los tipos"""
+    categoricas = {
+        columna: df[columna].astype('category')
+        for columna in COLUMNAS_DICCIONARIO
+        if columna in df.columns and (pd.api.types.is_object_dtype(df[columna])
+                                      or pd.api.types.is_string_dtype(df[columna]))
+    }
+    return pa.Table.from_pandas(df.assign(**categoricas), preserve_index=False)
+
+
+def _escribir_lotes(escritor, tabla, filas_por_bloque, progreso):
+    escritas = 0
+    for lote in tabla.to_batches(max_chunksize=filas_por_bloque):
+        escritor.write_batch(lote)
+        escritas += lote.num_rows
+        if progreso:
+            progreso(escritas / max(tabla.num_rows, 1))
+
+
+def exportar_a_parquet(df, destino, filas_por_bloque=FILAS_POR_BLOQUE, progreso=None):
+    """Exportar DataFrame a Parquet (codificación diccionario + zstd)"""
+    tabla = _tabla_arrow(df)
+    with pq.ParquetWriter(destino, tabla.schema, compression='zstd', use_dictionary=True) as escritor:
+        _escribir_lotes(escritor, tabla, filas_por_bloque, progreso)
+    return destino
+
+
+def exportar_a_arrow(df, destino, filas_por_bloque=FILAS_POR_BLOQUE, progreso=None):
+    """Exportar DataFrame a un archivo Arrow IPC comprimido con zstd"""
+    tabla = _tabla_arrow(df)
+    opciones = pa.ipc.IpcWriteOptions(compression='zstd')
+    with pa.ipc.new_file(destino, tabla.schema, options=opciones) as escritor:
+        _escribir_lotes(escritor, tabla, filas_por_bloque, progreso)
+    return destino
+
+
+# ==================== EXCEL ====================
+def estimar_anchos_columnas(df, muestra=MUESTRA_ANCHOS):
+    """Ancho de cada columna a partir de la longitud de texto de una muestra de filas"""
+    if len(df) > muestra:
+        df = df.sample(n=muestra, random_state=0)
+
+    anchos = []
+    for columna in df.columns:
+        largo = df[columna].astype(str).str.len().max() if len(df) > 0 else 0
+        largo = 0 if pd.isna(largo) else int(largo)
+        anchos.append(min(max(largo, len(str(columna))) + 2, ANCHO_MAXIMO_COLUMNA))
+    return anchos
+
+
+def _serial_excel(serie):
+    """Fechas como número de serie de Excel, calculado de forma vectorizada"""
+    if serie.dt.tz is not None:
+        serie = serie.dt.tz_localize(None)
+    return (serie - EPOCA_EXCEL) / pd.Timedelta(days=1)
+
+
+def _filas_excel(bloque):
+    """Filas del bloque como tuplas de valores nativos (None en lugar de NaN/NaT)"""
+    columnas = []
+    for columna in bloque.columns:
+        serie = bloque[columna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            serie = _serial_excel(serie)
+        columnas.append(serie.astype(object).where(serie.notna(), None).tolist())
+    return zip(*columnas)
+
+
+def _escribir_hoja(workbook, nombre, df, formato_encabezado, anchos, formatos=None,
+                   filas_por_bloque=FILAS_POR_BLOQUE, progreso=None):
+    """Escribir una hoja fila a fila (en orden, como exige constant_memory)"""
+    worksheet = workbook.add_worksheet(nombre)
+    formatos = formatos or [None] * len(anchos)
+
+    # En modo constant_memory los anchos deben definirse antes de escribir filas;
+    # las celdas sin formato propio toman el formato de su columna
+    for col_num, (ancho, formato) in enumerate(zip(anchos, formatos)):
+        worksheet.set_column(col_num, col_num, ancho, formato)
+
+    worksheet.write_row(0, 0, [str(columna) for columna in df.columns], formato_encabezado)
+
+    fila_excel = 1
+    for inicio in range(0, len(df), filas_por_bloque):
+        for fila in _filas_excel(df.iloc[inicio:inicio + filas_por_bloque]):
+            worksheet.write_row(fila_excel, 0, fila)
+            fila_excel += 1
+        if progreso:
+            progreso(fila_excel - 1)
+
+    return worksheet
+
+
+def exportar_a_excel(df, destino, titulo=TITULO_REPORTE, filas_por_hoja=MAX_FILAS_EXCEL - 1, progreso=None):
+    """Exportar DataFrame a Excel con escritura en flujo (memoria constante)
+
+    Los datos se reparten en varias hojas cuando superan el límite de filas de Excel.
+    El título queda en las propiedades del documento y en la hoja de resumen.
+    """
+    workbook = xlsxwriter.Workbook(destino, {
+        'constant_memory': True,
+        'default_date_format': 'dd/mm/yyyy hh:mm',
+        'remove_timezone': True,
+    })
+    workbook.set_properties({'title': titulo})
+
+    header_format = workbook.add_format({
+        'bold': True,
+        'text_wrap': True,
+        'valign': 'top',
+        'fg_color': '#1E3A8A',
+        'font_color': 'white',
+        'border': 1,
+        'font_size': 10
+    })
+
+    date_format = workbook.add_format({'num_format': 'dd/mm/yyyy hh:mm'})
+
+    try:
+        anchos = estimar_anchos_columnas(df)
+        formatos = [date_format if pd.api.types.is_datetime64_any_dtype(df[columna]) else None
+                    for columna in df.columns]
+
+        n_hojas = max(1, -(-len(df) // filas_por_hoja))
+        for numero in range(n_hojas):
+            nombre = 'Datos Completos' if numero == 0 else f'Datos Completos ({numero + 1})'
+            inicio = numero * filas_por_hoja
+
+            # El progreso de cada hoja se traduce a filas escritas del total
+            progreso_hoja = None
+            if progreso:
+                progreso_hoja = lambda filas, base=inicio: progreso((base + filas) / max(len(df), 1))
+
+            _escribir_hoja(workbook, nombre, df.iloc[inicio:inicio + filas_por_hoja],
+                           header_format, anchos, formatos, progreso=progreso_hoja)
+
+        resumen_df = pd.concat([pd.DataFrame({'Métrica': ['Reporte'], 'Valor': [titulo]}),
+                                calcular_resumen(df)], ignore_index=True)
+        worksheet = _escribir_hoja(workbook, 'Resumen', resumen_df, header_format,
+                                   estimar_anchos_columnas(resumen_df))
+
+        try:
+            logo1_path = "./image/logo1sinfondo.png"
+            if os.path.exists(logo1_path):
+                worksheet.insert_image('A1', logo1_path, {'x_scale': 0.4, 'y_scale': 0.4})
+        except:
+            pass
+    finally:
+        workbook.close()
+
+    return destino
+
+
+# ==================== PDF ====================
+# Columnas de la tabla del reporte PDF (anchos en mm)
+CONFIG_COLUMNAS_PDF = [
+    {'campo': 'fecha', 'nombre': 'Fecha', 'ancho': 25, 'alineacion': 'C', 'max_lineas': 1},
+    {'campo': 'lote_cerdos', 'nombre': 'Lote', 'ancho': 30, 'alineacion': 'C', 'max_lineas': 2},
+    {'campo': 'placa_vehiculo', 'nombre': 'Placa', 'ancho': 25, 'alineacion': 'C', 'max_lineas': 1},
+    {'campo': 'sitio_origen', 'nombre': 'Origen', 'ancho': 45, 'alineacion': 'L', 'max_lineas': 3},
+    {'campo': 'sitio_destino', 'nombre': 'Destino', 'ancho': 45, 'alineacion': 'L', 'max_lineas': 3},
+    {'campo': 'total_neto_cerdos', 'nombre': 'Cerdos', 'ancho': 25, 'alineacion': 'R', 'max_lineas': 1}
+]
+
+ALTO_LINEA_PDF = 3
+ALTO_LINEA_ENCABEZADO_PDF = 4
+
+# Cada cuántas filas se reporta el avance del PDF
+FILAS_POR_AVANCE_PDF = 1_000
+
+
+class ReportePDF(FPDF):
+    """PDF del reporte con encabezado de página y ajuste de texto memorizado"""
+
+    def __init__(self, *args, titulo=TITULO_REPORTE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.titulo = titulo
+        self._lineas_memo = {}
+
+    def header(self):
+        try:
+            logo1_path = "./image/logo1sinfondo.png"
+            if os.path.exists(logo1_path):
+                self.image(logo1_path, x=10, y=8, w=35, h=15)
+        except:
+            pass
+
+        self.set_font('Arial', 'B', 16)
+        self.cell(0, 15, self.titulo.upper(), 0, 1, 'C')
+        self.set_font('Arial', 'I', 10)
+        self.cell(0, 5, 'Sistema de Gestión de Embarques', 0, 1, 'C')
+        self.line(10, 30, 200, 30)
+        self.ln(10)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(0, 0, 0)
+        self.cell(0, 10, f'Página {self.page_no()} / {{nb}}', 0, 0, 'C')
+
+    def lineas_texto(self, texto, ancho, max_lineas=None):
+        """Dividir texto en líneas que caben en el ancho con la fuente actual
+
+        El resultado se memoriza por (texto, ancho, fuente), así que cada valor
+        repetido (lotes, sitios, placas) se mide una sola vez.
+        """
+        clave = (texto, ancho, max_lineas, self.font_family, self.font_style, self.font_size_pt)
+        lineas = self._lineas_memo.get(clave)
+        if lineas is None:
+            # Se guarda también el ancho de cada línea para alinearla sin volver a medirla
+            lineas = tuple((linea, self.get_string_width(linea))
+                           for linea in self._partir_texto(texto, ancho, max_lineas))
+            self._lineas_memo[clave] = lineas
+        return lineas
+
+    def _partir_texto(self, texto, ancho, max_lineas):
+        # Si el texto cabe en una línea, retornar como está
+        if self.get_string_width(texto) <= ancho:
+            return (texto,)
+
+        lineas = []
+        linea_actual = ''
+        for palabra in texto.split(' '):
+            prueba = f"{linea_actual} {palabra}".strip()
+            if self.get_string_width(prueba) <= ancho:
+                linea_actual = prueba
+            else:
+                if linea_actual:
+                    lineas.append(linea_actual)
+                linea_actual = palabra
+
+        if linea_actual:
+            lineas.append(linea_actual)
+
+        # Limitar líneas y truncar la última si es muy larga
+        if max_lineas and len(lineas) > max_lineas:
+            lineas = lineas[:max_lineas]
+            ultima_linea = lineas[-1]
+            while self.get_string_width(ultima_linea + '...') > ancho and len(ultima_linea) > 3:
+                ultima_linea = ultima_linea[:-1]
+            lineas[-1] = ultima_linea + '...'
+
+        return tuple(lineas)
+
+    def celda_multilinea(self, x, y, ancho, alto, lineas, alto_linea, alineacion, relleno):
+        """Dibujar el borde/fondo de una celda y sus líneas de texto ya medidas"""
+        self.rect(x, y, ancho, alto, 'DF' if relleno else 'D')
+
+        # Misma posición que usaría cell(), pero sin volver a medir el texto
+        y_base = y + 1 + 0.5 * alto_linea + 0.3 * self.font_size
+        for linea, ancho_linea in lineas:
+            if alineacion == 'R':
+                dx = ancho - self.c_margin - ancho_linea
+            elif alineacion == 'C':
+                dx = (ancho - ancho_linea) / 2.0
+            else:
+                dx = self.c_margin
+            self.text(x + dx, y_base, linea)
+            y_base += alto_linea
+
+
+def _formatear_columna_pdf(serie):
+    """Convertir una columna completa en los textos que se imprimen en el PDF"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        textos = serie.dt.strftime('%d/%m/%Y')
+    elif pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        numeros = serie.astype('float64')
+        enteros = numeros.round() == numeros
+        textos = numeros.map('{:,.0f}'.format).where(enteros, numeros.map('{:,.2f}'.format))
+    else:
+        valores = serie.astype(object)
+        es_fecha = valores.map(lambda v: hasattr(v, 'strftime'))
+        textos = valores.astype(str).where(~es_fecha, valores[es_fecha].map(lambda v: v.strftime('%d/%m/%Y')))
+
+    textos = textos.where(serie.notna(), '').astype(str)
+
+    # FPDF 1.7 solo admite latin-1
+    return textos.str.encode('latin-1', 'replace').str.decode('latin-1').tolist()
+
+
+def exportar_a_pdf(df, destino, titulo=TITULO_REPORTE, progreso=None):
+    """Exportar DataFrame a PDF con todas las filas, paginado y con encabezados repetidos
+
+    El título se imprime en el encabezado de cada página. El PDF se genera en
+    memoria y se escribe directamente en `destino`.
+    """
+    pdf = ReportePDF(titulo=titulo)
+    pdf.alias_nb_pages()
+    pdf.add_page()
+
+    # Información del reporte
+    pdf.set_font("Arial", '', 10)
+    pdf.cell(0, 8, f"Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", 0, 1)
+    pdf.cell(0, 8, f"Total de registros: {len(df):,}", 0, 1)
+    pdf.ln(5)
+
+    # Estadísticas principales
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 10, "Estadísticas Principales:", 0, 1)
+    pdf.set_font("Arial", '', 10)
+
+    estadisticas = [
+        f"Total de cerdos: {df['total_neto_cerdos'].sum() if 'total_neto_cerdos' in df.columns else 0:,}",
+        f"Total de embarques: {len(df):,}",
+        f"Promedio por embarque: {df['total_neto_cerdos'].mean() if 'total_neto_cerdos' in df.columns else 0:.1f}",
+        f"Total de lotes: {df['lote_cerdos'].nunique() if 'lote_cerdos' in df.columns else 0}",
+        f"Orígenes únicos: {df['sitio_origen'].nunique() if 'sitio_origen' in df.columns else 0}",
+        f"Destinos únicos: {df['sitio_destino'].nunique() if 'sitio_destino' in df.columns else 0}"
+    ]
+
+    for i, estadistica in enumerate(estadisticas):
+        pdf.cell(0, 6, estadistica, 0, 1)
+        if i == 2:
+            pdf.ln(2)
+
+    pdf.ln(8)
+
+    # ==================== TABLA CON TEXTO MULTILÍNEA ====================
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 10, "Datos de Embarques:", 0, 1)
+
+    config_columnas = [col for col in CONFIG_COLUMNAS_PDF if col['campo'] in df.columns]
+
+    if not config_columnas or len(df) == 0:
+        pdf.cell(0, 10, "No hay datos para mostrar", 0, 1)
+        destino.write(pdf.output(dest='S').encode('latin-1'))
+        return destino
+
+    anchos = [col['ancho'] for col in config_columnas]
+    x_inicial = max(10, (210 - sum(anchos)) / 2)
+
+    # Textos de todas las celdas, formateados por columna y no celda a celda
+    textos_columnas = [_formatear_columna_pdf(df[col['campo']]) for col in config_columnas]
+
+    def dibujar_encabezado():
+        pdf.set_font("Arial", 'B', 9)
+        pdf.set_fill_color(30, 58, 138)  # Color azul oscuro
+        pdf.set_text_color(255, 255, 255)  # Texto blanco
+
+        lineas_encabezado = [pdf.lineas_texto(col['nombre'], col['ancho'], 2) for col in config_columnas]
+        alto = max(len(lineas) for lineas in lineas_encabezado) * ALTO_LINEA_ENCABEZADO_PDF + 4
+
+        y = pdf.get_y()
+        x = x_inicial
+        for config, lineas in zip(config_columnas, lineas_encabezado):
+            pdf.celda_multilinea(x, y, config['ancho'], alto, lineas, ALTO_LINEA_ENCABEZADO_PDF,
+                                 config['alineacion'], True)
+            x += config['ancho']
+
+        pdf.set_xy(x_inicial, y + alto)
+        pdf.set_text_color(0, 0, 0)
+        pdf.set_font("Arial", '', 8)
+
+    dibujar_encabezado()
+
+    fill = False
+    for numero_fila, textos_fila in enumerate(zip(*textos_columnas)):
+        if progreso and numero_fila % FILAS_POR_AVANCE_PDF == 0:
+            progreso(numero_fila / len(df))
+
+        lineas_fila = [
+            pdf.lineas_texto(texto, config['ancho'], config['max_lineas'])
+            for texto, config in zip(textos_fila, config_columnas)
+        ]
+        alto_fila = max(len(lineas) for lineas in lineas_fila) * ALTO_LINEA_PDF + 2
+
+        # Salto de página manual para repetir el encabezado de la tabla
+        if pdf.get_y() + alto_fila > pdf.page_break_trigger:
+            pdf.add_page()
+            dibujar_encabezado()
+
+        if fill:
+            pdf.set_fill_color(240, 240, 240)
+        else:
+            pdf.set_fill_color(255, 255, 255)
+
+        y = pdf.get_y()
+        x = x_inicial
+        for config, lineas in zip(config_columnas, lineas_fila):
+            pdf.celda_multilinea(x, y, config['ancho'], alto_fila, lineas, ALTO_LINEA_PDF,
+                                 config['alineacion'], fill)
+            x += config['ancho']
+
+        pdf.set_xy(x_inicial, y + alto_fila)
+        fill = not fill
+
+    # ==================== PIE INFORMATIVO ====================
+    pdf.ln(10)
+    pdf.set_font("Arial", 'I', 8)
+    pdf.cell(0, 5, f"*Mostrando {len(df):,} registros. Texto ajustado automáticamente.*", 0, 1, 'C')
+
+    destino.write(pdf.output(dest='S').encode('latin-1'))
+    return destino
@@ -0,0 +1,202 @@
+# filtros.py - ÍNDICES BITMAP PARA FILTROS MULTIDIMENSIONALES
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Columnas categóricas que se pueden filtrar desde el sidebar
+COLUMNAS_FILTRABLES = {
+    'lote_cerdos': 'Lote',
+    'sitio_origen': 'Origen',
+    'sitio_destino': 'Destino',
+    'placa_vehiculo': 'Placa',
+    'tipo_dia': 'Tipo de día',
+    'categoria_volumen': 'Volumen',
+}
+
+# Un valor con menos de n/32 filas ocupa menos como lista de posiciones (uint32)
+# que como bitmap empaquetado (n/8 bytes), igual que los contenedores de roaring
+DENSIDAD_MINIMA_BITMAP = 32
+
+# Bits encendidos por byte, para contar filas directamente sobre el bitmap
+_BITS_POR_BYTE = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def firma_datos(df):
+    """Versión del contenido del DataFrame: hash de todas las filas, en orden.
+
+    Cambia si se edita cualquier valor o si las filas se reordenan, así que sirve
+    para asociar índices (posiciones de fila) y exportaciones a una carga concreta.
+    """
+    resumen = hashlib.sha256(repr((list(df.columns), len(df))).encode('utf-8'))
+    if not df.empty:
+        resumen.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return resumen.hexdigest()[:32]
+
+
+def firma_filtros(expresion):
+    """Representación estable y hasheable de una expresión de filtros"""
+    if expresion is None:
+        return None
+
+    operador = expresion[0]
+    if operador == 'en':
+        return ('en', expresion[1], tuple(sorted(map(str, expresion[2]))))
+    if operador == 'rango':
+        return ('rango', expresion[1], str(expresion[2]), str(expresion[3]))
+    return (operador, tuple(firma_filtros(sub) for sub in expresion[1]))
+
+
+class IndiceBitmap:
+    """Índice de bitmaps por valor sobre las columnas categóricas del DataFrame.
+
+    Las expresiones se evalúan con operaciones bit a bit sobre bitmaps empaquetados:
+        ('en', columna, [valores])        -> OR de los bitmaps de cada valor
+        ('rango', columna, desde, hasta)  -> comparación vectorizada
+        ('y', [subexpresiones])           -> AND
+        ('o', [subexpresiones])           -> OR
+    """
+
+    def __init__(self, df, columnas=None):
+        self.n_filas = len(df)
+        self.n_bytes = (self.n_filas + 7) // 8
+        self.valores = {}
+        self._contenedores = {}
+        self._columnas_rango = {}
+
+        columnas = columnas if columnas is not None else list(COLUMNAS_FILTRABLES)
+        for columna in columnas:
+            if columna in df.columns:
+                self._indexar_columna(columna, df[columna])
+
+        if 'fecha' in df.columns:
+            # datetime64[D] para comparar vectorizado en lugar de objetos date
+            self._columnas_rango['fecha'] = pd.to_datetime(df['fecha']).to_numpy(dtype='datetime64[D]')
+
+    def _indexar_columna(self, columna, serie):
+        """Crear un contenedor (bitmap denso o posiciones) por cada valor distinto"""
+        codigos, valores = pd.factorize(serie, sort=True)
+        validos = codigos >= 0
+        posiciones = np.flatnonzero(validos).astype(np.uint32)
+
+        # Agrupar posiciones por código en una sola pasada
+        orden = np.argsort(codigos[validos], kind='stable')
+        posiciones = posiciones[orden]
+        conteos = np.bincount(codigos[validos], minlength=len(valores))
+        limites = np.concatenate(([0], np.cumsum(conteos)))
+
+        umbral_denso = self.n_filas // DENSIDAD_MINIMA_BITMAP
+        contenedores = {}
+        for codigo, valor in enumerate(valores):
+            grupo = posiciones[limites[codigo]:limites[codigo + 1]]
+            if len(grupo) > umbral_denso:
+                contenedores[valor] = ('denso', self._empaquetar(grupo))
+            else:
+                contenedores[valor] = ('disperso', grupo)
+
+        self.valores[columna] = list(valores)
+        self._contenedores[columna] = contenedores
+
+    def _empaquetar(self, posiciones):
+        """Convertir posiciones de fila en un bitmap empaquetado"""
+        bits = np.zeros(self.n_filas, dtype=bool)
+        bits[posiciones] = True
+        return np.packbits(bits)
+
+    def _vacio(self):
+        return np.zeros(self.n_bytes, dtype=np.uint8)
+
+    def _completo(self):
+        return np.packbits(np.ones(self.n_filas, dtype=bool))
+
+    def bitmap_valores(self, columna, valores):
+        """OR de los bitmaps de los valores seleccionados en una columna"""
+        contenedores = self._contenedores.get(columna)
+        if contenedores is None:
+            return self._completo()
+
+        resultado = self._vacio()
+        dispersos = []
+        for valor in valores:
+            contenedor = contenedores.get(valor)
+            if contenedor is None:
+                continue
+            tipo, datos = contenedor
+            if tipo == 'denso':
+                np.bitwise_or(resultado, datos, out=resultado)
+            else:
+                dispersos.append(datos)
+
+        if dispersos:
+            np.bitwise_or(resultado, self._empaquetar(np.concatenate(dispersos)), out=resultado)
+        return resultado
+
+    def bitmap_rango(self, columna, desde=None, hasta=None):
+        """Bitmap de las filas cuyo valor está dentro de [desde, hasta]"""
+        valores = self._columnas_rango.get(columna)
+        if valores is None:
+            return self._completo()
+
+        bits = np.ones(self.n_filas, dtype=bool)
+        if desde is not None:
+            bits &= valores >= np.datetime64(desde, 'D')
+        if hasta is not None:
+            bits &= valores <= np.datetime64(hasta, 'D')
+        return np.packbits(bits)
+
+    def evaluar(self, expresion):
+        """Evaluar una expresión de filtros y devolver su bitmap empaquetado"""
+        if not expresion:
+            return self._completo()
+
+        operador = expresion[0]
+        if operador == 'en':
+            return self.bitmap_valores(expresion[1], expresion[2])
+        if operador == 'rango':
+            return self.bitmap_rango(expresion[1], expresion[2], expresion[3])
+        if operador in ('y', 'o'):
+            subexpresiones = expresion[1]
+            if not subexpresiones:
+                return self._completo()
+            resultado = self.evaluar(subexpresiones[0]).copy()
+            combinar = np.bitwise_and if operador == 'y' else np.bitwise_or
+            for subexpresion in subexpresiones[1:]:
+                combinar(resultado, self.evaluar(subexpresion), out=resultado)
+            return resultado
+
+        raise ValueError(f"Operador de filtro desconocido: {operador}")
+
+    def mascara(self, expresion):
+        """Máscara booleana por fila para indexar el DataFrame"""
+        return np.unpackbits(self.evaluar(expresion), count=self.n_filas).astype(bool)
+
+    def contar(self, expresion):
+        """Número de filas que cumplen la expresión sin materializar la máscara"""
+        return int(_BITS_POR_BYTE[self.evaluar(expresion)].sum(dtype=np.int64))
+
+    def filtrar(self, df, expresion):
+        """Aplicar una expresión de filtros al DataFrame indexado"""
+        if not expresion:
+            return df
+        return df[self.mascara(expresion)]
+
+
+def construir_expresion(fecha_inicio=None, fecha_fin=None, selecciones=None, combinar='y'):
+    """Construir la expresión del sidebar: rango de fechas AND (combinación de columnas)
+
+    Dentro de una columna los valores seleccionados se combinan con OR; entre
+    columnas se usa el operador indicado en `combinar` ('y' u 'o').
+    """
+    condiciones_columnas = [
+        ('en', columna, list(valores))
+        for columna, valores in (selecciones or {}).items()
+        if valores
+    ]
+
+    condiciones = []
+    if fecha_inicio is not None or fecha_fin is not None:
+        condiciones.append(('rango', 'fecha', fecha_inicio, fecha_fin))
+    if condiciones_columnas:
+        condiciones.append((combinar, condiciones_columnas))
+
+    return ('y', condiciones) if condiciones else None
@@ -0,0 +1,177 @@
+# instrumentacion_sql.py - TIEMPOS DE LAS CONSULTAS SQL (psycopg2)
+#
+# Contraparte de backend/instrumentacion_sql.py (mismas variables de entorno y
+# mismo formato de estadísticas); aquí se mide con un cursor de psycopg2. Cada
+# imagen lleva su copia: tests/test_instrumentacion_sql.py verifica que coincidan.
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import psycopg2.extensions
+from dotenv import load_dotenv
+from psycopg2 import sql as psql
+
+load_dotenv()
+
+# ==================== CONFIGURACIÓN ====================
+SQL_UMBRAL_MS = float(os.getenv("SQL_UMBRAL_MS", "200"))  # consultas más lentas van al log
+SQL_EXPLAIN = os.getenv("SQL_EXPLAIN", "0") == "1"  # capturar EXPLAIN (ANALYZE, BUFFERS) de las lentas
+SQL_EXPLAIN_INTERVALO = float(os.getenv("SQL_EXPLAIN_INTERVALO", "300"))  # por sentencia, en segundos
+SQL_MAX_SENTENCIAS = int(os.getenv("SQL_MAX_SENTENCIAS", "500"))
+
+DIRECTORIO_PROYECTO = Path(__file__).resolve().parent
+
+logger = logging.getLogger("sql_lento")
+
+
+def normalizar_sentencia(sql, largo=300):
+    return re.sub(r"\s+", " ", sql).strip()[:largo]
+
+
+@lru_cache(maxsize=1024)
+def _es_del_proyecto(archivo):
+    ruta = Path(archivo).resolve()
+    return ruta.parent == DIRECTORIO_PROYECTO and ruta != Path(__file__).resolve()
+
+
+def sitio_llamada():
+    """Primer frame del proyecto (fuera de pandas y psycopg2) que originó la consulta"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if _es_del_proyecto(frame.f_code.co_filename):
+            return f"{Path(frame.f_code.co_filename).name}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "desconocido"
+
+
+class RegistroConsultas:
+    """Tiempos acumulados por (sentencia, sitio de llamada) y log de consultas lentas"""
+
+    def __init__(self, umbral_ms=SQL_UMBRAL_MS, explain=SQL_EXPLAIN,
+                 intervalo_explain=SQL_EXPLAIN_INTERVALO, max_sentencias=SQL_MAX_SENTENCIAS):
+        self.umbral = umbral_ms / 1000
+        self.explain = explain
+        self.intervalo_explain = intervalo_explain
+        self.max_sentencias = max_sentencias
+        self._estadisticas = {}  # (sentencia, sitio) -> dict
+        self._ultimo_explain = {}  # sentencia -> instante
+        self._lock = threading.Lock()
+
+    def registrar(self, sql, segundos, filas, sitio):
+        """Acumular una ejecución; devuelve si conviene capturar su EXPLAIN"""
+        sentencia = normalizar_sentencia(sql)
+        clave = (sentencia, sitio)
+        with self._lock:
+            estadistica = self._estadisticas.get(clave)
+            if estadistica is None:
+                if len(self._estadisticas) >= self.max_sentencias:
+                    clave = ("(otras sentencias)", "varios")
+                estadistica = self._estadisticas.setdefault(
+                    clave, {"llamadas": 0, "segundos": 0.0, "max_segundos": 0.0, "filas": 0, "lentas": 0}
+                )
+            estadistica["llamadas"] += 1
+            estadistica["segundos"] += segundos
+            estadistica["max_segundos"] = max(estadistica["max_segundos"], segundos)
+            estadistica["filas"] += max(filas, 0)
+
+            if segundos < self.umbral:
+                return False
+            estadistica["lentas"] += 1
+
+            # EXPLAIN ANALYZE vuelve a ejecutar la consulta: solo lecturas y a lo sumo
+            # una vez por sentencia cada intervalo
+            capturar = False
+            if self.explain and sentencia.lower().startswith(("select", "with")):
+                ahora = time.monotonic()
+                if ahora - self._ultimo_explain.get(sentencia, float("-inf")) >= self.intervalo_explain:
+                    self._ultimo_explain[sentencia] = ahora
+                    capturar = True
+
+        logger.warning("Consulta lenta: %.1f ms, %d filas, %s: %s", segundos * 1000, filas, sitio, sentencia)
+        return capturar
+
+    def registrar_plan(self, sql, plan):
+        logger.warning("Plan de %s\n%s", normalizar_sentencia(sql, 120), plan)
+
+    def estadisticas(self, limite=50):
+        """Sentencias ordenadas por tiempo total"""
+        with self._lock:
+            filas = [
+                {
+                    "sentencia": sentencia,
+                    "sitio": sitio,
+                    "llamadas": datos["llamadas"],
+                    "total_ms": round(datos["segundos"] * 1000, 2),
+                    "promedio_ms": round(datos["segundos"] * 1000 / datos["llamadas"], 2),
+                    "max_ms": round(datos["max_segundos"] * 1000, 2),
+                    "filas": datos["filas"],
+                    "lentas": datos["lentas"],
+                }
+                for (sentencia, sitio), datos in self._estadisticas.items()
+            ]
+        filas.sort(key=lambda fila: fila["total_ms"], reverse=True)
+        return filas[:limite]
+
+    def limpiar(self):
+        with self._lock:
+            self._estadisticas.clear()
+            self._ultimo_explain.clear()
+
+
+registro_consultas = RegistroConsultas()
+
+
+def explicar(conn, consulta, parametros):
+    """EXPLAIN (ANALYZE, BUFFERS) de una consulta, o None si falla.
+
+    Usa un cursor simple (no se mide a sí mismo) dentro de un savepoint, para que
+    un error no deje abortada la transacción en curso.
+    """
+    if isinstance(consulta, psql.Composable):
+        consulta_plan = psql.SQL("EXPLAIN (ANALYZE, BUFFERS) ") + consulta
+    else:
+        consulta_plan = "EXPLAIN (ANALYZE, BUFFERS) " + consulta
+
+    cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    try:
+        cursor.execute("SAVEPOINT instrumentacion_explain")
+        try:
+            cursor.execute(consulta_plan, parametros)
+            plan = "\n".join(fila[0] for fila in cursor.fetchall())
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT instrumentacion_explain")
+            logger.warning("No se pudo capturar el plan: %s", e)
+            return None
+        cursor.execute("RELEASE SAVEPOINT instrumentacion_explain")
+        return plan
+    except Exception as e:
+        logger.warning("No se pudo capturar el plan: %s", e)
+        return None
+    finally:
+        cursor.close()
+
+
+class CursorMedido(psycopg2.extensions.cursor):
+    """Cursor de psycopg2 que registra tiempo, filas y sitio de cada consulta.
+
+    Se usa como `cursor_factory` de la conexión, así que también mide las consultas
+    que pandas hace con `pd.read_sql`.
+    """
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        resultado = super().execute(query, vars)
+        segundos = time.perf_counter() - inicio
+
+        # Se agrupa por la plantilla, no por la consulta con los valores ya interpolados
+        texto = query.as_string(self) if isinstance(query, psql.Composable) else str(query)
+        if registro_consultas.registrar(texto, segundos, self.rowcount, sitio_llamada()):
+            plan = explicar(self.connection, query, vars)
+            if plan:
+                registro_consultas.registrar_plan(texto, plan)
+        return resultado
@@ -2,12 +2,15 @@ import streamlit as st
 import requests
 import os
 import time
+import json
+import base64
 from dotenv import load_dotenv
+from api_cliente import cadena_reenvio, obtener_cliente
 
 load_dotenv()
 
-# Configuración de la API
-API_URL = os.getenv("API_URL", "http://localhost:8000")
+# Segundos durante los que se confía en la última verificación del token
+VERIFICACION_TTL = int(os.getenv("VERIFICACION_TTL", "60"))
 
 
 def mostrar_pagina_login():
@@ -91,11 +94,13 @@ def mostrar_pagina_login():
         else:
             with st.spinner("🔐 Verificando credenciales..."):
                 try:
-                    # Llamar a la API de login
-                    response = requests.post(
-                        f"{API_URL}/login",
+                    # Llamar a la API de login (con la IP del navegador para su límite por IP)
+                    reenvio = cadena_reenvio()
+                    response = obtener_cliente().post(
+                        "/login",
                         data={"username": username, "password": password},
-                        timeout=10
+                        autenticar=False,
+                        headers={"X-Forwarded-For": reenvio} if reenvio else None
                     )
 
                     if response.status_code == 200:
@@ -121,6 +126,10 @@ def mostrar_pagina_login():
 
                     elif response.status_code == 401:
                         st.error("❌ Usuario o contraseña incorrectos")
+                    elif response.status_code == 429:
+                        espera = response.headers.get("Retry-After", "unos")
+                        st.error(f"⏳ {response.json().get('detail', 'Demasiados intentos')}. "
+                                 f"Intente nuevamente en {espera} segundos.")
                     elif response.status_code == 400:
                         error_data = response.json()
                         st.error(f"❌ {error_data.get('detail', 'Usuario inactivo')}")
@@ -147,8 +156,31 @@ def mostrar_pagina_login():
     st.stop()  # Detener ejecución
 
 
-def verificar_autenticacion():
-    """Verificar si el usuario está autenticado"""
+def expiracion_token(token):
+    """Leer el claim `exp` del JWT sin validar la firma (la valida el backend)"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _invalidar_sesion():
+    st.session_state["authenticated"] = False
+    st.session_state.pop("verificacion", None)
+    mostrar_pagina_login()
+    st.stop()
+
+
+def verificar_autenticacion(forzar=False):
+    """Verificar si el usuario está autenticado
+
+    El resultado de /verify-token se guarda en la sesión durante VERIFICACION_TTL
+    segundos (nunca más allá del `exp` del token), así que la mayoría de los reruns
+    no hacen ninguna llamada al backend. Con `forzar=True` se verifica siempre; se
+    usa antes de acciones sensibles como la gestión de usuarios.
+    """
     if "authenticated" not in st.session_state:
         st.session_state["authenticated"] = False
 
@@ -157,36 +189,59 @@ def verificar_autenticacion():
         mostrar_pagina_login()
         st.stop()  # Detener ejecución si no está autenticado
 
-    # Verificar token con el backend
+    token = st.session_state.get('access_token', '')
+    ahora = time.time()
+
+    expira = expiracion_token(token)
+    if expira is not None and expira <= ahora:
+        _invalidar_sesion()
+
+    verificacion = st.session_state.get("verificacion")
+    if not forzar and verificacion and verificacion["token"] == token and ahora < verificacion["valida_hasta"]:
+        return
+
+    # Verificar token con el backend; con el ETag anterior un 304 confirma el token
+    # sin volver a enviar los datos del usuario
+    headers = {}
+    if verificacion and verificacion["token"] == token and verificacion.get("etag"):
+        headers["If-None-Match"] = verificacion["etag"]
+
+    etag = None
     try:
-        headers = {"Authorization": f"Bearer {st.session_state.get('access_token', '')}"}
-        response = requests.get(
-            f"{API_URL}/verify-token",
-            headers=headers,
-            timeout=5
-        )
-
-        if response.status_code != 200:
-            st.session_state["authenticated"] = False
-            mostrar_pagina_login()
-            st.stop()
+        response = obtener_cliente().get("/verify-token", token=token, timeout=5, headers=headers)
 
+        etag = response.headers.get("ETag")
+        if response.status_code == 304:
+            datos = {"valid": True}
+        else:
+            datos = response.json() if response.status_code == 200 else None
     except:
-        st.session_state["authenticated"] = False
-        mostrar_pagina_login()
-        st.stop()
+        datos = None
+
+    if not datos:
+        _invalidar_sesion()
+
+    # Mantener los datos del usuario al día (p. ej. un cambio de rol); el backend
+    # responde solo con los claims del token, así que se conservan email y nombre
+    if datos.get("user"):
+        st.session_state["user"] = {**st.session_state.get("user", {}), **datos["user"]}
+
+    valida_hasta = ahora + VERIFICACION_TTL
+    if expira is not None:
+        valida_hasta = min(valida_hasta, expira)
+    st.session_state["verificacion"] = {"token": token, "valida_hasta": valida_hasta, "etag": etag}
 
 
 def cerrar_sesion():
     """Cerrar sesión del usuario"""
     try:
-        headers = {"Authorization": f"Bearer {st.session_state.get('access_token', '')}"}
-        requests.post(f"{API_URL}/logout", headers=headers, timeout=5)
+        obtener_cliente().post("/logout", timeout=5)
     except:
         pass
 
     # Limpiar session_state
-    for key in ["authenticated", "access_token", "token_type", "user", "remember_me", "login_complete"]:
+    for key in ["authenticated", "access_token", "token_type", "user", "remember_me", "login_complete",
+                "verificacion", "cache_usuarios"]:
         if key in st.session_state:
             del st.session_state[key]
 
@@ -0,0 +1,131 @@
+# paginacion.py - PAGINACIÓN KEYSET SOBRE EL DATAFRAME EN CACHÉ
+import numpy as np
+import pandas as pd
+
+TAMANO_PAGINA = 100
+
+
+def _claves_ordenables(serie):
+    """Convertir una columna en claves numéricas comparables (nulos primero)"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        # NaT se convierte en el mínimo de int64
+        return serie.to_numpy(dtype='datetime64[ns]').view('int64')
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_numeric_dtype(serie):
+        return serie.to_numpy(dtype='float64', na_value=-np.inf)
+
+    # Texto, fechas como objeto y categorías: código del valor en orden (-1 = nulo)
+    codigos, _ = pd.factorize(serie, sort=True)
+    return codigos
+
+
+class PaginadorKeyset:
+    """Paginación keyset por (columna de orden, id) sobre un DataFrame filtrado.
+
+    El orden se calcula una sola vez; cada página se ubica con búsqueda binaria a
+    partir del cursor (clave, id) de la página anterior, así que la página N cuesta
+    lo mismo que la página 1.
+    """
+
+    def __init__(self, df, columna_orden, descendente=True, columna_id='id', tamaño_pagina=TAMANO_PAGINA):
+        self.df = df
+        self.columna_orden = columna_orden
+        self.descendente = descendente
+        self.tamaño_pagina = tamaño_pagina
+        self.total = len(df)
+
+        claves = _claves_ordenables(df[columna_orden])
+        if columna_id in df.columns and pd.api.types.is_integer_dtype(df[columna_id]):
+            ids = df[columna_id].to_numpy(dtype='int64')
+        else:
+            ids = np.arange(len(df), dtype='int64')
+
+        # Orden ascendente por (clave, id); el orden descendente se lee al revés
+        self._orden = np.lexsort((ids, claves))
+        self._claves = claves[self._orden]
+        self._ids = ids[self._orden]
+
+    def _posicion(self, cursor, lado):
+        """Posición de (clave, id) en el orden ascendente mediante búsqueda binaria"""
+        clave, id_fila = cursor
+        inicio = np.searchsorted(self._claves, clave, side='left')
+        fin = np.searchsorted(self._claves, clave, side='right')
+        return int(inicio + np.searchsorted(self._ids[inicio:fin], id_fila, side=lado))
+
+    def _cursor(self, posicion):
+        return (self._claves[posicion], self._ids[posicion])
+
+    def _rango_mostrado(self, desde, hasta):
+        """Convertir un rango [desde, hasta) del orden mostrado al orden ascendente"""
+        hasta = min(hasta, self.total)
+        desde = min(desde, hasta)
+        return (self.total - hasta, self.total - desde) if self.descendente else (desde, hasta)
+
+    def _rango_pagina(self, cursor, direccion):
+        """Rango [inicio, fin) en orden ascendente de la página pedida.
+
+        Las páginas sin cursor usan los mismos límites que avanzar desde la primera
+        (múltiplos del tamaño de página), y retroceder hasta el principio devuelve
+        la primera página completa, así que ir y volver siempre muestra las mismas.
+        """
+        t = self.tamaño_pagina
+
+        if direccion == 'ultima':
+            desde = (max(self.total - 1, 0) // t) * t
+            return self._rango_mostrado(desde, self.total)
+        if cursor is None:
+            return self._rango_mostrado(0, t)
+
+        # Filas mostradas antes del cursor y posición de la primera mostrada después
+        if self.descendente:
+            antes = self.total - self._posicion(cursor, 'right')
+            despues = self.total - self._posicion(cursor, 'left')
+        else:
+            antes = self._posicion(cursor, 'left')
+            despues = self._posicion(cursor, 'right')
+
+        if direccion == 'siguiente':
+            return self._rango_mostrado(despues, despues + t)
+        if antes <= t:
+            return self._rango_mostrado(0, t)
+        return self._rango_mostrado(antes - t, antes)
+
+    def pagina(self, cursor=None, direccion='siguiente'):
+        """Obtener una página relativa a un cursor.
+
+        direccion: 'siguiente' (filas después del cursor), 'anterior' (filas antes
+        del cursor) o 'ultima' (ignora el cursor). Sin cursor devuelve la primera
+        página. Retorna un diccionario con las filas, los cursores de borde y la
+        posición de la página.
+        """
+        if direccion == 'ultima':
+            cursor = None
+        inicio, fin = self._rango_pagina(cursor, direccion)
+
+        posiciones = np.arange(inicio, fin)
+        if self.descendente:
+            posiciones = posiciones[::-1]
+
+        if len(posiciones) == 0:
+            return {
+                'filas': self.df.iloc[0:0],
+                'cursor_inicio': None,
+                'cursor_fin': None,
+                'hay_anterior': False,
+                'hay_siguiente': False,
+                'desde': 0,
+                'hasta': 0,
+            }
+
+        # Posición en el orden mostrado (para "Mostrando X-Y de N")
+        desde = self.total - fin if self.descendente else inicio
+        hasta = desde + len(posiciones)
+
+        return {
+            'filas': self.df.iloc[self._orden[posiciones]],
+            'cursor_inicio': self._cursor(posiciones[0]),
+            'cursor_fin': self._cursor(posiciones[-1]),
+            'hay_anterior': desde > 0,
+            'hay_siguiente': hasta < self.total,
+            'desde': desde,
+            'hasta': hasta,
+        }
@@ -0,0 +1,243 @@
+# reportes_programados.py - REPORTES ESTÁNDAR PREGENERADOS DESPUÉS DEL CORTE NOCTURNO
+#
+# Uso: python reportes_programados.py          (proceso programador)
+#      python reportes_programados.py --una-vez (generar lo pendiente y salir)
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+
+from datos import conectar, leer_registros
+from trabajos_exportacion import FORMATOS_EXPORTACION, ejecutar_exportacion
+
+load_dotenv()
+
+logger = logging.getLogger("reportes_programados")
+
+# ==================== CONFIGURACIÓN ====================
+REPORTES_DIR = os.getenv(
+    "REPORTES_DIR",
+    os.path.join(tempfile.gettempdir(), "reportes_cerdos")
+)
+# Hora (HH:MM) a partir de la cual los datos del día anterior se consideran cerrados
+HORA_CORTE = os.getenv("HORA_CORTE", "00:30")
+REPORTES_FORMATOS = [f.strip() for f in os.getenv("REPORTES_FORMATOS", "pdf,excel").split(",") if f.strip()]
+REPORTES_RETENCION_DIAS = int(os.getenv("REPORTES_RETENCION_DIAS", "30"))
+
+# periodo -> (nombre para mostrar, días que cubre terminando ayer)
+PERIODOS = {
+    'diario': ('Ayer', 1),
+    'semanal': ('Última semana', 7),
+}
+
+
+# ==================== PERÍODOS ====================
+def _hora_corte():
+    horas, minutos = HORA_CORTE.split(":")
+    return int(horas), int(minutos)
+
+
+def ultimo_dia_cerrado(ahora=None):
+    """Último día cuyos datos ya pasaron el corte nocturno"""
+    ahora = ahora or datetime.now()
+    horas, minutos = _hora_corte()
+    corte_hoy = ahora.replace(hour=horas, minute=minutos, second=0, microsecond=0)
+    dias_atras = 1 if ahora >= corte_hoy else 2
+    return ahora.date() - timedelta(days=dias_atras)
+
+
+def proximo_corte(ahora=None):
+    """Fecha y hora del siguiente corte nocturno"""
+    ahora = ahora or datetime.now()
+    horas, minutos = _hora_corte()
+    corte = ahora.replace(hour=horas, minute=minutos, second=0, microsecond=0)
+    if corte <= ahora:
+        corte += timedelta(days=1)
+    return corte
+
+
+def rango_periodo(periodo, hasta):
+    """Rango [desde, hasta] de fechas que cubre un período terminado en `hasta`"""
+    _, dias = PERIODOS[periodo]
+    return hasta - timedelta(days=dias - 1), hasta
+
+
+# ==================== ARCHIVOS ====================
+def _nombre_base(periodo, hasta):
+    return f"{periodo}_{hasta:%Y%m%d}"
+
+
+def _ruta_reporte(directorio, periodo, hasta, formato):
+    return os.path.join(directorio, f"{_nombre_base(periodo, hasta)}{FORMATOS_EXPORTACION[formato][0]}")
+
+
+def _ruta_metadatos(ruta_reporte):
+    return f"{ruta_reporte}.json"
+
+
+def _escribir_json(ruta, datos):
+    """Escribir un JSON de forma atómica para que el dashboard nunca lea uno a medias"""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+
+# ==================== GENERACIÓN ====================
+def generar_reporte(df, periodo, hasta, formato, directorio=REPORTES_DIR):
+    """Generar un reporte estándar y sus metadatos; devuelve la ruta del archivo"""
+    desde, hasta = rango_periodo(periodo, hasta)
+    ruta = _ruta_reporte(directorio, periodo, hasta, formato)
+
+    if 'fecha' in df.columns:
+        df_periodo = df[(df['fecha'] >= desde) & (df['fecha'] <= hasta)]
+    else:
+        df_periodo = df.iloc[0:0]
+
+    nombre, _ = PERIODOS[periodo]
+    if desde == hasta:
+        titulo = f"Reporte diario - {hasta:%d/%m/%Y}"
+    else:
+        titulo = f"Reporte semanal - {desde:%d/%m/%Y} al {hasta:%d/%m/%Y}"
+
+    inicio = time.perf_counter()
+    temporal = f"{ruta}.tmp"
+    try:
+        with open(temporal, 'wb') as destino:
+            ejecutar_exportacion(formato, df_periodo, destino, titulo=titulo)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.unlink(temporal)
+
+    # Los metadatos se escriben al final: su presencia indica un reporte completo
+    _escribir_json(_ruta_metadatos(ruta), {
+        'periodo': periodo,
+        'nombre': nombre,
+        'titulo': titulo,
+        'formato': formato,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'archivo': os.path.basename(ruta),
+        'registros': int(len(df_periodo)),
+        'total_cerdos': int(df_periodo['total_neto_cerdos'].sum()) if 'total_neto_cerdos' in df_periodo.columns else 0,
+        'tamaño_bytes': os.path.getsize(ruta),
+        'generado_en': datetime.now().isoformat(timespec='seconds'),
+        'duracion_segundos': round(time.perf_counter() - inicio, 2),
+    })
+    return ruta
+
+
+def reportes_pendientes(hasta, directorio=REPORTES_DIR, formatos=None):
+    """(periodo, formato) que aún no tienen reporte completo para el día `hasta`"""
+    formatos = formatos or REPORTES_FORMATOS
+    return [
+        (periodo, formato)
+        for periodo in PERIODOS
+        for formato in formatos
+        if not os.path.exists(_ruta_metadatos(_ruta_reporte(directorio, periodo, hasta, formato)))
+    ]
+
+
+def generar_reportes(hasta=None, directorio=REPORTES_DIR, formatos=None):
+    """Generar los reportes estándar que falten para el último día cerrado"""
+    hasta = hasta or ultimo_dia_cerrado()
+    os.makedirs(directorio, exist_ok=True)
+
+    pendientes = reportes_pendientes(hasta, directorio, formatos)
+    if not pendientes:
+        return []
+
+    # Una sola lectura de la base para todos los reportes del día
+    conn = conectar()
+    try:
+        df = leer_registros(conn)
+    finally:
+        conn.close()
+
+    generados = []
+    for periodo, formato in pendientes:
+        try:
+            ruta = generar_reporte(df, periodo, hasta, formato, directorio)
+            logger.info("Reporte generado: %s", ruta)
+            generados.append(ruta)
+        except Exception:
+            logger.exception("Error al generar el reporte %s (%s) de %s", periodo, formato, hasta)
+
+    purgar_reportes(directorio)
+    return generados
+
+
+def purgar_reportes(directorio=REPORTES_DIR, retencion_dias=REPORTES_RETENCION_DIAS):
+    """Eliminar los reportes (y sus metadatos) más antiguos que la retención"""
+    limite = date.today() - timedelta(days=retencion_dias)
+    for reporte in listar_reportes(directorio):
+        if date.fromisoformat(reporte['hasta']) < limite:
+            for ruta in (reporte['ruta'], _ruta_metadatos(reporte['ruta'])):
+                try:
+                    os.unlink(ruta)
+                except OSError:
+                    pass
+
+
+# ==================== CONSULTA (DASHBOARD) ====================
+def listar_reportes(directorio=REPORTES_DIR):
+    """Reportes completos disponibles, del más reciente al más antiguo"""
+    if not os.path.isdir(directorio):
+        return []
+
+    reportes = []
+    with os.scandir(directorio) as entradas:
+        for entrada in entradas:
+            if not entrada.name.endswith('.json'):
+                continue
+            try:
+                with open(entrada.path, encoding='utf-8') as f:
+                    metadatos = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            ruta = os.path.join(directorio, metadatos.get('archivo', ''))
+            if metadatos.get('formato') in FORMATOS_EXPORTACION and os.path.exists(ruta):
+                metadatos['ruta'] = ruta
+                reportes.append(metadatos)
+
+    orden_periodos = list(PERIODOS)
+    reportes.sort(key=lambda r: (
+        r['hasta'],
+        -orden_periodos.index(r['periodo']) if r['periodo'] in PERIODOS else 0,
+    ), reverse=True)
+    return reportes
+
+
+# ==================== PROGRAMADOR ====================
+def ejecutar_programador():
+    """Generar lo pendiente al iniciar y luego después de cada corte nocturno"""
+    logger.info("Programador de reportes iniciado (corte %s, formatos %s, directorio %s)",
+                HORA_CORTE, ",".join(REPORTES_FORMATOS), REPORTES_DIR)
+
+    while True:
+        try:
+            generar_reportes()
+        except Exception:
+            # La base puede no estar disponible todavía; se reintenta más tarde
+            logger.exception("Error al generar los reportes programados")
+            time.sleep(300)
+            continue
+
+        espera = (proximo_corte() - datetime.now()).total_seconds()
+        logger.info("Próxima generación en %.0f minutos", espera / 60)
+        time.sleep(max(espera, 1))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if "--una-vez" in sys.argv:
+        generar_reportes()
+    else:
+        ejecutar_programador()
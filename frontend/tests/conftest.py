@@ -0,0 +1,5 @@
+# conftest.py - LOS MÓDULOS DEL FRONTEND SE IMPORTAN POR NOMBRE, COMO EN LA APP
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,121 @@
+# test_api_cliente.py - REINTENTOS, COOKIES Y LATENCIAS DEL CLIENTE COMPARTIDO
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from api_cliente import ClienteAPI, normalizar_endpoint
+
+
+class BackendFalso(BaseHTTPRequestHandler):
+    """Responde el estado indicado en la ruta (/estado/502) y cuenta las llamadas"""
+
+    llamadas = Counter()
+
+    def _responder(self):
+        BackendFalso.llamadas[(self.command, self.path)] += 1
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        estado = int(self.path.split("/")[2]) if self.path.startswith("/estado/") else 200
+        self.send_response(estado)
+        if estado == 503:
+            self.send_header("Retry-After", "1")
+        self.send_header("Set-Cookie", "sesion=de-otro-usuario; Path=/")
+        self.send_header("X-Autorizacion", self.headers.get("Authorization", ""))
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _responder
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def servidor():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), BackendFalso)
+    hilo = threading.Thread(target=httpd.serve_forever, daemon=True)
+    hilo.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def cliente(servidor):
+    BackendFalso.llamadas.clear()
+    cliente = ClienteAPI(base_url=servidor, reintentos=2)
+    # Sin espera entre reintentos: solo interesa cuántos hubo
+    for adaptador in cliente.sesion.adapters.values():
+        adaptador.max_retries.backoff_factor = 0
+    return cliente
+
+
+@pytest.mark.parametrize("metodo, reintenta", [
+    ("GET", True),
+    ("PUT", True),
+    ("DELETE", True),
+    ("POST", False),
+    ("PATCH", False),
+])
+def test_solo_se_reintentan_los_verbos_idempotentes(cliente, metodo, reintenta):
+    respuesta = cliente.solicitud(metodo, "/estado/502", autenticar=False)
+
+    assert respuesta.status_code == 502
+    assert BackendFalso.llamadas[(metodo, "/estado/502")] == (3 if reintenta else 1)
+
+
+def test_503_no_se_reintenta_aunque_traiga_retry_after(cliente):
+    respuesta = cliente.get("/estado/503", autenticar=False)
+
+    assert respuesta.status_code == 503
+    assert BackendFalso.llamadas[("GET", "/estado/503")] == 1
+
+
+def test_la_sesion_compartida_no_guarda_cookies(cliente):
+    cliente.get("/usuarios/", autenticar=False)
+    cliente.get("/usuarios/", autenticar=False)
+    assert len(cliente.sesion.cookies) == 0
+
+
+def test_envia_el_token_indicado(cliente):
+    respuesta = cliente.get("/usuarios/", token="abc")
+    assert respuesta.headers["X-Autorizacion"] == "Bearer abc"
+
+    respuesta = cliente.post("/login", autenticar=False, data={"username": "ana"})
+    assert respuesta.headers["X-Autorizacion"] == ""
+
+
+@pytest.mark.parametrize("metodo, ruta, esperado", [
+    ("GET", "/usuarios/15", "GET /usuarios/{id}"),
+    ("PUT", "/usuarios/15/estado", "PUT /usuarios/{id}/estado"),
+    ("GET", "/usuarios/", "GET /usuarios/"),
+    ("GET", "/lotes/L-001", "GET /lotes/L-001"),
+])
+def test_normalizar_endpoint(metodo, ruta, esperado):
+    assert normalizar_endpoint(metodo, ruta) == esperado
+
+
+def test_latencias_por_endpoint(cliente):
+    for usuario_id in (1, 2, 3):
+        cliente.get(f"/usuarios/{usuario_id}", autenticar=False)
+    cliente.post("/estado/500", autenticar=False)
+
+    estadisticas = {fila['endpoint']: fila for fila in cliente.estadisticas()}
+    assert set(estadisticas) == {"GET /usuarios/{id}", "POST /estado/{id}"}
+
+    usuarios = estadisticas["GET /usuarios/{id}"]
+    assert (usuarios['llamadas'], usuarios['errores']) == (3, 0)
+    assert 0 < usuarios['p50_ms'] <= usuarios['p95_ms'] <= usuarios['max_ms']
+    assert (estadisticas["POST /estado/{id}"]['llamadas'], estadisticas["POST /estado/{id}"]['errores']) == (1, 1)
+
+
+def test_error_de_red_cuenta_como_error_y_se_propaga():
+    cliente = ClienteAPI(base_url="http://127.0.0.1:9", reintentos=0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cliente.get("/health", autenticar=False, timeout=1)
+
+    (fila,) = cliente.estadisticas()
+    assert (fila['endpoint'], fila['llamadas'], fila['errores']) == ("GET /health", 1, 1)
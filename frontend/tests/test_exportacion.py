@@ -0,0 +1,189 @@
+# test_exportacion.py - FORMATOS DE EXPORTACIÓN: CSV POR BLOQUES, EXCEL, PDF, PARQUET Y ARROW
+import gzip
+import inspect
+import io
+import re
+import zlib
+from datetime import date
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from exportacion import (
+    COLUMNAS_DICCIONARIO, MAX_FILAS_EXCEL, TITULO_REPORTE, exportar_a_arrow, exportar_a_csv,
+    exportar_a_excel, exportar_a_parquet, exportar_a_pdf
+)
+
+
+@pytest.fixture(scope="module")
+def registros():
+    rng = np.random.default_rng(11)
+    n = 250
+    return pd.DataFrame({
+        'fecha': [date(2024, 1, 1 + int(d)) for d in rng.integers(0, 28, n)],
+        'fecha_hora': pd.date_range('2024-01-01 06:00', periods=n, freq='37min'),
+        'lote_cerdos': rng.choice(['L-001', 'L-002', 'L-003'], n),
+        'placa_vehiculo': rng.choice(['ABC123', 'XYZ987'], n),
+        'sitio_origen': rng.choice(['Granja Santa Lucía', 'Granja B'], n),
+        'sitio_destino': rng.choice(['Planta 1', None], n),
+        'total_neto_cerdos': rng.integers(50, 200, n),
+        'peso_promedio': rng.normal(110, 5, n).round(2),
+    })
+
+
+def registrar_progreso():
+    avances = []
+    return avances, avances.append
+
+
+# ==================== CSV ====================
+
+@pytest.mark.parametrize("filas_por_bloque", [1, 7, 250, 10_000])
+def test_csv_por_bloques_igual_al_csv_completo(registros, filas_por_bloque):
+    destino = io.BytesIO()
+    avances, progreso = registrar_progreso()
+    exportar_a_csv(registros, destino, filas_por_bloque=filas_por_bloque, progreso=progreso)
+
+    assert destino.getvalue() == registros.to_csv(index=False).encode('utf-8')
+    assert avances == sorted(avances) and avances[-1] == 1.0
+
+
+def test_csv_gzip(registros):
+    destino = io.BytesIO()
+    exportar_a_csv(registros, destino, comprimir=True, filas_por_bloque=40)
+
+    assert not destino.closed  # solo se cierra el flujo gzip
+    assert gzip.decompress(destino.getvalue()) == registros.to_csv(index=False).encode('utf-8')
+
+
+def test_csv_vacio_escribe_el_encabezado(registros):
+    destino = io.BytesIO()
+    exportar_a_csv(registros.iloc[:0], destino)
+    assert destino.getvalue().decode('utf-8').strip() == ','.join(registros.columns)
+
+
+# ==================== EXCEL ====================
+
+def test_excel_hoja_al_limite_de_filas():
+    # 1.048.576 filas por hoja, una de ellas el encabezado
+    parametros = inspect.signature(exportar_a_excel).parameters
+    assert MAX_FILAS_EXCEL == 1_048_576
+    assert parametros['filas_por_hoja'].default == MAX_FILAS_EXCEL - 1
+
+
+def test_excel_reparte_las_filas_en_varias_hojas(registros, tmp_path):
+    ruta = tmp_path / "reporte.xlsx"
+    avances, progreso = registrar_progreso()
+    with open(ruta, 'wb') as destino:
+        exportar_a_excel(registros, destino, titulo="Reporte semanal", filas_por_hoja=100, progreso=progreso)
+
+    libro = openpyxl.load_workbook(ruta, read_only=True)
+    assert libro.sheetnames == ['Datos Completos', 'Datos Completos (2)', 'Datos Completos (3)', 'Resumen']
+    assert libro.properties.title == "Reporte semanal"
+
+    filas = []
+    for nombre in libro.sheetnames[:3]:
+        encabezado, *datos = libro[nombre].iter_rows(values_only=True)
+        assert list(encabezado) == list(registros.columns)
+        filas.extend(datos)
+    assert len(filas) == len(registros)
+    assert [fila[6] for fila in filas] == registros['total_neto_cerdos'].tolist()
+    assert filas[0][1] == registros['fecha_hora'].iloc[0].to_pydatetime()  # serial de Excel con formato de fecha
+    # Los destinos vacíos quedan como celdas vacías
+    destinos = registros['sitio_destino']
+    assert [fila[5] for fila in filas] == destinos.astype(object).where(destinos.notna(), None).tolist()
+
+    resumen = dict(list(libro['Resumen'].iter_rows(values_only=True))[1:])
+    assert resumen['Reporte'] == "Reporte semanal"
+    assert resumen['Total Embarques'] == len(registros)
+    assert resumen['Total Cerdos'] == registros['total_neto_cerdos'].sum()
+    assert avances[-1] == pytest.approx(1.0)
+
+
+def test_excel_vacio_tiene_encabezado_y_resumen(registros, tmp_path):
+    ruta = tmp_path / "vacio.xlsx"
+    with open(ruta, 'wb') as destino:
+        exportar_a_excel(registros.iloc[:0], destino)
+
+    libro = openpyxl.load_workbook(ruta, read_only=True)
+    assert libro.sheetnames == ['Datos Completos', 'Resumen']
+    assert list(libro['Datos Completos'].iter_rows(values_only=True)) == [tuple(registros.columns)]
+    assert libro.properties.title == TITULO_REPORTE
+
+
+# ==================== PDF ====================
+
+def contenido_pdf(datos):
+    """Texto de las páginas (FPDF comprime cada página con zlib)"""
+    flujos = re.findall(rb'stream\r?\n(.*?)\r?\nendstream', datos, re.S)
+    partes = []
+    for flujo in flujos:
+        try:
+            partes.append(zlib.decompress(flujo))
+        except zlib.error:
+            partes.append(flujo)
+    return b''.join(partes).decode('latin-1')
+
+
+def test_pdf_incluye_todas_las_filas_en_varias_paginas(registros):
+    destino = io.BytesIO()
+    avances, progreso = registrar_progreso()
+    exportar_a_pdf(registros, destino, titulo="Reporte diario", progreso=progreso)
+
+    datos = destino.getvalue()
+    assert datos.startswith(b'%PDF') and datos.rstrip().endswith(b'%%EOF')
+    paginas = int(re.search(rb'/Count (\d+)', datos).group(1))
+    assert paginas > 1
+
+    texto = contenido_pdf(datos)
+    assert texto.count('(REPORTE DIARIO)') == paginas  # título en el encabezado de cada página
+    assert f'(Página {paginas} / {paginas})' in texto
+    assert f'Mostrando {len(registros):,} registros' in texto
+    # La placa de cada fila está impresa una vez
+    assert texto.count('(ABC123)') + texto.count('(XYZ987)') == len(registros)
+    assert avances and avances[0] == 0
+
+
+def test_pdf_sin_filas(registros):
+    destino = io.BytesIO()
+    exportar_a_pdf(registros.iloc[:0], destino)
+    assert 'No hay datos para mostrar' in contenido_pdf(destino.getvalue())
+
+
+# ==================== PARQUET / ARROW ====================
+
+def comparar_con_origen(tabla, registros):
+    for columna in COLUMNAS_DICCIONARIO:
+        if columna in registros.columns:
+            assert pa.types.is_dictionary(tabla.schema.field(columna).type), columna
+    assert pa.types.is_timestamp(tabla.schema.field('fecha_hora').type)
+    assert pa.types.is_date32(tabla.schema.field('fecha').type)
+
+    leido = tabla.to_pandas()
+    for columna in registros.columns:
+        assert leido[columna].astype(object).where(leido[columna].notna(), None).tolist() == \
+            registros[columna].astype(object).where(registros[columna].notna(), None).tolist(), columna
+
+
+def test_parquet_conserva_tipos_y_valores(registros):
+    destino = io.BytesIO()
+    avances, progreso = registrar_progreso()
+    exportar_a_parquet(registros, destino, filas_por_bloque=60, progreso=progreso)
+
+    archivo = pq.ParquetFile(io.BytesIO(destino.getvalue()))
+    assert archivo.metadata.row_group(0).column(0).compression == 'ZSTD'
+    comparar_con_origen(archivo.read(), registros)
+    assert len(avances) == 5 and avances[-1] == 1.0  # un avance por bloque de 60 filas
+
+
+def test_arrow_conserva_tipos_y_valores(registros):
+    destino = io.BytesIO()
+    exportar_a_arrow(registros, destino, filas_por_bloque=100)
+
+    lector = pa.ipc.open_file(pa.BufferReader(destino.getvalue()))
+    assert lector.num_record_batches == 3
+    comparar_con_origen(lector.read_all(), registros)
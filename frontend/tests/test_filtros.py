@@ -0,0 +1,102 @@
+# test_filtros.py - ÍNDICES BITMAP CONTRA MÁSCARAS DE PANDAS
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filtros import IndiceBitmap, construir_expresion, firma_datos, firma_filtros
+
+
+@pytest.fixture(scope="module")
+def registros():
+    rng = np.random.default_rng(7)
+    n = 5_000
+    df = pd.DataFrame({
+        # Un valor dominante (bitmap denso) y muchos raros (listas de posiciones)
+        'lote_cerdos': rng.choice(['L-001'] * 20 + [f'L-{i:03d}' for i in range(2, 200)], n),
+        'sitio_origen': rng.choice(['Granja A', 'Granja B', 'Granja C'], n),
+        'sitio_destino': rng.choice(['Planta 1', 'Planta 2', None], n),
+        'placa_vehiculo': rng.choice([f'ABC{i:03d}' for i in range(40)], n),
+        'fecha': [date(2024, 1, 1) + timedelta(days=int(d)) for d in rng.integers(0, 90, n)],
+    })
+    return df
+
+
+def mascara_pandas(df, fecha_inicio=None, fecha_fin=None, selecciones=None, combinar='y'):
+    """Referencia: la misma expresión del sidebar evaluada directamente con pandas"""
+    mascara = pd.Series(True, index=df.index)
+    if fecha_inicio is not None:
+        mascara &= df['fecha'] >= fecha_inicio
+    if fecha_fin is not None:
+        mascara &= df['fecha'] <= fecha_fin
+
+    columnas = [df[columna].isin(valores) for columna, valores in (selecciones or {}).items() if valores]
+    if columnas:
+        combinada = columnas[0]
+        for condicion in columnas[1:]:
+            combinada = (combinada & condicion) if combinar == 'y' else (combinada | condicion)
+        mascara &= combinada
+    return mascara.to_numpy()
+
+
+CASOS = [
+    {},
+    {'selecciones': {'lote_cerdos': ['L-001']}},
+    {'selecciones': {'lote_cerdos': ['L-001', 'L-050', 'L-199'], 'sitio_origen': ['Granja B']}},
+    {'selecciones': {'lote_cerdos': ['L-007'], 'placa_vehiculo': ['ABC001', 'ABC002']}, 'combinar': 'o'},
+    {'selecciones': {'sitio_destino': ['Planta 2'], 'lote_cerdos': ['no existe']}},
+    {'selecciones': {'sitio_destino': ['no existe']}, 'combinar': 'o'},
+    {'fecha_inicio': date(2024, 2, 1), 'fecha_fin': date(2024, 2, 29)},
+    {'fecha_inicio': date(2024, 3, 1), 'selecciones': {'sitio_origen': ['Granja A', 'Granja C']}},
+]
+
+
+@pytest.mark.parametrize("caso", CASOS)
+def test_mascara_y_conteo_coinciden_con_pandas(registros, caso):
+    indice = IndiceBitmap(registros)
+    expresion = construir_expresion(**caso)
+    esperado = mascara_pandas(registros, **caso)
+
+    np.testing.assert_array_equal(indice.mascara(expresion), esperado)
+    assert indice.contar(expresion) == esperado.sum()
+    pd.testing.assert_frame_equal(indice.filtrar(registros, expresion), registros[esperado])
+
+
+def test_usa_contenedores_densos_y_dispersos(registros):
+    indice = IndiceBitmap(registros)
+    tipos = {tipo for tipo, _ in indice._contenedores['lote_cerdos'].values()}
+    assert tipos == {'denso', 'disperso'}
+
+
+def test_los_nulos_no_son_un_valor_filtrable(registros):
+    indice = IndiceBitmap(registros)
+    assert None not in indice.valores['sitio_destino']
+    assert indice.contar(construir_expresion(selecciones={'sitio_destino': ['Planta 1', 'Planta 2']})) == \
+        registros['sitio_destino'].notna().sum()
+
+
+def test_operador_desconocido():
+    indice = IndiceBitmap(pd.DataFrame({'lote_cerdos': ['A']}))
+    with pytest.raises(ValueError):
+        indice.evaluar(('no', []))
+
+
+def test_firma_filtros_no_depende_del_orden_de_los_valores():
+    a = construir_expresion(selecciones={'lote_cerdos': ['B', 'A']})
+    b = construir_expresion(selecciones={'lote_cerdos': ['A', 'B']})
+    assert firma_filtros(a) == firma_filtros(b)
+    hash(firma_filtros(a))
+
+
+def test_firma_datos_cambia_con_el_contenido_y_el_orden(registros):
+    firma = firma_datos(registros)
+    assert firma_datos(registros.copy()) == firma
+
+    # Mismo largo, fechas y totales: antes la firma no lo distinguía
+    editado = registros.copy()
+    editado.loc[10, 'placa_vehiculo'] = 'ZZZ999'
+    assert firma_datos(editado) != firma
+
+    reordenado = registros.iloc[::-1].reset_index(drop=True)
+    assert firma_datos(reordenado) != firma
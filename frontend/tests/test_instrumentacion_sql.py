@@ -0,0 +1,71 @@
+# test_instrumentacion_sql.py - LAS DOS COPIAS DE RegistroConsultas DEBEN COINCIDIR
+#
+# Frontend y backend se construyen como imágenes separadas y cada una lleva su
+# instrumentacion_sql.py. Esta prueba alimenta ambas con las mismas ejecuciones y
+# exige las mismas estadísticas, los mismos avisos y la misma decisión de EXPLAIN.
+import importlib.util
+import logging
+import os
+
+import pytest
+
+import instrumentacion_sql as frontend
+
+RUTA_BACKEND = os.path.join(os.path.dirname(__file__), '..', '..', 'backend', 'instrumentacion_sql.py')
+
+
+@pytest.fixture(scope="module")
+def backend():
+    pytest.importorskip("sqlalchemy")
+    pytest.importorskip("greenlet")
+    spec = importlib.util.spec_from_file_location("instrumentacion_sql_backend", RUTA_BACKEND)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+EJECUCIONES = [
+    ("SELECT *\n  FROM conteo_cerdos WHERE fecha >= %(desde)s", 0.012, 120, "datos.py:40 (cargar)"),
+    ("SELECT *  FROM conteo_cerdos WHERE fecha >= %(desde)s", 0.450, 3000, "datos.py:40 (cargar)"),
+    ("SELECT * FROM conteo_cerdos WHERE fecha >= %(desde)s", 0.300, 2500, "app.py:90 (main)"),
+    ("UPDATE usuarios SET activo = false WHERE id = 3", 0.900, 1, "crud.py:10 (desactivar)"),
+    ("WITH t AS (SELECT 1) SELECT * FROM t", 0.250, -1, "desconocido"),
+    ("SELECT count(*) FROM usuarios", 0.001, 1, "crud.py:20 (contar)"),
+    ("SELECT 2", 0.002, 1, "crud.py:30 (otra)"),
+    ("SELECT " + "x, " * 200 + "y", 0.500, 0, "crud.py:40 (larga)"),
+]
+
+
+def reproducir(modulo, caplog):
+    registro = modulo.RegistroConsultas(umbral_ms=200, explain=True, intervalo_explain=3600, max_sentencias=6)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="sql_lento"):
+        capturas = [registro.registrar(*ejecucion) for ejecucion in EJECUCIONES]
+    avisos = [registro.getMessage() for registro in caplog.records]
+    return capturas, avisos, registro.estadisticas()
+
+
+def test_mismas_variables_de_entorno(backend):
+    for nombre in ("SQL_UMBRAL_MS", "SQL_EXPLAIN", "SQL_EXPLAIN_INTERVALO", "SQL_MAX_SENTENCIAS"):
+        assert getattr(frontend, nombre) == getattr(backend, nombre), nombre
+
+
+def test_misma_normalizacion(backend):
+    for sql, *_ in EJECUCIONES:
+        assert frontend.normalizar_sentencia(sql) == backend.normalizar_sentencia(sql)
+        assert frontend.normalizar_sentencia(sql, 120) == backend.normalizar_sentencia(sql, 120)
+
+
+def test_mismo_registro_y_formato(backend, caplog):
+    capturas_frontend, avisos_frontend, filas_frontend = reproducir(frontend, caplog)
+    capturas_backend, avisos_backend, filas_backend = reproducir(backend, caplog)
+
+    assert capturas_frontend == capturas_backend
+    assert avisos_frontend == avisos_backend
+    assert filas_frontend == filas_backend
+
+    # Y el formato es el que muestran /admin/consultas y la página de diagnóstico
+    assert set(filas_frontend[0]) == {
+        "sentencia", "sitio", "llamadas", "total_ms", "promedio_ms", "max_ms", "filas", "lentas",
+    }
+    assert ("(otras sentencias)", "varios") in {(fila["sentencia"], fila["sitio"]) for fila in filas_frontend}
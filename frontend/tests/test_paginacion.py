@@ -0,0 +1,66 @@
+# test_paginacion.py - LÍMITES DE PÁGINA DEL PAGINADOR KEYSET
+import numpy as np
+import pandas as pd
+import pytest
+
+from paginacion import PaginadorKeyset
+
+
+def registros(n, semilla=3):
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        'id': rng.permutation(n),
+        # Claves repetidas: el id desempata
+        'total_neto_cerdos': rng.integers(0, 50, n),
+    })
+
+
+def ids_ordenados(df, descendente):
+    return df.sort_values(['total_neto_cerdos', 'id'], ascending=not descendente)['id'].tolist()
+
+
+def recorrer(paginador, pagina, direccion, cursor):
+    paginas = [pagina]
+    seguir = 'hay_siguiente' if direccion == 'siguiente' else 'hay_anterior'
+    while pagina[seguir]:
+        pagina = paginador.pagina(pagina[cursor], direccion)
+        paginas.append(pagina)
+    return paginas
+
+
+@pytest.mark.parametrize("descendente", [True, False])
+@pytest.mark.parametrize("n", [0, 1, 99, 100, 101, 1003])
+def test_avanzar_y_retroceder_desde_la_ultima_dan_las_mismas_paginas(n, descendente):
+    df = registros(n)
+    paginador = PaginadorKeyset(df, 'total_neto_cerdos', descendente, tamaño_pagina=100)
+
+    hacia_adelante = recorrer(paginador, paginador.pagina(), 'siguiente', 'cursor_fin')
+    hacia_atras = recorrer(paginador, paginador.pagina(direccion='ultima'), 'anterior', 'cursor_inicio')[::-1]
+
+    ids = [pagina['filas']['id'].tolist() for pagina in hacia_adelante]
+    assert sum(ids, []) == ids_ordenados(df, descendente)
+    assert [pagina['filas']['id'].tolist() for pagina in hacia_atras] == ids
+    assert [(p['desde'], p['hasta']) for p in hacia_atras] == [(p['desde'], p['hasta']) for p in hacia_adelante]
+
+
+def test_la_ultima_pagina_empieza_en_un_multiplo_del_tamano():
+    paginador = PaginadorKeyset(registros(1003), 'total_neto_cerdos', tamaño_pagina=100)
+    ultima = paginador.pagina(direccion='ultima')
+    assert (ultima['desde'], ultima['hasta']) == (1000, 1003)
+    assert not ultima['hay_siguiente'] and ultima['hay_anterior']
+
+
+def test_retroceder_hasta_el_inicio_devuelve_la_primera_pagina_completa():
+    paginador = PaginadorKeyset(registros(1003), 'total_neto_cerdos', descendente=False, tamaño_pagina=100)
+    primera = paginador.pagina()
+
+    # Cursor desalineado en la cuarta fila mostrada: antes de él solo hay 3 filas
+    anterior = paginador.pagina(paginador._cursor(3), 'anterior')
+    assert (anterior['desde'], anterior['hasta']) == (0, 100)
+    pd.testing.assert_frame_equal(anterior['filas'], primera['filas'])
+
+
+def test_pagina_vacia():
+    pagina = PaginadorKeyset(registros(0), 'total_neto_cerdos').pagina()
+    assert pagina['filas'].empty
+    assert pagina['cursor_inicio'] is None and not pagina['hay_siguiente']
@@ -0,0 +1,214 @@
+# trabajos_exportacion.py - COLA DE EXPORTACIONES EN SEGUNDO PLANO CON CACHÉ EN DISCO
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+from exportacion import (
+    TITULO_REPORTE, exportar_a_arrow, exportar_a_csv, exportar_a_excel,
+    exportar_a_parquet, exportar_a_pdf
+)
+
+load_dotenv()
+
+# ==================== CONFIGURACIÓN ====================
+EXPORT_CACHE_DIR = os.getenv(
+    "EXPORT_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "exportaciones_cerdos")
+)
+EXPORT_CACHE_MB = int(os.getenv("EXPORT_CACHE_MB", "512"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+# Streamlit entrega la descarga desde memoria: archivos más grandes no se ofrecen
+EXPORT_DESCARGA_MAX_MB = int(os.getenv("EXPORT_DESCARGA_MAX_MB", "200"))
+
+# Errores recientes que se conservan para mostrarlos a quien consulte el estado
+MAX_ERRORES_RECORDADOS = 100
+
+# formato -> (extensión, tipo MIME)
+FORMATOS_EXPORTACION = {
+    'excel': ('.xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'pdf': ('.pdf', "application/pdf"),
+    'csv': ('.csv', "text/csv"),
+    'csv.gz': ('.csv.gz', "application/gzip"),
+    'parquet': ('.parquet', "application/vnd.apache.parquet"),
+    'arrow': ('.arrow', "application/vnd.apache.arrow.file"),
+}
+
+
+# ==================== TRABAJO (SE EJECUTA EN OTRO PROCESO) ====================
+def _escribir_progreso(ruta_progreso, fraccion):
+    with open(ruta_progreso, 'w') as f:
+        f.write(f"{fraccion:.3f}")
+
+
+def ejecutar_exportacion(formato, df, destino, progreso=None, titulo=TITULO_REPORTE):
+    """Escribir el DataFrame en el archivo binario `destino` con el formato pedido
+
+    El título solo aparece en los formatos de documento (PDF y Excel).
+    """
+    if formato == 'excel':
+        exportar_a_excel(df, destino, titulo=titulo, progreso=progreso)
+    elif formato == 'pdf':
+        exportar_a_pdf(df, destino, titulo=titulo, progreso=progreso)
+    elif formato in ('csv', 'csv.gz'):
+        exportar_a_csv(df, destino, comprimir=(formato == 'csv.gz'), progreso=progreso)
+    elif formato == 'parquet':
+        exportar_a_parquet(df, destino, progreso=progreso)
+    elif formato == 'arrow':
+        exportar_a_arrow(df, destino, progreso=progreso)
+    else:
+        raise ValueError(f"Formato de exportación desconocido: {formato}")
+
+
+def _trabajo_exportacion(formato, df, ruta_final, ruta_progreso):
+    """Generar el archivo en un temporal y publicarlo de forma atómica al terminar"""
+    ruta_temporal = f"{ruta_final}.tmp"
+    _escribir_progreso(ruta_progreso, 0)
+
+    try:
+        with open(ruta_temporal, 'wb') as destino:
+            ejecutar_exportacion(formato, df, destino,
+                                 progreso=lambda fraccion: _escribir_progreso(ruta_progreso, fraccion))
+        os.replace(ruta_temporal, ruta_final)
+    finally:
+        for ruta in (ruta_temporal, ruta_progreso):
+            if os.path.exists(ruta):
+                os.unlink(ruta)
+
+    return ruta_final
+
+
+# ==================== GESTOR DE TRABAJOS ====================
+class GestorExportaciones:
+    """Cola de exportaciones en un pool de procesos con caché LRU de archivos en disco.
+
+    Cada trabajo se identifica por (formato, firma de filtros, versión de datos): una
+    solicitud idéntica, de cualquier usuario, reutiliza el archivo ya generado o el
+    trabajo que está en curso.
+    """
+
+    def __init__(self, directorio=EXPORT_CACHE_DIR, limite_mb=EXPORT_CACHE_MB, max_procesos=EXPORT_WORKERS):
+        self.directorio = directorio
+        self.limite_bytes = limite_mb * 1024 * 1024
+        os.makedirs(self.directorio, exist_ok=True)
+
+        # spawn: el servidor de Streamlit tiene hilos y no es seguro hacer fork
+        self._pool = ProcessPoolExecutor(
+            max_workers=max_procesos,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self._trabajos = {}  # solo los trabajos en curso
+        self._errores = {}  # clave -> mensaje de los últimos trabajos fallidos
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(formato, firma_filtros, version_datos):
+        """Clave estable del artefacto para un formato, filtros y versión de datos"""
+        texto = repr((formato, firma_filtros, version_datos))
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()[:32]
+
+    def _ruta(self, clave, formato):
+        return os.path.join(self.directorio, f"{clave}{FORMATOS_EXPORTACION[formato][0]}")
+
+    def _ruta_progreso(self, clave):
+        return os.path.join(self.directorio, f"{clave}.progreso")
+
+    def solicitar(self, formato, df, firma_filtros, version_datos):
+        """Encolar una exportación (o reutilizar la existente) y devolver su clave"""
+        clave = self.clave(formato, firma_filtros, version_datos)
+        ruta = self._ruta(clave, formato)
+
+        with self._lock:
+            if os.path.exists(ruta):
+                os.utime(ruta)  # Marcar como usado recientemente
+                return clave
+
+            if clave in self._trabajos:
+                return clave
+
+            self._errores.pop(clave, None)
+            trabajo = self._pool.submit(
+                _trabajo_exportacion, formato, df, ruta, self._ruta_progreso(clave)
+            )
+            self._trabajos[clave] = trabajo
+
+        # Fuera del lock: si el trabajo ya terminó, el callback se ejecuta aquí mismo
+        trabajo.add_done_callback(lambda terminado: self._finalizar(clave, ruta, terminado))
+        return clave
+
+    def _finalizar(self, clave, ruta, trabajo):
+        """Retirar el trabajo terminado (recordando su error) y aplicar el límite de la caché"""
+        error = trabajo.exception() if not trabajo.cancelled() else None
+        with self._lock:
+            if self._trabajos.get(clave) is trabajo:
+                del self._trabajos[clave]
+            if error is not None:
+                self._errores[clave] = str(error)
+                while len(self._errores) > MAX_ERRORES_RECORDADOS:
+                    del self._errores[next(iter(self._errores))]
+
+        self._aplicar_limite(conservar=ruta)
+
+    def estado(self, clave, formato):
+        """Estado de un trabajo: 'listo', 'en_proceso', 'error' o 'desconocido'"""
+        ruta = self._ruta(clave, formato)
+        if os.path.exists(ruta):
+            try:
+                os.utime(ruta)
+            except OSError:
+                pass
+            return {'estado': 'listo', 'progreso': 1.0, 'ruta': ruta}
+
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            error = self._errores.get(clave)
+
+        if error is not None:
+            return {'estado': 'error', 'progreso': 0.0, 'error': error}
+
+        if trabajo is None:
+            # Nunca se pidió, o terminó y el archivo ya fue desalojado de la caché
+            return {'estado': 'desconocido', 'progreso': 0.0}
+
+        if trabajo.done():
+            error = trabajo.exception()
+            if error is not None:
+                return {'estado': 'error', 'progreso': 0.0, 'error': str(error)}
+            return {'estado': 'desconocido', 'progreso': 0.0}
+
+        try:
+            with open(self._ruta_progreso(clave)) as f:
+                progreso = float(f.read() or 0)
+        except (OSError, ValueError):
+            progreso = 0.0
+        return {'estado': 'en_proceso', 'progreso': progreso}
+
+    def _aplicar_limite(self, conservar=None):
+        """Eliminar los artefactos usados hace más tiempo hasta respetar el tamaño máximo
+
+        El archivo recién generado (`conservar`) nunca se elimina, aunque por sí solo
+        supere el límite, para que el usuario que lo pidió pueda descargarlo.
+        """
+        extensiones = tuple(extension for extension, _ in FORMATOS_EXPORTACION.values())
+        archivos = []
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and entrada.name.endswith(extensiones) and entrada.path != conservar:
+                    info = entrada.stat()
+                    archivos.append((info.st_mtime, info.st_size, entrada.path))
+
+        total = sum(tamaño for _, tamaño, _ in archivos)
+        if conservar and os.path.exists(conservar):
+            total += os.path.getsize(conservar)
+        for _, tamaño, ruta in sorted(archivos):
+            if total <= self.limite_bytes:
+                break
+            try:
+                os.unlink(ruta)
+                total -= tamaño
+            except OSError:
+                pass